@@ -9,6 +9,7 @@ import flet as ft
 import logging
 from dotenv import load_dotenv
 from logger import SnackBarHandler
+from temp_reaper import TempReaper, DEFAULT_MAX_AGE_DAYS, DEFAULT_QUOTA_MB
 from views import (
     HomeView, AboutView, SettingsView, ExitView,
     FilePickerSelectorView, CSVSelectorView,
@@ -233,12 +234,25 @@ class MDIApplication:
             "selected_storage",
             "selected_collection",
             "selected_theme",
-            "last_directory"
+            "last_directory",
+            "fuzzy_scorer",
+            "scan_workers",
+            "derivative_workers",
+            "derivative_timeout",
+            "derivative_backend",
+            "derivative_cache_mb",
+            "derivative_resume",
+            "derivative_pdf_pages",
+            "staging_strategy",
+            "staging_checksums",
+            "temp_max_age_days",
+            "temp_quota_mb"
         ]
         
         for key in session_keys:
             value = persistent_data.get(key)
-            if value:
+            # Numeric settings may legitimately be 0 (e.g. derivative_cache_mb disables the cache)
+            if value or value == 0:
                 page.session.set(key, value)
                 self.logger.info(f"Initialized session '{key}' = '{value}' from persistent.json")
         
@@ -285,6 +299,16 @@ class MDIApplication:
         
         # Navigate to home page
         page.go("/")
+        
+        # Clean up old storage/temp workspaces in the background, after the first
+        # paint, when a cleanup policy is set in Settings
+        reaper = TempReaper(
+            max_age_days=page.session.get("temp_max_age_days") or DEFAULT_MAX_AGE_DAYS,
+            quota_mb=page.session.get("temp_quota_mb") or DEFAULT_QUOTA_MB,
+            active_dirs=lambda: [page.session.get("temp_directory")]
+        )
+        if reaper.enabled:
+            page.run_thread(reaper.run_after_startup)
 
 
 def main(page: ft.Page):
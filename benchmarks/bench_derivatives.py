@@ -0,0 +1,413 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for derivative generation.
+
+Builds a synthetic corpus of realistic masters and measures each derivative
+entry point with every backend that can handle the input:
+    - tiff16: a 600 dpi, 16-bit RGB, uncompressed letter-size scan (~200 MB)
+    - jpeg: a large camera-style JPEG (8000x6000 by default)
+    - pdf: a multi-page scanned PDF
+    - cases: thumbnail.generate_thumbnail, thumbnail.generate_pdf_thumbnail
+      and DerivativesView.create_single_derivative (CollectionBuilder SMALL)
+
+Every case runs in a fresh Python process, so its peak RSS (and that of the
+largest ImageMagick child) is not inflated by the cases before it. For each
+case the report gives the latency percentiles of serial calls, the throughput
+of a batch run on a DerivativePool, and the peak RSS.
+
+Results are printed as a table and written as JSON (--report), so runs can be
+compared across versions and machines. ImageMagick cases are skipped when
+magick is not on the PATH, and Pillow cases are skipped for inputs the Pillow
+backend hands over to ImageMagick (e.g. 16-bit TIFFs on some Pillow
+versions), so a "pillow" row always measures Pillow.
+
+Usage:
+    python benchmarks/bench_derivatives.py [--scale 1.0] [--repeat 5] [--workers 4]
+                                           [--backends imagemagick,pillow] [--report bench_derivatives.json]
+"""
+
+import argparse
+import json
+import math
+import os
+import platform
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Add the repository root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from PIL import Image
+
+import thumbnail
+from derivative_pool import DerivativePool
+from bench_pdf import make_pdf
+
+# Size of the derivative produced by the thumbnail cases
+OUTPUT_SIZE = (800, 800)
+
+# (case, input) pairs; each is run once per backend in --backends
+CASES = [
+    ('generate_thumbnail', 'tiff16'),
+    ('generate_thumbnail', 'jpeg'),
+    ('generate_pdf_thumbnail', 'pdf'),
+    ('create_single_derivative', 'tiff16'),
+    ('create_single_derivative', 'jpeg'),
+    ('create_single_derivative', 'pdf'),
+]
+
+# Rows of the synthetic TIFF generated and written at a time
+TIFF_STRIP_ROWS = 256
+
+
+def synthetic_rows(width, rows, top, height, max_value, dtype):
+    """A block of a smooth colour gradient with sensor-like noise."""
+    y = (np.arange(top, top + rows, dtype=np.float32) / height)[:, None]
+    x = (np.arange(width, dtype=np.float32) / width)[None, :]
+    x, y = np.broadcast_arrays(x, y)
+    block = np.stack([x * 0.8 + 0.1, y * 0.7 + 0.2, (x + y) * 0.4 + 0.1], axis=-1)
+    block += np.random.default_rng(top).normal(0, 0.02, block.shape).astype(np.float32)
+    return (np.clip(block, 0, 1) * max_value).astype(dtype)
+
+
+def make_tiff16(path, width, height, dpi=600):
+    """Write an uncompressed 16-bit RGB baseline TIFF, one strip at a time."""
+    data_bytes = width * height * 3 * 2
+    tags = 11
+    bits_offset = 8 + 2 + 12 * tags + 4
+    resolution_offset = bits_offset + 6
+    data_offset = resolution_offset + 16
+    with open(path, 'wb') as f:
+        f.write(b'II*\x00' + struct.pack('<I', 8))
+        f.write(struct.pack('<H', tags))
+        for tag, kind, value in [
+            (256, 4, width),               # ImageWidth
+            (257, 4, height),              # ImageLength
+            (258, 3, bits_offset),         # BitsPerSample (3 values, stored below)
+            (259, 3, 1),                   # Compression: none
+            (262, 3, 2),                   # PhotometricInterpretation: RGB
+            (273, 4, data_offset),         # StripOffsets
+            (277, 3, 3),                   # SamplesPerPixel
+            (278, 4, height),              # RowsPerStrip
+            (279, 4, data_bytes),          # StripByteCounts
+            (282, 5, resolution_offset),   # XResolution
+            (283, 5, resolution_offset + 8),  # YResolution
+        ]:
+            count = 3 if tag == 258 else 1
+            if kind == 3 and count == 1:
+                f.write(struct.pack('<HHIHH', tag, kind, count, value, 0))
+            else:
+                f.write(struct.pack('<HHII', tag, kind, count, value))
+        f.write(struct.pack('<I', 0))
+        f.write(struct.pack('<HHH', 16, 16, 16))
+        f.write(struct.pack('<IIII', dpi, 1, dpi, 1))
+        for top in range(0, height, TIFF_STRIP_ROWS):
+            rows = min(TIFF_STRIP_ROWS, height - top)
+            f.write(synthetic_rows(width, rows, top, height, 65535, '<u2').tobytes())
+
+
+def make_jpeg(path, width, height, quality=92):
+    """Write a large RGB JPEG."""
+    Image.fromarray(synthetic_rows(width, height, 0, height, 255, np.uint8)).save(path, quality=quality)
+
+
+def build_corpus(corpus_dir, scale, pdf_pages):
+    """
+    Generate the synthetic masters in corpus_dir/OBJS.
+
+    Returns:
+        dict: Input name -> description (path, pixel size, bytes)
+    """
+    objs = os.path.join(corpus_dir, 'OBJS')
+    os.makedirs(objs, exist_ok=True)
+    tiff_size = (int(8.5 * 600 * scale), int(11 * 600 * scale))
+    jpeg_size = (int(8000 * scale), int(6000 * scale))
+    corpus = {
+        'tiff16': (os.path.join(objs, 'master_600dpi_16bit.tif'), tiff_size, lambda p, s: make_tiff16(p, *s)),
+        'jpeg': (os.path.join(objs, 'master_large.jpg'), jpeg_size, lambda p, s: make_jpeg(p, *s)),
+        'pdf': (os.path.join(objs, f'scan_{pdf_pages}_pages.pdf'), (int(8.5 * 150), int(11 * 150)),
+                lambda p, s: make_pdf(p, pdf_pages)),
+    }
+    described = {}
+    for name, (path, size, make) in corpus.items():
+        start = time.perf_counter()
+        make(path, size)
+        described[name] = {
+            'path': path,
+            'width': size[0],
+            'height': size[1],
+            'megapixels': round(size[0] * size[1] / 1e6, 2),
+            'bytes': os.path.getsize(path),
+            'build_seconds': round(time.perf_counter() - start, 3),
+        }
+        if name == 'pdf':
+            described[name]['pages'] = pdf_pages
+        print(f"built {name:<8} {size[0]}x{size[1]}  {described[name]['bytes'] / (1024 * 1024):8.1f} MB")
+    return described
+
+
+def percentile(values, fraction):
+    """Linearly interpolated percentile of a list of numbers."""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower, upper = math.floor(position), math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def peak_rss_mb(who):
+    """Peak resident set size of this process or of its largest child, in MB."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(who).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class _BenchSession(dict):
+    """Minimal stand-in for page.session."""
+
+    def get(self, key):
+        return dict.get(self, key)
+
+    def set(self, key, value):
+        self[key] = value
+
+
+class _BenchPage:
+    """Minimal stand-in for ft.Page, enough to drive DerivativesView."""
+
+    def __init__(self):
+        import flet as ft
+        self.session = _BenchSession()
+        self.theme_mode = ft.ThemeMode.LIGHT
+
+    def update(self):
+        pass
+
+
+def case_function(case, backend, out_dir):
+    """
+    Build the callable measured by a case.
+
+    Returns:
+        function: Taking (source_path, index) and returning True on success
+    """
+    width, height = OUTPUT_SIZE
+    options = {'width': width, 'height': height, 'quality': 85, 'trim': False, 'backend': backend}
+
+    if case == 'generate_thumbnail':
+        return lambda source, index: thumbnail.generate_thumbnail(
+            source, os.path.join(out_dir, f"{index}.jpg"), options
+        )
+    if case == 'generate_pdf_thumbnail':
+        return lambda source, index: thumbnail.generate_pdf_thumbnail(
+            source, os.path.join(out_dir, f"{index}.jpg"), options
+        )
+    if case == 'create_single_derivative':
+        from views.derivatives_view import DerivativesView
+        view = DerivativesView(_BenchPage())
+
+        def run(source, index):
+            # Each call gets its own copy under OBJS/ so outputs don't overwrite each other
+            objs = os.path.join(out_dir, str(index), 'OBJS')
+            os.makedirs(objs, exist_ok=True)
+            staged = os.path.join(objs, os.path.basename(source))
+            if not os.path.exists(staged):
+                os.symlink(source, staged)
+            success, _ = view.create_single_derivative(staged, 'CollectionBuilder', 'small', backend=backend)
+            return success
+        return run
+    raise ValueError(f"Unknown case: {case}")
+
+
+def pillow_handles(source, out_dir):
+    """
+    Check whether the Pillow backend decodes source itself rather than falling
+    back to ImageMagick.
+
+    Returns:
+        bool: True if Pillow produced the derivative
+    """
+    width, height = OUTPUT_SIZE
+    output = {'path': os.path.join(out_dir, 'pillow_probe.jpg'), 'width': width, 'height': height}
+    return thumbnail._pillow_derivatives(source, [output], {'quality': 85, 'trim': False})
+
+
+def run_case(case, backend, source, repeat, workers, batch):
+    """
+    Measure one case in this process.
+
+    Returns:
+        dict: Latency, throughput and peak RSS of the case
+    """
+    out_dir = tempfile.mkdtemp(prefix='bench_derivatives_out_')
+    try:
+        if backend == 'pillow' and not pillow_handles(source, out_dir):
+            return {'skipped': 'Pillow falls back to ImageMagick for this input'}
+
+        func = case_function(case, backend, out_dir)
+
+        # Warm-up call (imports, codec initialisation, page cache)
+        if not func(source, 'warmup'):
+            return {'error': 'warm-up call failed'}
+
+        latencies, failures = [], 0
+        for index in range(repeat):
+            start = time.perf_counter()
+            if not func(source, f"serial{index}"):
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+
+        pool = DerivativePool(max_workers=workers)
+        start = time.perf_counter()
+        completed = 0
+        for _, result, error in pool.run(range(batch), lambda index, timeout: func(source, f"batch{index}")):
+            if error is None and result:
+                completed += 1
+            else:
+                failures += 1
+        batch_seconds = time.perf_counter() - start
+
+        return {
+            'latency_seconds': {
+                'p50': round(percentile(latencies, 0.50), 4),
+                'p90': round(percentile(latencies, 0.90), 4),
+                'p99': round(percentile(latencies, 0.99), 4),
+                'mean': round(sum(latencies) / len(latencies), 4),
+                'max': round(max(latencies), 4),
+            },
+            'throughput': {
+                'workers': pool.max_workers,
+                'jobs': batch,
+                'seconds': round(batch_seconds, 3),
+                'files_per_second': round(completed / batch_seconds, 3),
+            },
+            'peak_rss_mb': {
+                'python': peak_rss_mb(resource.RUSAGE_SELF) if resource else None,
+                'largest_child': peak_rss_mb(resource.RUSAGE_CHILDREN) if resource else None,
+            },
+            'failures': failures,
+        }
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+def run_case_subprocess(case, backend, input_name, corpus, args):
+    """Run one case in a fresh interpreter and return its result dict."""
+    command = [
+        sys.executable, os.path.abspath(__file__), '--run-case', case,
+        '--backend', backend, '--source', corpus[input_name]['path'],
+        '--repeat', str(args.repeat), '--workers', str(args.workers), '--batch', str(args.batch),
+    ]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {'error': (completed.stderr.strip().splitlines() or ['case process failed'])[-1]}
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    if 'throughput' in result:
+        result['throughput']['megapixels_per_second'] = round(
+            result['throughput']['files_per_second'] * corpus[input_name]['megapixels'], 2
+        )
+    return result
+
+
+def magick_version():
+    """First line of `magick -version`, or None if ImageMagick is not available."""
+    if shutil.which('magick') is None:
+        return None
+    try:
+        output = subprocess.run(['magick', '-version'], capture_output=True, text=True, timeout=30).stdout
+        return output.splitlines()[0] if output else None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def print_row(case, backend, input_name, result):
+    """Print one result as a table row."""
+    label = f"{case}/{input_name}/{backend}"
+    if 'skipped' in result or 'error' in result:
+        print(f"{label:<45} {result.get('skipped') or 'ERROR: ' + result['error']}")
+        return
+    latency, throughput, rss = result['latency_seconds'], result['throughput'], result['peak_rss_mb']
+    print(f"{label:<45} p50 {latency['p50']:7.3f}s  p90 {latency['p90']:7.3f}s  "
+          f"{throughput['files_per_second']:7.2f} files/s  {throughput['megapixels_per_second']:8.1f} MP/s  "
+          f"RSS {rss['python']} MB (child {rss['largest_child']} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=float, default=1.0, help='Linear scale of the synthetic masters (0.25 for a quick run)')
+    parser.add_argument('--pdf-pages', type=int, default=50, help='Pages in the synthetic PDF')
+    parser.add_argument('--repeat', type=int, default=5, help='Serial calls per case for the latency percentiles')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Parallel jobs for the throughput run')
+    parser.add_argument('--batch', type=int, default=None, help='Jobs in the throughput run (default: 2 per worker)')
+    parser.add_argument('--backends', default=','.join(thumbnail.BACKENDS), help='Comma-separated backends to measure')
+    parser.add_argument('--report', default='bench_derivatives.json', help='Path of the JSON report')
+    # Internal: measure a single case (used by the per-case subprocesses)
+    parser.add_argument('--run-case', help=argparse.SUPPRESS)
+    parser.add_argument('--backend', help=argparse.SUPPRESS)
+    parser.add_argument('--source', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.batch = args.batch or args.workers * 2
+
+    if args.run_case:
+        result = run_case(args.run_case, args.backend, args.source, args.repeat, args.workers, args.batch)
+        print(json.dumps(result))
+        return
+
+    backends = [name.strip() for name in args.backends.split(',') if name.strip()]
+    version = magick_version()
+    work_dir = tempfile.mkdtemp(prefix='bench_derivatives_')
+    try:
+        corpus = build_corpus(work_dir, args.scale, args.pdf_pages)
+        results = []
+        for case, input_name in CASES:
+            for backend in backends:
+                # Pillow has no PDF decoder; those cases would only measure the ImageMagick fallback
+                if backend == 'pillow' and input_name == 'pdf':
+                    continue
+                if version is None and (backend == 'imagemagick' or input_name == 'pdf'):
+                    result = {'skipped': 'magick is not on the PATH'}
+                else:
+                    result = run_case_subprocess(case, backend, input_name, corpus, args)
+                print_row(case, backend, input_name, result)
+                results.append(dict(case=case, backend=backend, input=input_name, **result))
+
+        report = {
+            'generated': datetime.now().isoformat(timespec='seconds'),
+            'host': {
+                'platform': platform.platform(),
+                'python': platform.python_version(),
+                'cpu_count': os.cpu_count(),
+                'imagemagick': version,
+                'pillow': Image.__version__,
+            },
+            'parameters': {
+                'scale': args.scale,
+                'repeat': args.repeat,
+                'workers': args.workers,
+                'batch': args.batch,
+                'output_size': list(OUTPUT_SIZE),
+            },
+            'corpus': {name: {k: v for k, v in info.items() if k != 'path'} for name, info in corpus.items()},
+            'results': results,
+        }
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"report written to {args.report}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
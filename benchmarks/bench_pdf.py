@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark for PDF derivatives.
+
+Builds a synthetic scanned PDF (300 pages by default) and times:
+    - page-count: thumbnail.pdf_page_count on the whole document
+    - legacy: the original first-page command (input[0] at a fixed density, then -thumbnail)
+    - fit-page: the first page rasterized at the density the derivatives need
+    - pages: per-page TN/SMALL derivatives for a page range, serially and in parallel
+
+Requires ImageMagick (with Ghostscript) on the PATH for everything but page-count.
+
+Usage:
+    python benchmarks/bench_pdf.py [--pages 300] [--range 1-50] [--workers 8] [--density 300]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from subprocess import call
+
+# Add the repository root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, ImageDraw
+
+import thumbnail
+from derivative_pool import DerivativePool
+
+OUTPUTS = [(800, 800), (400, 400)]
+
+
+def make_pdf(path, page_count, dpi=150):
+    """Write a scanned-looking PDF of letter-size pages at the given resolution."""
+    width, height = int(8.5 * dpi), int(11 * dpi)
+    pages = []
+    for number in range(page_count):
+        page = Image.new('L', (width, height), 235)
+        draw = ImageDraw.Draw(page)
+        for line in range(40):
+            y = int(height * 0.08) + line * int(height * 0.021)
+            draw.rectangle([int(width * 0.1), y, int(width * (0.5 + 0.4 * ((line + number) % 7) / 7)), y + 8], fill=40)
+        pages.append(page)
+    pages[0].save(path, save_all=True, append_images=pages[1:], resolution=dpi)
+
+
+def timed(label, func):
+    """Run func once and print its wall time."""
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {elapsed:8.3f}s")
+    return elapsed, result
+
+
+def page_outputs(out_dir, page):
+    """SMALL and TN outputs for one page."""
+    return [
+        {'path': os.path.join(out_dir, f"p{page + 1:04d}_{width}.jpg"), 'width': width, 'height': height}
+        for width, height in OUTPUTS
+    ]
+
+
+def render_pages(pdf_path, out_dir, pages, workers):
+    """Render per-page derivatives with a DerivativePool of the given size."""
+    def render(page, timeout):
+        return thumbnail.generate_derivatives(pdf_path, page_outputs(out_dir, page), {'page': page, 'timeout': timeout})
+
+    pool = DerivativePool(max_workers=workers)
+    return sum(1 for _, success, error in pool.run(pages, render) if success and error is None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--pages', type=int, default=300, help='Number of pages in the synthetic PDF')
+    parser.add_argument('--range', default='1-50', help='Page range for the per-page derivatives')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Parallel page jobs')
+    parser.add_argument('--density', type=int, default=300, help='Fixed density of the legacy command')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix='bench_pdf_')
+    try:
+        pdf_path = os.path.join(work_dir, 'scan.pdf')
+        timed(f"build {args.pages}-page PDF", lambda: make_pdf(pdf_path, args.pages))
+        print(f"{'':<22} {os.path.getsize(pdf_path) / (1024 * 1024):8.1f} MB")
+
+        _, count = timed('page-count', lambda: thumbnail.pdf_page_count(pdf_path))
+        print(f"{'':<22} {count} pages")
+
+        if shutil.which('magick') is None:
+            print("ImageMagick skipped (magick is not on the PATH)")
+            return
+
+        legacy_out = os.path.join(work_dir, 'legacy.jpg')
+        legacy_cmd = ['magick', '-density', str(args.density), f'{pdf_path}[0]',
+                      '-thumbnail', '800x800', '-quality', '85', legacy_out]
+        legacy_time, _ = timed(f'legacy ({args.density} dpi)', lambda: call(legacy_cmd))
+
+        fit_time, _ = timed('fit-page', lambda: thumbnail.generate_derivatives(
+            pdf_path, page_outputs(work_dir, 0), {}
+        ))
+        print(f"{'':<22} speedup x{legacy_time / fit_time:.1f}")
+
+        pages = thumbnail.parse_page_range(args.range, count)
+        serial_dir = os.path.join(work_dir, 'serial')
+        parallel_dir = os.path.join(work_dir, 'parallel')
+        os.makedirs(serial_dir)
+        os.makedirs(parallel_dir)
+
+        serial_time, done = timed(f'pages x{len(pages)} (1 job)', lambda: render_pages(pdf_path, serial_dir, pages, 1))
+        parallel_time, done = timed(f'pages x{len(pages)} ({args.workers} jobs)',
+                                    lambda: render_pages(pdf_path, parallel_dir, pages, args.workers))
+        print(f"{'':<22} speedup x{serial_time / parallel_time:.1f} ({done}/{len(pages)} pages, "
+              f"{len(pages) / parallel_time:.1f} pages/s)")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
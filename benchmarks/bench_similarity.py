@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark for the fuzzy filename similarity scorers.
+
+Compares the original list.remove implementation of calculate_string_similarity
+with the scorers in similarity.py, matching a set of target filenames against a
+synthetic list of candidate filenames. The 'cdist' row scores all targets in
+one batched similarity.best_matches call.
+
+Usage:
+    python benchmarks/bench_similarity.py [--targets 50] [--candidates 20000]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+# Add the repository root to the Python path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import similarity
+
+
+def legacy_similarity(str1, str2):
+    """The original O(n*m) implementation, kept here as the baseline."""
+    if str1 == str2:
+        return 100
+    if str1 in str2 or str2 in str1:
+        overlap = min(len(str1), len(str2))
+        total = max(len(str1), len(str2))
+        return int((overlap / total) * 100)
+    common_chars = 0
+    str2_chars = list(str2)
+    for char in str1:
+        if char in str2_chars:
+            common_chars += 1
+            str2_chars.remove(char)
+    total_chars = max(len(str1), len(str2))
+    if total_chars == 0:
+        return 0
+    return int((common_chars / total_chars) * 100)
+
+
+def legacy_best_match(query, choices):
+    """Best-match loop as performed by the original perform_fuzzy_search."""
+    best_index, best_score = None, 0
+    for index, choice in enumerate(choices):
+        score = legacy_similarity(choice, query)
+        if score > best_score:
+            best_index, best_score = index, score
+            if score == 100:
+                break
+    return (best_index, best_score)
+
+
+def make_filenames(count, seed):
+    """Generate realistic-looking digital object filenames."""
+    rng = random.Random(seed)
+    prefixes = ['grinnell', 'dg', 'tdps_archive', 'scarlet_and_black', 'poweshiek']
+    suffixes = ['OBJ', 'TN', 'SMALL', 'master', 'access', 'p001', 'p002']
+    extensions = ['.tif', '.jpg', '.pdf', '.png']
+    return [
+        f"{rng.choice(prefixes)}_{rng.randint(1, 99999)}_{rng.choice(suffixes)}{rng.choice(extensions)}".lower()
+        for _ in range(count)
+    ]
+
+
+def time_scorer(label, best_match, targets, candidates):
+    """Time best_match over all targets and print the result."""
+    start = time.perf_counter()
+    results = [best_match(target, candidates) for target in targets]
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {elapsed:8.3f}s  ({elapsed / len(targets) * 1000:8.2f} ms/target)")
+    return elapsed, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--targets', type=int, default=50, help='Number of target filenames')
+    parser.add_argument('--candidates', type=int, default=20000, help='Number of candidate filenames')
+    args = parser.parse_args()
+
+    candidates = make_filenames(args.candidates, seed=1)
+    # Near-miss targets so that every candidate has to be scored
+    targets = [name.replace('_', '-', 1) for name in make_filenames(args.targets, seed=2)]
+
+    print(f"Matching {len(targets)} targets against {len(candidates)} candidates")
+    baseline, legacy_results = time_scorer('legacy', legacy_best_match, targets, candidates)
+
+    multiset_time, multiset_results = time_scorer(
+        'multiset', lambda q, c: similarity.best_match(q, c, scorer='multiset'), targets, candidates
+    )
+    if multiset_results != legacy_results:
+        print("WARNING: multiset results differ from the legacy scorer")
+    print(f"{'':<12} speedup x{baseline / multiset_time:.1f}")
+
+    if similarity.fuzz is not None:
+        rapidfuzz_time, _ = time_scorer(
+            'rapidfuzz', lambda q, c: similarity.best_match(q, c, scorer='rapidfuzz'), targets, candidates
+        )
+        print(f"{'':<12} speedup x{baseline / rapidfuzz_time:.1f}")
+        
+        start = time.perf_counter()
+        similarity.best_matches(targets, candidates, scorer='rapidfuzz')
+        cdist_time = time.perf_counter() - start
+        print(f"{'cdist':<12} {cdist_time:8.3f}s  ({cdist_time / len(targets) * 1000:8.2f} ms/target)")
+        print(f"{'':<12} speedup x{baseline / cdist_time:.1f}")
+    else:
+        print("rapidfuzz    skipped (RapidFuzz is not installed)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""
+Derivative Cache Module
+
+This module keeps a content-addressed cache of generated derivatives under
+storage/, so re-running Derivatives on the same objects (after reselecting
+files, or for another collection) links the earlier TN/SMALL files into place
+instead of rebuilding them.
+
+Entries are keyed on the source file's identity and the derivative options.
+Cache hits are hard-linked into the destination when possible and copied
+otherwise. The total size is capped; the least recently used entries (by
+file mtime, refreshed on every hit) are evicted first.
+"""
+
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Default location and size cap of the cache
+DEFAULT_CACHE_DIR = os.path.join("storage", "cache", "derivatives")
+DEFAULT_MAX_MB = 2048
+
+# Eviction trims the cache to this fraction of the cap, so it doesn't run on every store
+EVICT_TO_FRACTION = 0.9
+
+# Options that change the derivative's pixels; anything else (timeouts, ...) is ignored
+KEY_OPTIONS = ['quality', 'trim', 'backend', 'density', 'page']
+
+# Bytes read at a time when hashing source content
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class DerivativeCache:
+    """
+    Size-capped, LRU-evicted cache of derivative files. Safe to share between
+    the threads of a DerivativePool.
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_mb=DEFAULT_MAX_MB, hash_content=False):
+        """
+        Open (and if needed create) the cache directory.
+
+        Args:
+            cache_dir: Directory holding the cached derivatives
+            max_mb: Size cap in megabytes
+            hash_content: If True, key sources by a SHA-256 of their content
+                instead of device/inode/size/mtime (slower, but survives copies)
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = int(float(max_mb) * 1024 * 1024)
+        self.hash_content = hash_content
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._source_ids = {}
+        os.makedirs(cache_dir, exist_ok=True)
+        self._total_bytes = sum(size for _, size, _ in self._entries())
+
+    def key(self, source_path, output, options):
+        """
+        Build the cache key of one derivative.
+
+        Args:
+            source_path: Path to the source file (symlinks are followed)
+            output: Dictionary with the derivative's 'width' and 'height'
+            options: The options passed to the thumbnail generator
+
+        Returns:
+            str: Hex digest identifying the derivative, or None if the source is unreadable
+        """
+        source_id = self._source_id(source_path)
+        if source_id is None:
+            return None
+        description = {name: options.get(name) for name in KEY_OPTIONS}
+        description.update(source=source_id, width=output['width'], height=output['height'])
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def fetch(self, key, dest_path):
+        """
+        Place the cached derivative for key at dest_path.
+
+        Args:
+            key: Cache key from key()
+            dest_path: Where the derivative should appear
+
+        Returns:
+            bool: True on a cache hit, False otherwise
+        """
+        return self.fetch_all([key], [dest_path])
+
+    def fetch_all(self, keys, dest_paths):
+        """
+        Place the cached derivatives for keys at dest_paths, if every one of
+        them is cached. Counts as hits only when all of them were placed; a
+        partial hit counts every derivative as a miss, since the caller
+        regenerates them all.
+
+        Args:
+            keys: Cache keys from key()
+            dest_paths: Where each derivative should appear
+
+        Returns:
+            bool: True if every derivative came from the cache
+        """
+        entries = [self._entry_path(key) if key else None for key in keys]
+        placed = all(entry is not None and os.path.exists(entry) for entry in entries)
+        if placed:
+            try:
+                for entry, dest_path in zip(entries, dest_paths):
+                    self.detach(dest_path)
+                    self._link_or_copy(entry, dest_path)
+                    # Mark as recently used
+                    os.utime(entry)
+            except OSError as e:
+                logger.warning(f"Could not use cached derivatives for {dest_paths}: {e}")
+                placed = False
+
+        with self._lock:
+            if placed:
+                self.hits += len(entries)
+            else:
+                self.misses += len(entries)
+        if placed:
+            for dest_path in dest_paths:
+                logger.info(f"Derivative cache hit: {dest_path}")
+        return placed
+
+    def store(self, key, source_path):
+        """
+        Add a freshly generated derivative to the cache.
+
+        Args:
+            key: Cache key from key()
+            source_path: The generated derivative file
+        """
+        if not key or self.max_bytes <= 0:
+            return
+        entry = self._entry_path(key)
+        try:
+            os.makedirs(os.path.dirname(entry), exist_ok=True)
+            temp_entry = f"{entry}.{threading.get_ident()}.tmp"
+            self._link_or_copy(source_path, temp_entry)
+            size = os.path.getsize(temp_entry)
+        except OSError as e:
+            logger.warning(f"Could not cache derivative {source_path}: {e}")
+            return
+
+        with self._lock:
+            # A replaced entry no longer takes up space
+            try:
+                replaced = os.path.getsize(entry)
+            except OSError:
+                replaced = 0
+            try:
+                os.replace(temp_entry, entry)
+            except OSError as e:
+                logger.warning(f"Could not cache derivative {source_path}: {e}")
+                os.remove(temp_entry)
+                return
+            self._total_bytes += size - replaced
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    @staticmethod
+    def detach(path):
+        """
+        Remove path if it is a hard link shared with the cache, so that writing
+        a new derivative there cannot modify the cached copy.
+
+        Args:
+            path: A derivative output path
+        """
+        try:
+            if os.stat(path).st_nlink > 1:
+                os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _source_id(self, source_path):
+        """Identify a source file, by content hash or by device/inode/size/mtime."""
+        try:
+            info = os.stat(source_path)
+        except OSError as e:
+            logger.warning(f"Cannot stat {source_path} for the derivative cache: {e}")
+            return None
+
+        stat_id = f"{info.st_dev}:{info.st_ino}:{info.st_size}:{info.st_mtime_ns}"
+        if not self.hash_content:
+            return stat_id
+
+        # Hash each source once per run, however many derivatives it has
+        with self._lock:
+            cached = self._source_ids.get(stat_id)
+        if cached:
+            return cached
+        digest = hashlib.sha256()
+        with open(source_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        content_id = f"sha256:{digest.hexdigest()}"
+        with self._lock:
+            self._source_ids[stat_id] = content_id
+        return content_id
+
+    def _entry_path(self, key):
+        """Path of the cache entry for key, fanned out over 256 subdirectories."""
+        return os.path.join(self.cache_dir, key[:2], f"{key}.jpg")
+
+    @staticmethod
+    def _link_or_copy(source, dest):
+        """Hard-link source to dest, copying when linking isn't possible."""
+        try:
+            os.link(source, dest)
+        except OSError:
+            shutil.copyfile(source, dest)
+
+    def _entries(self):
+        """List (path, size, mtime) for every cache entry."""
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for filename in files:
+                path = os.path.join(root, filename)
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, info.st_size, info.st_mtime))
+        return entries
+
+    def _evict(self):
+        """Delete least recently used entries until the cache is under its target size. Caller holds the lock."""
+        entries = sorted(self._entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICT_TO_FRACTION
+        evicted = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+        self._total_bytes = total
+        logger.info(f"Evicted {evicted} derivatives from the cache; {total / (1024 * 1024):.1f} MB remain")
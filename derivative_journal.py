@@ -0,0 +1,169 @@
+"""
+Derivative Journal Module
+
+This module keeps a SQLite journal of derivative jobs in the temporary
+directory of a run. Every source file is recorded as pending, running, done,
+failed or cancelled as the run progresses, so a batch interrupted by closing
+the app can be resumed from where it stopped. A run the user cancels is not
+offered for resuming.
+"""
+
+import os
+import glob
+import time
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Journal file name inside a run's temporary directory
+JOURNAL_NAME = "derivatives_journal.sqlite"
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Statuses of jobs an interrupted run never finished. Failed jobs are finished:
+# retrying a permanently failing file (e.g. an unsupported format) would only
+# fail again. Cancelled jobs were dropped on purpose.
+UNFINISHED = (PENDING, RUNNING)
+
+
+class DerivativeJournal:
+    """
+    Persistent record of the derivative jobs of one temporary directory.
+    Safe to update from DerivativePool worker threads.
+    """
+
+    def __init__(self, temp_dir):
+        """
+        Open (and if needed create) the journal of temp_dir.
+
+        Args:
+            temp_dir: The run's temporary directory (the parent of OBJS/)
+        """
+        self.temp_dir = temp_dir
+        self.path = os.path.join(temp_dir, JOURNAL_NAME)
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                path TEXT PRIMARY KEY,
+                mode TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated REAL NOT NULL
+            );
+        """)
+
+    @classmethod
+    def find_unfinished(cls, temp_base_dir=os.path.join("storage", "temp")):
+        """
+        Find journals of runs that did not finish.
+
+        Args:
+            temp_base_dir: Directory holding the runs' temporary directories
+
+        Returns:
+            list: Temporary directories with unfinished jobs, most recently updated first
+        """
+        found = []
+        for journal_path in glob.glob(os.path.join(temp_base_dir, "*", JOURNAL_NAME)):
+            try:
+                connection = sqlite3.connect(journal_path)
+                try:
+                    row = connection.execute(
+                        f"SELECT COUNT(*), MAX(updated) FROM jobs WHERE status IN ({','.join('?' * len(UNFINISHED))})",
+                        UNFINISHED
+                    ).fetchone()
+                finally:
+                    connection.close()
+            except sqlite3.Error as e:
+                logger.warning(f"Skipping unreadable derivative journal {journal_path}: {e}")
+                continue
+            if row and row[0]:
+                found.append((row[1] or 0, os.path.dirname(journal_path)))
+        return [temp_dir for _, temp_dir in sorted(found, reverse=True)]
+
+    def close(self):
+        """Close the database connection."""
+        self.connection.close()
+
+    def start_run(self, paths, mode):
+        """
+        Record a new run over paths: every one of them becomes pending.
+
+        Args:
+            paths: Source file paths, in processing order (duplicates are recorded once)
+            mode: Mode of the run ('Alma' or 'CollectionBuilder')
+        """
+        now = time.time()
+        with self._lock, self.connection:
+            self.connection.execute("DELETE FROM jobs")
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO jobs (path, mode, position, status, updated) VALUES (?, ?, ?, ?, ?)",
+                [(path, mode, position, PENDING, now) for position, path in enumerate(dict.fromkeys(paths))]
+            )
+
+    def unfinished(self):
+        """
+        List the jobs a resumed run still has to do. Jobs left running by an
+        interrupted run are treated as pending.
+
+        Returns:
+            tuple: (mode: str or None, paths: list in original order)
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                f"SELECT path, mode FROM jobs WHERE status IN ({','.join('?' * len(UNFINISHED))}) ORDER BY position",
+                UNFINISHED
+            ).fetchall()
+        mode = rows[0][1] if rows else None
+        return mode, [path for path, _ in rows]
+
+    def mark(self, path, status, error=None):
+        """
+        Update the status of one job.
+
+        Args:
+            path: Source file path
+            status: PENDING, RUNNING, DONE, FAILED or CANCELLED
+            error: Optional error text for failed jobs
+        """
+        with self._lock, self.connection:
+            self.connection.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated = ?, "
+                "attempts = attempts + (CASE WHEN ? = ? THEN 1 ELSE 0 END) WHERE path = ?",
+                (status, error, time.time(), status, RUNNING, path)
+            )
+
+    def cancel_unfinished(self):
+        """
+        Mark every job the run has not finished as cancelled, after the user
+        cancels it, so the run is not offered for resuming.
+
+        Returns:
+            int: Number of jobs cancelled
+        """
+        with self._lock, self.connection:
+            cursor = self.connection.execute(
+                f"UPDATE jobs SET status = ?, updated = ? WHERE status IN ({','.join('?' * len(UNFINISHED))})",
+                (CANCELLED, time.time(), *UNFINISHED)
+            )
+        return cursor.rowcount
+
+    def counts(self):
+        """
+        Count the jobs in each status.
+
+        Returns:
+            dict: Status -> number of jobs
+        """
+        with self._lock:
+            rows = self.connection.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        return dict(rows)
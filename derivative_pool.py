@@ -0,0 +1,242 @@
+"""
+Derivative Pool Module
+
+This module runs derivative jobs concurrently on a bounded thread pool. The
+heavy lifting happens in ImageMagick subprocesses, so threads are enough to
+keep every core busy. Only a few jobs are queued ahead of the running ones,
+so a cancellation drops the rest of the batch immediately.
+
+plan_resources sizes the pool from the available memory, the core count and
+the sizes of the source images, and works out the ImageMagick -limit values
+that keep the parallel jobs from swapping.
+"""
+
+import os
+import sys
+import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from thumbnail import pillow_pixel_limit
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Share of the available memory that derivative jobs may use together
+MEMORY_BUDGET_FRACTION = 0.6
+
+# ImageMagick (Q16) holds 4 channels x 16 bits per pixel in its pixel cache
+MAGICK_BYTES_PER_PIXEL = 8
+
+# Pixel cache estimate for sources whose dimensions can't be read, per byte of file
+BYTES_PER_FILE_BYTE = 4
+
+# Memory assumed for a Ghostscript-rendered PDF page at derivative size
+PDF_JOB_BYTES = 256 * 1024 * 1024
+
+# Only the largest sources are opened to read their dimensions
+SIZE_SAMPLE = 16
+
+# Never plan less than this much memory per job
+MIN_JOB_BYTES = 256 * 1024 * 1024
+
+# Default per-job timeout in seconds; None lets very large masters take as long as they need
+DEFAULT_JOB_TIMEOUT = None
+
+# Seconds between cancellation checks while jobs are running
+POLL_INTERVAL = 0.2
+
+
+def default_workers():
+    """
+    Default number of concurrent derivative jobs.
+
+    Returns:
+        int: The CPU count (at least 1)
+    """
+    return os.cpu_count() or 1
+
+
+def available_memory():
+    """
+    Memory available to new processes, in bytes.
+
+    Returns:
+        int: Available memory, or None if it cannot be determined
+    """
+    if psutil is not None:
+        return psutil.virtual_memory().available
+    try:
+        if sys.platform.startswith('linux'):
+            with open('/proc/meminfo') as f:
+                for line in f:
+                    if line.startswith('MemAvailable:'):
+                        return int(line.split()[1]) * 1024
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def estimate_job_memory(path):
+    """
+    Estimate the ImageMagick pixel cache needed to decode one source file.
+
+    Args:
+        path: Path to the source file
+
+    Returns:
+        int: Estimated bytes
+    """
+    if path.lower().endswith('.pdf'):
+        return PDF_JOB_BYTES
+    if Image is not None:
+        try:
+            with pillow_pixel_limit(), Image.open(path) as image:
+                width, height = image.size
+            return max(MIN_JOB_BYTES, width * height * MAGICK_BYTES_PER_PIXEL)
+        except Exception:
+            pass
+    try:
+        return max(MIN_JOB_BYTES, os.path.getsize(path) * BYTES_PER_FILE_BYTE)
+    except OSError:
+        return MIN_JOB_BYTES
+
+
+def _format_bytes(value):
+    """Format a byte count as an ImageMagick resource value (MiB)."""
+    return f"{max(1, int(value // (1024 * 1024)))}MiB"
+
+
+def plan_resources(file_paths, max_workers=None):
+    """
+    Size the derivative pool and the per-job ImageMagick limits.
+
+    The largest sources are sampled to estimate the memory one job needs.
+    The pool runs as many jobs as fit in MEMORY_BUDGET_FRACTION of the
+    available memory, but no more than there are cores (or max_workers).
+    Each job is then limited to its share of the cores and of the memory,
+    with twice that as memory-mapped cache before ImageMagick spills to disk.
+
+    Args:
+        file_paths: The source files of the run
+        max_workers: Optional upper bound on the number of jobs
+
+    Returns:
+        dict: 'workers' (int) and 'limits' (dict of ImageMagick -limit values)
+    """
+    cores = default_workers()
+    workers = min(cores, int(max_workers)) if max_workers else cores
+    workers = max(1, min(workers, len(file_paths) or 1))
+
+    sized = []
+    for path in file_paths:
+        try:
+            sized.append((os.path.getsize(path), path))
+        except OSError:
+            continue
+    largest = [path for _, path in sorted(sized, reverse=True)[:SIZE_SAMPLE]]
+    job_bytes = max([estimate_job_memory(path) for path in largest] or [MIN_JOB_BYTES])
+
+    memory = available_memory()
+    if memory:
+        budget = memory * MEMORY_BUDGET_FRACTION
+        workers = max(1, min(workers, int(budget // job_bytes)))
+        memory_limit = max(MIN_JOB_BYTES, budget / workers)
+    else:
+        memory_limit = job_bytes
+
+    plan = {
+        'workers': workers,
+        'limits': {
+            'memory': _format_bytes(memory_limit),
+            'map': _format_bytes(memory_limit * 2),
+            'thread': max(1, cores // workers)
+        }
+    }
+    logger.info(
+        f"Planned {workers} derivative jobs (largest job ~{job_bytes / (1024 * 1024):.0f} MiB, "
+        f"available {(memory or 0) / (1024 * 1024):.0f} MiB, {cores} cores): limits {plan['limits']}"
+    )
+    return plan
+
+
+class DerivativePool:
+    """
+    Runs derivative jobs on a bounded pool of worker threads.
+    """
+
+    def __init__(self, max_workers=None, timeout=None):
+        """
+        Initialize the pool.
+
+        Args:
+            max_workers: Number of jobs run at once (defaults to the CPU count)
+            timeout: Per-job timeout in seconds, passed on to each job
+                     (0 or None means no timeout)
+        """
+        self.max_workers = max(1, int(max_workers or default_workers()))
+        self.timeout = float(timeout) if timeout else DEFAULT_JOB_TIMEOUT
+
+    def run(self, jobs, func, cancel_check=None):
+        """
+        Run func(job, timeout) for every job, max_workers at a time.
+
+        func is responsible for honouring the timeout (e.g. by passing it to
+        subprocess), since a running thread cannot be interrupted.
+
+        Args:
+            jobs: Sequence of jobs (e.g. source file paths)
+            func: Callable taking (job, timeout) and returning a result
+            cancel_check: Optional function that returns True if the run should stop
+
+        Yields:
+            tuple: (job, result, error) for each finished job, in completion order;
+            error is the exception raised by func, or None. When cancelled, jobs
+            that have not started are dropped, running jobs are still reported,
+            and the generator stops.
+        """
+        backlog = list(reversed(jobs))
+        in_flight = {}
+        cancelled = False
+        # Keep one extra job per worker queued so workers never wait on the caller
+        max_in_flight = self.max_workers * 2
+
+        executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="derivatives")
+        try:
+            while backlog or in_flight:
+                if not cancelled and cancel_check and cancel_check():
+                    cancelled = True
+                    dropped = len(backlog)
+                    backlog.clear()
+                    for future in list(in_flight):
+                        if future.cancel():
+                            in_flight.pop(future)
+                            dropped += 1
+                    logger.info(f"Derivative run cancelled; {dropped} queued jobs dropped, "
+                                f"waiting for {len(in_flight)} running jobs")
+
+                while backlog and len(in_flight) < max_in_flight:
+                    job = backlog.pop()
+                    in_flight[executor.submit(func, job, self.timeout)] = job
+
+                if not in_flight:
+                    break
+
+                done, _ = wait(in_flight, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in done:
+                    job = in_flight.pop(future)
+                    try:
+                        yield job, future.result(), None
+                    except Exception as e:
+                        logger.error(f"Derivative job {job} failed: {e}")
+                        yield job, None, e
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
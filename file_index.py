@@ -0,0 +1,377 @@
+"""
+File Index Module
+
+This module provides an in-memory index of the files beneath a search directory,
+so that any number of target filenames can be matched against a single traversal,
+and a persistent SQLite store that keeps those indexes between runs and refreshes
+them incrementally.
+"""
+
+import os
+import re
+import logging
+import sqlite3
+import time
+from array import array
+from collections import Counter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import scanner
+import normalization
+
+logger = logging.getLogger(__name__)
+
+# Default location of the persistent index database
+DEFAULT_INDEX_DB = os.path.join("storage", "index", "file_index.sqlite")
+
+# Directories modified this close to their last scan are rescanned, since
+# coarse (e.g. SMB/FAT) mtime resolution could hide a later change
+MTIME_SETTLE_NS = 2 * 1_000_000_000
+
+# Candidate pruning: indexes smaller than this are always scored exhaustively
+PRUNE_MIN_FILES = 20000
+
+# Number of candidates scored per target when pruning
+DEFAULT_TOP_K = 200
+
+# Tokens shared by more than this fraction of files (".ti", "tif", ...) are ignored
+COMMON_TOKEN_FRACTION = 0.05
+
+# Numeric tokens are prefixed so they can never collide with a trigram
+NUMERIC_TOKEN_PREFIX = "\0"
+NUMERIC_TOKEN_WEIGHT = 3
+
+_DIGIT_RUNS = re.compile(r"\d+")
+
+
+def filename_tokens(name):
+    """
+    Split a lowercased filename into the tokens used for candidate pruning.
+
+    Args:
+        name: The lowercased filename
+
+    Returns:
+        set: Its character trigrams, plus one token per run of digits
+             (leading zeros ignored, so '00123' and '123' share a token)
+    """
+    tokens = {name[i:i + 3] for i in range(len(name) - 2)}
+    tokens.update(NUMERIC_TOKEN_PREFIX + (digits.lstrip("0") or "0") for digits in _DIGIT_RUNS.findall(name))
+    return tokens
+
+
+class FileIndex:
+    """
+    In-memory index of every file found beneath a base directory.
+
+    The index is built with a single directory walk and can then be shared by
+    all fuzzy searches against the same directory, within one run or across runs.
+    """
+
+    def __init__(self, base_path):
+        """
+        Initialize an empty index for base_path.
+
+        Args:
+            base_path: The directory the index describes
+        """
+        self.base_path = os.path.abspath(base_path) if base_path else base_path
+        self.paths = []
+        self.names = []
+        self.lower_names = []
+        self.exact = {}
+        self._postings = None
+
+    @classmethod
+    def build(cls, base_path, cancel_check=None, max_workers=None):
+        """
+        Walk base_path once and index every file found.
+
+        Args:
+            base_path: The directory to index
+            cancel_check: Optional function that returns True if indexing should stop
+            max_workers: Number of directories listed concurrently (see scanner)
+
+        Returns:
+            FileIndex: The populated index, or None if cancelled
+        """
+        index = cls(base_path)
+
+        for root, dirs, files in scanner.walk(base_path, max_workers=max_workers, cancel_check=cancel_check):
+            for filename in files:
+                index.add(os.path.join(root, filename))
+
+        if cancel_check and cancel_check():
+            logger.info(f"Indexing of {base_path} cancelled")
+            return None
+
+        logger.info(f"Indexed {len(index)} files under {base_path}")
+        return index
+
+    @classmethod
+    def load(cls, base_path, db_path=None, cancel_check=None, max_workers=None):
+        """
+        Load the index of base_path from the persistent store, refreshing it
+        incrementally first so it reflects the directory as it is now.
+
+        Args:
+            base_path: The directory to index
+            db_path: Optional path to the index database (DEFAULT_INDEX_DB by default)
+            cancel_check: Optional function that returns True if indexing should stop
+            max_workers: Number of directories scanned concurrently (see scanner)
+
+        Returns:
+            FileIndex: The populated index, or None if cancelled
+        """
+        try:
+            store = FileIndexStore(db_path or DEFAULT_INDEX_DB)
+            try:
+                return store.refresh(base_path, cancel_check=cancel_check, max_workers=max_workers)
+            finally:
+                store.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Persistent file index unavailable ({e}); walking {base_path} instead")
+            return cls.build(base_path, cancel_check=cancel_check, max_workers=max_workers)
+
+    def add(self, path):
+        """
+        Add a single file path to the index.
+
+        Args:
+            path: Full path to the file
+        """
+        name = os.path.basename(path)
+        self.paths.append(path)
+        self.names.append(name)
+        self.lower_names.append(normalization.match_key(name))
+        # Keep the first path seen for each name, matching walk order
+        self.exact.setdefault(name.casefold(), path)
+        self._postings = None
+
+    def candidates(self, filename, limit=DEFAULT_TOP_K):
+        """
+        Find the indexed files most likely to match filename, using an inverted
+        index from trigrams and digit runs to files (built on first use).
+
+        Args:
+            filename: The filename to find candidates for
+            limit: Maximum number of candidates to return
+
+        Returns:
+            list: Positions in this index, best candidates first
+        """
+        if self._postings is None:
+            self._build_postings()
+
+        max_postings = max(1, int(len(self) * COMMON_TOKEN_FRACTION))
+        weighted_postings = []
+        for token in filename_tokens(normalization.match_key(filename)):
+            postings = self._postings.get(token)
+            if not postings or len(postings) > max_postings:
+                continue
+            weight = NUMERIC_TOKEN_WEIGHT if token.startswith(NUMERIC_TOKEN_PREFIX) else 1
+            weighted_postings.append((postings, weight))
+        if not weighted_postings:
+            return []
+
+        if np is None:
+            shared = Counter()
+            for postings, weight in weighted_postings:
+                shared.update(dict.fromkeys(postings, weight) if weight > 1 else postings)
+            return [position for position, _ in shared.most_common(limit)]
+
+        # A position appears once per postings list, so one fancy-indexed add per token is exact
+        shared = np.zeros(len(self), dtype=np.int32)
+        for postings, weight in weighted_postings:
+            shared[np.frombuffer(postings, dtype=np.uintc)] += weight
+        found = np.flatnonzero(shared)
+        if len(found) > limit:
+            found = found[np.argpartition(-shared[found], limit - 1)[:limit]]
+        # Best first, ties in index order
+        found = found[np.lexsort((found, -shared[found]))]
+        return found.tolist()
+
+    def _build_postings(self):
+        """Build the token -> file positions inverted index."""
+        start = time.perf_counter()
+        postings = {}
+        for position, name in enumerate(self.lower_names):
+            for token in filename_tokens(name):
+                entries = postings.get(token)
+                if entries is None:
+                    entries = postings[token] = array("I")
+                entries.append(position)
+        self._postings = postings
+        logger.info(
+            f"Built candidate index of {len(postings)} tokens for {len(self)} files "
+            f"in {time.perf_counter() - start:.2f}s"
+        )
+
+    def lookup(self, filename):
+        """
+        Look up an exact, case-insensitive basename match.
+
+        Args:
+            filename: The filename to look up
+
+        Returns:
+            str: Full path of the first file with that name, or None
+        """
+        return self.exact.get(filename.casefold())
+
+    def covers(self, base_path):
+        """
+        Check whether this index was built for base_path.
+
+        Args:
+            base_path: The directory to compare against
+
+        Returns:
+            bool: True if the index describes base_path
+        """
+        return bool(base_path) and self.base_path == os.path.abspath(base_path)
+
+    def __len__(self):
+        return len(self.paths)
+
+
+class FileIndexStore:
+    """
+    Persistent SQLite store of directory indexes.
+
+    Each indexed root records every directory beneath it (with its mtime) and
+    every file (path, basename, size and mtime). A refresh stats each directory
+    and only re-lists the ones whose mtime changed, since adding, removing or
+    renaming an entry updates the mtime of the directory that holds it. Sizes
+    and mtimes of files in unchanged directories are not re-read.
+    """
+
+    def __init__(self, db_path=DEFAULT_INDEX_DB):
+        """
+        Open (and if needed create) the index database.
+
+        Args:
+            db_path: Path to the SQLite database file
+        """
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db_path = db_path
+        self.connection = sqlite3.connect(db_path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS directories (
+                root TEXT NOT NULL,
+                path TEXT NOT NULL,
+                parent TEXT,
+                mtime_ns INTEGER NOT NULL,
+                scanned_ns INTEGER NOT NULL,
+                PRIMARY KEY (root, path)
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                root TEXT NOT NULL,
+                dir TEXT NOT NULL,
+                name TEXT NOT NULL,
+                size INTEGER,
+                mtime_ns INTEGER,
+                PRIMARY KEY (root, dir, name)
+            );
+        """)
+
+    def close(self):
+        """Close the database connection."""
+        self.connection.close()
+
+    def refresh(self, base_path, cancel_check=None, max_workers=None):
+        """
+        Bring the stored index of base_path up to date and return it.
+
+        Directories are checked concurrently with the scanner module; all
+        database writes happen on the calling thread.
+
+        Args:
+            base_path: The directory to index
+            cancel_check: Optional function that returns True if indexing should stop
+            max_workers: Number of directories scanned concurrently
+
+        Returns:
+            FileIndex: The refreshed index, or None if cancelled (nothing is committed)
+        """
+        root = os.path.abspath(base_path)
+        start = time.perf_counter()
+
+        stored = {}
+        children = {}
+        for path, parent, mtime_ns, scanned_ns in self.connection.execute(
+            "SELECT path, parent, mtime_ns, scanned_ns FROM directories WHERE root = ?", (root,)
+        ):
+            stored[path] = (mtime_ns, scanned_ns)
+            children.setdefault(parent, []).append(path)
+
+        def visit(path):
+            # Runs in a scanner thread: only reads the snapshot taken above
+            try:
+                mtime_ns = os.stat(path).st_mtime_ns
+            except OSError as e:
+                logger.warning(f"Skipping unreadable directory {path}: {e}")
+                return [], None
+
+            previous = stored.get(path)
+            if previous and previous[0] == mtime_ns and previous[1] - mtime_ns >= MTIME_SETTLE_NS:
+                # Unchanged directory: keep its files, but still visit its subdirectories
+                return children.get(path, []), (mtime_ns, None)
+
+            subdirs, files = scanner.list_directory(path, with_stats=True)
+            return subdirs, (mtime_ns, files)
+
+        seen = set()
+        rescanned = 0
+        for path, result in scanner.scan_tree(root, visit, max_workers=max_workers, cancel_check=cancel_check):
+            if result is None:
+                continue
+            seen.add(path)
+            mtime_ns, files = result
+            if files is not None:
+                parent = os.path.dirname(path) if path != root else None
+                self._replace_directory(root, path, parent, mtime_ns, files)
+                rescanned += 1
+
+        if cancel_check and cancel_check():
+            self.connection.rollback()
+            logger.info(f"Indexing of {base_path} cancelled")
+            return None
+
+        # Forget directories that no longer exist
+        removed = [path for path in stored if path not in seen]
+        for path in removed:
+            self.connection.execute("DELETE FROM directories WHERE root = ? AND path = ?", (root, path))
+            self.connection.execute("DELETE FROM files WHERE root = ? AND dir = ?", (root, path))
+        self.connection.commit()
+
+        index = FileIndex(root)
+        for directory, name in self.connection.execute(
+            "SELECT dir, name FROM files WHERE root = ? ORDER BY dir, name", (root,)
+        ):
+            index.add(os.path.join(directory, name))
+
+        elapsed = time.perf_counter() - start
+        logger.info(
+            f"Loaded index of {len(index)} files under {base_path} "
+            f"({rescanned} of {len(seen)} directories rescanned, {len(removed)} removed) in {elapsed:.2f}s"
+        )
+        return index
+
+    def _replace_directory(self, root, path, parent, mtime_ns, files):
+        """Replace the stored files of one directory with a fresh listing."""
+        self.connection.execute("DELETE FROM files WHERE root = ? AND dir = ?", (root, path))
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO files (root, dir, name, size, mtime_ns) VALUES (?, ?, ?, ?, ?)",
+            [(root, path, name, size, file_mtime_ns) for name, size, file_mtime_ns in files]
+        )
+        self.connection.execute(
+            "INSERT OR REPLACE INTO directories (root, path, parent, mtime_ns, scanned_ns) VALUES (?, ?, ?, ?, ?)",
+            (root, path, parent, mtime_ns, time.time_ns())
+        )
@@ -0,0 +1,177 @@
+"""
+Match Engine Module
+
+This module shards fuzzy filename matching across a ProcessPoolExecutor.
+Worker processes report progress through a queue and watch a shared event,
+so a cancellation stops in-flight work within one scoring step instead of
+after the whole batch.
+"""
+
+import os
+import logging
+import multiprocessing
+import queue
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import similarity
+
+logger = logging.getLogger(__name__)
+
+# Below this many target x candidate comparisons, process start-up costs more than it saves
+MIN_PARALLEL_COMPARISONS = 5_000_000
+
+# Seconds between progress/cancel polls in the parent process
+POLL_INTERVAL = 0.1
+
+# Per-process state set by _init_worker
+_worker_choices = None
+_worker_progress = None
+_worker_cancel = None
+
+
+def _init_worker(choices, progress_queue, cancel_event):
+    """Receive the candidate list and shared queue/event once per worker process."""
+    global _worker_choices, _worker_progress, _worker_cancel
+    _worker_choices = choices
+    _worker_progress = progress_queue
+    _worker_cancel = cancel_event
+    # Progress is best effort; a worker must never hang on exit flushing it
+    progress_queue.cancel_join_thread()
+
+
+def _match_shard(start, queries, scorer, top_n):
+    """Match one shard of queries in a worker process."""
+    reported = 0
+
+    def report(done_count):
+        nonlocal reported
+        _worker_progress.put(done_count - reported)
+        reported = done_count
+
+    # One thread per process; the pool already occupies the cores
+    matches = similarity.best_matches(
+        queries, _worker_choices, scorer=scorer,
+        progress_callback=report, cancel_check=_worker_cancel.is_set, workers=1, top_n=top_n
+    )
+    return start, matches
+
+
+class MatchEngine:
+    """
+    Runs similarity.best_matches over shards of targets in worker processes.
+    """
+
+    def __init__(self, max_workers=None, shard_size=64):
+        """
+        Initialize the engine.
+
+        Args:
+            max_workers: Number of worker processes (defaults to the CPU count)
+            shard_size: Number of targets per unit of work
+        """
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.shard_size = max(1, shard_size)
+
+    def should_parallelize(self, target_count, choice_count):
+        """
+        Check whether a batch is large enough to be worth the worker processes.
+
+        Args:
+            target_count: Number of targets to match
+            choice_count: Number of candidates per target
+
+        Returns:
+            bool: True if the batch should be sharded across processes
+        """
+        return self.max_workers > 1 and target_count * choice_count >= MIN_PARALLEL_COMPARISONS
+
+    def best_matches(self, queries, choices, scorer=None, progress_callback=None, cancel_check=None, top_n=None):
+        """
+        Find the best matching choice for every query, like similarity.best_matches.
+
+        Small batches are matched in-process; larger ones are sharded across
+        worker processes.
+
+        Args:
+            queries: Sequence of strings to match
+            choices: Sequence of candidate strings
+            scorer: Scorer name ('multiset' or 'rapidfuzz')
+            progress_callback: Optional callable receiving the number of queries done
+            cancel_check: Optional function that returns True if matching should stop
+            top_n: Optional number of candidates to keep per query
+
+        Returns:
+            list: (choice_index, score) tuples aligned with queries, or None if cancelled.
+                  With top_n, each entry is a list of (choice_index, score) tuples.
+        """
+        if not self.should_parallelize(len(queries), len(choices)):
+            return similarity.best_matches(
+                queries, choices, scorer=scorer,
+                progress_callback=progress_callback, cancel_check=cancel_check, top_n=top_n
+            )
+
+        scorer = similarity.get_scorer_name(scorer)
+        # spawn avoids forking a process that is running UI and scanner threads
+        context = multiprocessing.get_context("spawn")
+        progress_queue = context.Queue()
+        cancel_event = context.Event()
+        results = [None] * len(queries)
+        done_count = 0
+
+        logger.info(
+            f"Matching {len(queries)} targets against {len(choices)} candidates "
+            f"in {self.max_workers} processes"
+        )
+
+        executor = ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(list(choices), progress_queue, cancel_event)
+        )
+        try:
+            pending = {
+                executor.submit(_match_shard, start, list(queries[start:start + self.shard_size]), scorer, top_n)
+                for start in range(0, len(queries), self.shard_size)
+            }
+
+            while pending:
+                if cancel_check and cancel_check():
+                    cancel_event.set()
+                    logger.info("Fuzzy matching cancelled; stopping worker processes")
+                    return None
+
+                finished, pending = wait(pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    start, matches = future.result()
+                    if matches is None:
+                        return None
+                    results[start:start + len(matches)] = matches
+
+                # Report only when workers made progress, not on every poll
+                newly_done = self._drain(progress_queue)
+                if newly_done:
+                    done_count += newly_done
+                    if progress_callback:
+                        progress_callback(done_count)
+
+            if progress_callback and done_count != len(queries):
+                progress_callback(len(queries))
+            return results
+        finally:
+            # Stop in-flight shards (workers poll the event) and wait for the
+            # workers to exit before the queue and event are torn down; workers
+            # still starting up would otherwise fail to unpickle them
+            cancel_event.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+            progress_queue.close()
+
+    @staticmethod
+    def _drain(progress_queue):
+        """Sum all progress increments currently waiting in the queue."""
+        total = 0
+        while True:
+            try:
+                total += progress_queue.get_nowait()
+            except queue.Empty:
+                return total
@@ -0,0 +1,115 @@
+"""
+Filename Normalization Module
+
+This module holds the filename sanitization rules used when staging files and
+updating CSVs, plus the canonical form the fuzzy matcher compares. The regexes
+are compiled once and the sanitizers are memoized, so a filename that appears
+in several stages of a run (search, symlink staging, CSV update) is only
+sanitized once. match_key is a plain str.lower(), which is cheaper than a
+cache lookup, so it is not memoized.
+"""
+
+import os
+import re
+from functools import lru_cache
+
+# Number of distinct filenames remembered by each normalization cache
+CACHE_SIZE = 262144
+
+# sanitize_filename rules
+_UNSAFE_CHARS = re.compile(r'[^\w\-_\.]')
+_UNDERSCORES_AROUND_HYPHEN = re.compile(r'_*-_*')
+_REPEATED_UNDERSCORES = re.compile(r'_+')
+
+# sanitize_basename rules
+_SPACED_DASH = re.compile(r'\s+-\s+')
+_SPACE_BEFORE_DASH = re.compile(r'\s+-')
+_SPACE_AFTER_DASH = re.compile(r'-\s+')
+_WHITESPACE = re.compile(r'\s+')
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def sanitize_filename(filename):
+    """
+    Sanitize a filename by replacing spaces and special characters.
+
+    Args:
+        filename: The filename to sanitize
+
+    Returns:
+        str: Sanitized filename with spaces replaced by underscores,
+             special characters removed, and hyphens cleaned up
+    """
+    # Replace spaces with underscores
+    sanitized = filename.replace(' ', '_')
+    # Remove or replace other problematic characters (keep word chars, hyphens, underscores, dots)
+    sanitized = _UNSAFE_CHARS.sub('_', sanitized)
+    # Clean up multiple underscores around hyphens: _-_ or -_ or _- becomes just -
+    sanitized = _UNDERSCORES_AROUND_HYPHEN.sub('-', sanitized)
+    # Clean up any remaining multiple consecutive underscores
+    return _REPEATED_UNDERSCORES.sub('_', sanitized)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def sanitize_basename(filename):
+    """
+    Sanitize a single filename by replacing spaces with underscores and
+    turning spaces adjacent to dashes into double dashes. The extension is
+    kept as-is apart from surrounding whitespace.
+
+    Args:
+        filename: The filename (no directory part)
+
+    Returns:
+        str: The sanitized filename
+    """
+    # Strip leading and trailing whitespace from the entire filename
+    filename = filename.strip()
+
+    # Split filename and extension to handle them separately, then strip the
+    # name part as well to handle trailing spaces before the extension
+    name_part, ext_part = os.path.splitext(filename)
+    name_part = name_part.strip()
+
+    # Replace space-dash-space with a double dash first, then any remaining
+    # space-dash and dash-space patterns
+    name_part = _SPACED_DASH.sub('--', name_part)
+    name_part = _SPACE_BEFORE_DASH.sub('--', name_part)
+    name_part = _SPACE_AFTER_DASH.sub('--', name_part)
+
+    # Replace remaining spaces with underscores
+    name_part = _WHITESPACE.sub('_', name_part)
+
+    return name_part + ext_part.strip()
+
+
+def match_key(filename):
+    """
+    Canonical form of a filename as compared by the fuzzy matcher.
+
+    Args:
+        filename: The filename
+
+    Returns:
+        str: The lowercased filename
+    """
+    return filename.lower()
+
+
+def cache_info():
+    """
+    Report hit/miss statistics of the normalization caches.
+
+    Returns:
+        dict: Cache name -> functools cache_info tuple
+    """
+    return {
+        'sanitize_filename': sanitize_filename.cache_info(),
+        'sanitize_basename': sanitize_basename.cache_info(),
+    }
+
+
+def clear_caches():
+    """Empty all normalization caches (e.g. when starting a new run)."""
+    sanitize_filename.cache_clear()
+    sanitize_basename.cache_clear()
@@ -0,0 +1,131 @@
+"""
+Directory Scanner Module
+
+This module walks directory trees concurrently with os.scandir and a bounded
+thread pool. Listing directories on SMB/NFS shares is dominated by network
+round-trips rather than CPU, so several directories are listed at once.
+"""
+
+import os
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+# Default number of directories listed concurrently
+DEFAULT_MAX_WORKERS = 16
+
+
+def list_directory(path, with_stats=False):
+    """
+    List one directory with os.scandir.
+
+    Symlinked directories are reported as neither files nor subdirectories to
+    descend into, matching os.walk's default of not following links.
+
+    Args:
+        path: The directory to list
+        with_stats: If True, return (name, size, mtime_ns) tuples for files
+
+    Returns:
+        tuple: (subdirectory_paths: list, files: list of names or stat tuples)
+    """
+    subdirs = []
+    files = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir():
+                        if not entry.is_symlink():
+                            subdirs.append(entry.path)
+                        continue
+                    if with_stats:
+                        info = entry.stat()
+                        files.append((entry.name, info.st_size, info.st_mtime_ns))
+                    else:
+                        files.append(entry.name)
+                except OSError:
+                    continue
+    except OSError as e:
+        logger.warning(f"Could not list directory {path}: {e}")
+    return subdirs, files
+
+
+def scan_tree(top, visit, max_workers=None, max_depth=None, cancel_check=None):
+    """
+    Traverse the directory tree under top, visiting directories concurrently.
+
+    visit(path) runs in a worker thread for every directory reached and must
+    return (subdirectory_paths, result). The subdirectories it returns are
+    visited next, so visit decides what to descend into.
+
+    Args:
+        top: The directory to start from
+        visit: Callable taking a directory path and returning (subdirs, result)
+        max_workers: Number of directories visited at once (DEFAULT_MAX_WORKERS by default)
+        max_depth: Optional depth limit; top is depth 0
+        cancel_check: Optional function that returns True if the scan should stop
+
+    Yields:
+        tuple: (path, result) for each directory, in completion order. When
+        cancelled the generator simply stops; callers check cancel_check again.
+    """
+    max_workers = max(1, int(max_workers or DEFAULT_MAX_WORKERS))
+    # Bound the number of queued directories so huge trees don't flood the pool
+    max_in_flight = max_workers * 4
+
+    backlog = deque([(top, 0)])
+    in_flight = {}
+
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="scanner")
+    try:
+        while backlog or in_flight:
+            if cancel_check and cancel_check():
+                logger.info(f"Scan of {top} cancelled")
+                return
+
+            while backlog and len(in_flight) < max_in_flight:
+                path, depth = backlog.popleft()
+                in_flight[executor.submit(visit, path)] = (path, depth)
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, depth = in_flight.pop(future)
+                try:
+                    subdirs, result = future.result()
+                except Exception as e:
+                    logger.warning(f"Failed to scan directory {path}: {e}")
+                    continue
+
+                if max_depth is None or depth < max_depth:
+                    backlog.extend((subdir, depth + 1) for subdir in subdirs)
+                yield path, result
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def walk(top, max_workers=None, max_depth=None, cancel_check=None):
+    """
+    Concurrent replacement for os.walk.
+
+    Directories are yielded in completion order rather than top-down order.
+
+    Args:
+        top: The directory to start from
+        max_workers: Number of directories listed at once
+        max_depth: Optional depth limit; top is depth 0
+        cancel_check: Optional function that returns True if the walk should stop
+
+    Yields:
+        tuple: (dirpath, dirnames, filenames), as os.walk does
+    """
+    def visit(path):
+        subdirs, files = list_directory(path)
+        return subdirs, ([os.path.basename(subdir) for subdir in subdirs], files)
+
+    for dirpath, (dirnames, filenames) in scan_tree(
+        top, visit, max_workers=max_workers, max_depth=max_depth, cancel_check=cancel_check
+    ):
+        yield dirpath, dirnames, filenames
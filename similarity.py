@@ -0,0 +1,304 @@
+"""
+String Similarity Module
+
+This module provides the pluggable scorers used by the fuzzy filename search.
+Every scorer returns an integer percentage (0-100), where 100 means the two
+strings are identical.
+
+Available scorers:
+    - multiset: The original common-character measure, computed from character
+      counts instead of repeated list.remove calls
+    - rapidfuzz: RapidFuzz's normalized Indel ratio, evaluated in C
+"""
+
+import heapq
+import logging
+from collections import Counter
+
+try:
+    from rapidfuzz import fuzz, process
+except ImportError:
+    fuzz = None
+    process = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SCORER = 'multiset'
+
+# Upper bound on the number of cells in one cdist score matrix (float32 cells)
+CDIST_MAX_CELLS = 32 * 1024 * 1024
+
+# Default number of candidates kept per query by top_matches
+DEFAULT_TOP_N = 5
+
+
+def _multiset_ratio(str1, char_counts1, str2):
+    """
+    Score str1 against str2, where char_counts1 is the list of
+    (character, count) pairs of str1, computed once per query.
+    """
+    if str1 == str2:
+        return 100
+
+    # Simple substring matching approach
+    if str1 in str2 or str2 in str1:
+        # Calculate ratio based on length overlap
+        overlap = min(len(str1), len(str2))
+        total = max(len(str1), len(str2))
+        return int((overlap / total) * 100)
+
+    # Count common characters (size of the multiset intersection)
+    common_chars = 0
+    for char, count1 in char_counts1:
+        count2 = str2.count(char)
+        common_chars += count1 if count1 < count2 else count2
+
+    # Calculate similarity based on common characters
+    total_chars = max(len(str1), len(str2))
+    if total_chars == 0:
+        return 0
+
+    return int((common_chars / total_chars) * 100)
+
+
+def multiset_similarity(str1, str2):
+    """
+    Score two strings by the characters they have in common.
+
+    Identical strings score 100, a substring scores by length overlap, and
+    anything else scores by the number of shared characters (counted with
+    multiplicity) relative to the longer string.
+
+    Args:
+        str1: First string
+        str2: Second string
+
+    Returns:
+        int: Similarity percentage (0-100)
+    """
+    return _multiset_ratio(str1, list(Counter(str1).items()), str2)
+
+
+def rapidfuzz_similarity(str1, str2):
+    """
+    Score two strings with RapidFuzz's normalized Indel ratio.
+
+    Identical strings score 100; other pairs score on the same 0-100 scale,
+    truncated to an integer like the multiset scorer. The Indel ratio is
+    stricter than the multiset measure for reordered characters.
+
+    Args:
+        str1: First string
+        str2: Second string
+
+    Returns:
+        int: Similarity percentage (0-100)
+    """
+    if str1 == str2:
+        return 100
+    return int(fuzz.ratio(str1, str2))
+
+
+SCORERS = {
+    'multiset': multiset_similarity,
+    'rapidfuzz': rapidfuzz_similarity,
+}
+
+
+def get_scorer_name(name=None):
+    """
+    Resolve a scorer name, falling back to the default when the requested
+    scorer is unknown or its library is not installed.
+
+    Args:
+        name: The requested scorer name, or None for the default
+
+    Returns:
+        str: A usable scorer name
+    """
+    if not name:
+        return DEFAULT_SCORER
+    if name not in SCORERS:
+        logger.warning(f"Unknown similarity scorer '{name}', using '{DEFAULT_SCORER}'")
+        return DEFAULT_SCORER
+    if name == 'rapidfuzz' and fuzz is None:
+        logger.warning(f"RapidFuzz is not installed, using '{DEFAULT_SCORER}' scorer")
+        return DEFAULT_SCORER
+    return name
+
+
+def best_match(query, choices, scorer=None):
+    """
+    Find the choice that best matches query.
+
+    The first choice with the highest score wins, and scanning stops early at
+    a perfect score.
+
+    Args:
+        query: The string to match
+        choices: Sequence of candidate strings
+        scorer: Scorer name ('multiset' or 'rapidfuzz'); defaults to 'multiset'
+
+    Returns:
+        tuple: (choice_index, score), or (None, 0) if nothing scored above 0
+    """
+    scorer = get_scorer_name(scorer)
+
+    if scorer == 'rapidfuzz':
+        result = process.extractOne(query, choices, scorer=fuzz.ratio, score_cutoff=1)
+        if result is None:
+            return (None, 0)
+        choice, score, choice_index = result
+        score = 100 if choice == query else int(score)
+        return (choice_index, score) if score > 0 else (None, 0)
+
+    best_index = None
+    best_score = 0
+    query_counts = list(Counter(query).items())
+    for choice_index, choice in enumerate(choices):
+        score = _multiset_ratio(query, query_counts, choice)
+        if score > best_score:
+            best_score = score
+            best_index = choice_index
+            if score == 100:
+                break
+
+    return (best_index, best_score)
+
+
+def top_matches(query, choices, scorer=None, limit=DEFAULT_TOP_N):
+    """
+    Find the `limit` choices that best match query, in one pass over choices.
+
+    A bounded min-heap holds the best candidates seen so far, so memory stays
+    O(limit) however many choices there are. Ties are broken by choice order,
+    so the first entry is always the one best_match would return.
+
+    Args:
+        query: The string to match
+        choices: Sequence of candidate strings
+        scorer: Scorer name ('multiset' or 'rapidfuzz'); defaults to 'multiset'
+        limit: Maximum number of candidates to return
+
+    Returns:
+        list: (choice_index, score) tuples, best first; only scores above 0 are included
+    """
+    scorer = get_scorer_name(scorer)
+    limit = max(1, int(limit))
+
+    if scorer == 'rapidfuzz':
+        results = process.extract(query, choices, scorer=fuzz.ratio, limit=limit, score_cutoff=1)
+        matches = [
+            (choice_index, 100 if choice == query else int(score))
+            for choice, score, choice_index in results
+        ]
+        matches.sort(key=lambda match: (-match[1], match[0]))
+        return [match for match in matches if match[1] > 0]
+
+    # Heap entries are (score, -choice_index): the root is the weakest candidate kept
+    heap = []
+    query_counts = list(Counter(query).items())
+    for choice_index, choice in enumerate(choices):
+        score = _multiset_ratio(query, query_counts, choice)
+        if score <= 0:
+            continue
+        if len(heap) < limit:
+            heapq.heappush(heap, (score, -choice_index))
+        elif score > heap[0][0]:
+            heapq.heapreplace(heap, (score, -choice_index))
+        else:
+            continue
+        # Nothing can displace a full heap of perfect scores
+        if len(heap) == limit and heap[0][0] == 100:
+            break
+
+    return [(-negative_index, score) for score, negative_index in sorted(heap, reverse=True)]
+
+
+def _top_rows(scores, top_n):
+    """
+    Take the top_n columns of each row of a cdist score matrix.
+
+    Returns a list (one per row) of (choice_index, score) tuples, best first,
+    with scores truncated to integers and zero scores dropped.
+    """
+    column_count = scores.shape[1]
+    top_n = min(top_n, column_count)
+    # The top_n-th best score of each row; every column scoring at least that
+    # much is a contender, including all ties, so the lowest index wins a tie
+    # exactly as argmax does
+    cutoffs = np.partition(scores, column_count - top_n, axis=1)[:, column_count - top_n]
+
+    rows = []
+    for row_scores, cutoff in zip(scores, cutoffs):
+        row_columns = np.flatnonzero(row_scores >= cutoff).tolist()
+        values = row_scores[row_columns].tolist()
+        ranked = sorted(zip(row_columns, values), key=lambda match: (-match[1], match[0]))[:top_n]
+        rows.append([(choice_index, int(score)) for choice_index, score in ranked if int(score) > 0])
+    return rows
+
+
+def best_matches(queries, choices, scorer=None, progress_callback=None, cancel_check=None, workers=-1, top_n=None):
+    """
+    Find the best matching choice for every query.
+
+    With the rapidfuzz scorer (and NumPy available) all queries are scored
+    against all choices in batched rapidfuzz.process.cdist calls, spread over
+    `workers` threads, and each query's best choice is taken with argmax. The
+    queries are processed in chunks so that one score matrix never exceeds
+    CDIST_MAX_CELLS cells. Other scorers fall back to best_match per query.
+
+    When top_n is given, the `top_n` best choices of each query are kept from
+    the same pass (argpartition on each score matrix, or top_matches per query).
+
+    Args:
+        queries: Sequence of strings to match
+        choices: Sequence of candidate strings
+        scorer: Scorer name ('multiset' or 'rapidfuzz'); defaults to 'multiset'
+        progress_callback: Optional callable receiving the number of queries done
+        cancel_check: Optional function that returns True if matching should stop
+        workers: Number of threads for cdist (-1 uses all cores)
+        top_n: Optional number of candidates to keep per query
+
+    Returns:
+        list: (choice_index, score) tuples aligned with queries, or None if cancelled.
+              With top_n, each entry is instead a list of (choice_index, score)
+              tuples, best first (see top_matches).
+    """
+    scorer = get_scorer_name(scorer)
+    results = []
+
+    if scorer == 'rapidfuzz' and np is not None and len(choices) > 0:
+        chunk_size = max(1, CDIST_MAX_CELLS // len(choices))
+        for start in range(0, len(queries), chunk_size):
+            if cancel_check and cancel_check():
+                return None
+            chunk = queries[start:start + chunk_size]
+            scores = process.cdist(chunk, choices, scorer=fuzz.ratio, dtype=np.float32, workers=workers)
+            if top_n:
+                results.extend(_top_rows(scores, top_n))
+            else:
+                best_indices = scores.argmax(axis=1)
+                # Truncate to integers, as rapidfuzz_similarity does
+                best_scores = scores[np.arange(len(chunk)), best_indices].astype(np.int32)
+                for choice_index, score in zip(best_indices.tolist(), best_scores.tolist()):
+                    results.append((choice_index, score) if score > 0 else (None, 0))
+            if progress_callback:
+                progress_callback(len(results))
+        return results
+
+    for query in queries:
+        if cancel_check and cancel_check():
+            return None
+        if top_n:
+            results.append(top_matches(query, choices, scorer=scorer, limit=top_n))
+        else:
+            results.append(best_match(query, choices, scorer=scorer))
+        if progress_callback:
+            progress_callback(len(results))
+    return results
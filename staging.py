@@ -0,0 +1,485 @@
+"""
+Staging Module
+
+This module stages selected files into a temporary OBJS/ directory under
+sanitized names. On a network share every syscall is a round-trip, so staging
+is done in phases:
+
+    1. check: the sources are stat'ed concurrently
+    2. plan: sanitized names and collision suffixes are worked out in memory,
+       against one listing of OBJS/ instead of an exists() loop per file
+    3. link: the staged files are created concurrently, in batches
+
+The time spent in each phase is reported so slow shares can be diagnosed.
+
+Files can be staged as symlinks, hard links, reflinks (copy-on-write clones
+via the FICLONE ioctl) or real copies (os.copy_file_range / sendfile on
+Linux, a buffered copy elsewhere). The
+default is a symlink, which costs no space and keeps the source's identity for
+the derivative cache. Some uploaders and the ImageMagick sandbox can't follow
+symlinks across mounts, so the 'auto' strategy stages a reflink or hard link
+where the source's filesystem allows it and a symlink otherwise. Masters
+usually live on another volume or a network share, so full copies are only
+made when the 'copy' strategy is chosen explicitly. What works is learned per
+source filesystem, so a failing method is tried only once per device.
+
+Optionally the MD5 and SHA-256 fixity values of every source are computed
+while it is staged: copies are hashed as they are written, and linked files
+are read once with large buffers on the staging threads (hashlib releases the
+GIL, so several files are hashed at once).
+"""
+
+import os
+import sys
+import time
+import errno
+import shutil
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STRATEGY = 'symlink'
+STRATEGIES = ['auto', 'symlink', 'hardlink', 'reflink', 'copy']
+
+# Methods tried, in order, by the 'auto' strategy (never a copy)
+AUTO_ORDER = ['reflink', 'hardlink', 'symlink']
+
+# Linux FICLONE ioctl request number (_IOW(0x94, 9, int))
+FICLONE = 0x40049409
+
+# Bytes copied per copy_file_range / sendfile call
+COPY_CHUNK_SIZE = 64 * 1024 * 1024
+
+# Bytes read at a time when checksumming sources
+CHECKSUM_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Errors a kernel copy can't recover from by falling back to a buffered copy
+FATAL_COPY_ERRNOS = {errno.ENOSPC, errno.EIO}
+
+# Errors meaning a staging method is not available on a filesystem (rather than a per-file problem)
+UNSUPPORTED_ERRNOS = {
+    errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTSUP, errno.ENOTTY, errno.EINVAL,
+    errno.ENOSYS, errno.EPERM, errno.EMLINK
+}
+
+# Default number of concurrent syscalls (stat / symlink)
+DEFAULT_MAX_WORKERS = 16
+
+# Files handled per worker task
+BATCH_SIZE = 256
+
+
+def _batches(items, size=BATCH_SIZE):
+    """Split items into consecutive lists of at most size items."""
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+def _run_batched(func, items, max_workers):
+    """Apply func to every item on a thread pool, a batch per task, keeping the order."""
+    if not items:
+        return []
+    if len(items) <= BATCH_SIZE or max_workers == 1:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="staging") as executor:
+        results = executor.map(lambda batch: [func(item) for item in batch], _batches(items))
+        return [result for batch in results for result in batch]
+
+
+def _source_stat(path):
+    """os.stat of the file path names (following symlinks), or None if it doesn't exist."""
+    try:
+        return os.stat(path)
+    except (OSError, ValueError):
+        return None
+
+
+def get_strategy_name(name=None):
+    """
+    Resolve a staging strategy name, falling back to the default when the
+    requested strategy is unknown.
+
+    Args:
+        name: The requested strategy name, or None for the default
+
+    Returns:
+        str: A usable strategy name
+    """
+    if not name:
+        return DEFAULT_STRATEGY
+    if name not in STRATEGIES:
+        logger.warning(f"Unknown staging strategy '{name}', using '{DEFAULT_STRATEGY}'")
+        return DEFAULT_STRATEGY
+    return name
+
+
+def symlink_file(source, dest):
+    """Stage source at dest as a symbolic link to its absolute path."""
+    os.symlink(os.path.abspath(source), dest)
+
+
+def hardlink_file(source, dest):
+    """Stage source at dest as a hard link (same filesystem only)."""
+    os.link(source, dest)
+
+
+def _copy_into(source, dest, copy_data):
+    """Create dest exclusively, fill it with copy_data(src_file, dst_file), and keep source's times and mode."""
+    with open(source, 'rb') as src:
+        dst_fd = os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        try:
+            with open(dst_fd, 'wb', closefd=True) as dst:
+                copy_data(src, dst)
+        except BaseException:
+            try:
+                os.remove(dest)
+            except OSError:
+                pass
+            raise
+    shutil.copystat(source, dest)
+
+
+def reflink_file(source, dest):
+    """Stage source at dest as a copy-on-write clone (Btrfs, XFS, bcachefs, ...)."""
+    if fcntl is None or not sys.platform.startswith('linux'):
+        raise OSError(errno.EOPNOTSUPP, "Reflinks are only supported on Linux")
+    _copy_into(source, dest, lambda src, dst: fcntl.ioctl(dst.fileno(), FICLONE, src.fileno()))
+
+
+def _copy_file_range(src_fd, dst_fd, offset, count):
+    """os.copy_file_range with the argument order shared by the kernel copies."""
+    return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+
+
+def _sendfile(src_fd, dst_fd, offset, count):
+    """os.sendfile with the argument order shared by the kernel copies."""
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+
+def _kernel_copies():
+    """The in-kernel copy functions usable on this platform, best first."""
+    copies = []
+    if hasattr(os, 'copy_file_range'):
+        copies.append(_copy_file_range)
+    # Elsewhere (macOS) sendfile only writes to sockets
+    if sys.platform.startswith('linux') and hasattr(os, 'sendfile'):
+        copies.append(_sendfile)
+    return copies
+
+
+def _copy_data(src, dst):
+    """Copy a whole file in the kernel where possible, in COPY_CHUNK_SIZE chunks."""
+    size = os.fstat(src.fileno()).st_size
+    for kernel_copy in _kernel_copies():
+        try:
+            offset = 0
+            while offset < size:
+                copied = kernel_copy(src.fileno(), dst.fileno(), offset, min(COPY_CHUNK_SIZE, size - offset))
+                if copied == 0:
+                    break
+                offset += copied
+            if offset >= size:
+                return
+        except OSError as e:
+            if e.errno in FATAL_COPY_ERRNOS:
+                raise
+        # Start over with the next method
+        dst.seek(0)
+        dst.truncate()
+    src.seek(0)
+    shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+
+
+def copy_file(source, dest):
+    """Stage source at dest as an independent copy."""
+    _copy_into(source, dest, _copy_data)
+
+
+def _read_chunks(f):
+    """Yield the contents of an open binary file in CHECKSUM_CHUNK_SIZE pieces, reusing one buffer."""
+    # Small files don't need the full-size buffer
+    buffer = bytearray(min(CHECKSUM_CHUNK_SIZE, os.fstat(f.fileno()).st_size + 1))
+    view = memoryview(buffer)
+    while True:
+        count = f.readinto(buffer)
+        if not count:
+            return
+        yield view[:count]
+
+
+def _digests(md5, sha256):
+    """Fixity values of finished hashers."""
+    return {'md5': md5.hexdigest(), 'sha256': sha256.hexdigest()}
+
+
+def checksum_file(path):
+    """
+    Compute the MD5 and SHA-256 of a file in a single read.
+
+    Args:
+        path: Path to the file
+
+    Returns:
+        dict: {'md5': hex digest, 'sha256': hex digest}
+    """
+    md5, sha256 = hashlib.md5(), hashlib.sha256()
+    with open(path, 'rb', buffering=0) as f:
+        for chunk in _read_chunks(f):
+            md5.update(chunk)
+            sha256.update(chunk)
+    return _digests(md5, sha256)
+
+
+def copy_file_with_checksums(source, dest):
+    """
+    Stage source at dest as a copy, hashing the data on its way through.
+
+    Returns:
+        dict: {'md5': hex digest, 'sha256': hex digest} of the copied data
+    """
+    md5, sha256 = hashlib.md5(), hashlib.sha256()
+
+    def copy_data(src, dst):
+        for chunk in _read_chunks(src):
+            md5.update(chunk)
+            sha256.update(chunk)
+            dst.write(chunk)
+
+    _copy_into(source, dest, copy_data)
+    return _digests(md5, sha256)
+
+
+STAGERS = {
+    'symlink': symlink_file,
+    'hardlink': hardlink_file,
+    'reflink': reflink_file,
+    'copy': copy_file,
+}
+
+
+class StagingSelector:
+    """
+    Stages files with the methods of a strategy, skipping methods that turned
+    out to be unsupported on the source's filesystem. 'auto' tries AUTO_ORDER;
+    'reflink' and 'hardlink' fall back to a symlink. Files are only copied by
+    the 'copy' strategy. Safe to share between threads.
+    """
+
+    def __init__(self, strategy=DEFAULT_STRATEGY):
+        """
+        Initialize the selector.
+
+        Args:
+            strategy: One of STRATEGIES
+        """
+        self.strategy = get_strategy_name(strategy)
+        self._lock = threading.Lock()
+        self._unsupported = {}
+
+    def methods(self, device):
+        """Methods to try, in order, for a source on device."""
+        if self.strategy in ('symlink', 'copy'):
+            return [self.strategy]
+        order = AUTO_ORDER if self.strategy == 'auto' else [self.strategy, 'symlink']
+        with self._lock:
+            unsupported = self._unsupported.get(device, set())
+            return [method for method in order if method not in unsupported] or ['symlink']
+
+    def stage(self, source, dest, device=None, checksums=False):
+        """
+        Create dest from source.
+
+        Args:
+            source: The source file
+            dest: The staged path, which must not exist
+            device: st_dev of source, used to remember what works per filesystem
+            checksums: If True, also compute the source's MD5 and SHA-256
+
+        Returns:
+            tuple: (method: str, checksums: dict or None)
+
+        Raises:
+            FileExistsError: If dest already exists
+            OSError: If no method could stage the file
+        """
+        error = None
+        for method in self.methods(device):
+            try:
+                if checksums and method == 'copy':
+                    return method, copy_file_with_checksums(source, dest)
+                STAGERS[method](source, dest)
+            except FileExistsError:
+                raise
+            except OSError as e:
+                error = e
+                if method not in ('copy', 'symlink') and e.errno in UNSUPPORTED_ERRNOS:
+                    with self._lock:
+                        if method not in self._unsupported.setdefault(device, set()):
+                            self._unsupported[device].add(method)
+                            logger.info(f"Staging by {method} unavailable for device {device}: {e}")
+                continue
+            # Linked files are read once for their checksums
+            return method, checksum_file(source) if checksums else None
+        raise error
+
+
+def is_case_insensitive(directory):
+    """
+    Check whether names in directory are case-insensitive (e.g. macOS or Windows defaults).
+
+    Args:
+        directory: An existing directory whose name contains letters
+
+    Returns:
+        bool: True if the swapped-case name resolves to the same directory
+    """
+    parent, name = os.path.split(os.path.abspath(directory))
+    swapped = name.swapcase()
+    if swapped == name:
+        return False
+    try:
+        return os.path.samefile(directory, os.path.join(parent, swapped))
+    except OSError:
+        return False
+
+
+def plan_names(filenames, existing, case_insensitive=False):
+    """
+    Choose a unique name for each file, adding _1, _2, ... before the extension
+    on collisions, the same way staging always has.
+
+    Args:
+        filenames: Sanitized filenames, in staging order
+        existing: Names already present in the destination directory
+        case_insensitive: If True, names differing only in case collide
+
+    Returns:
+        list: The unique names, in the same order
+    """
+    fold = (lambda name: name.casefold()) if case_insensitive else (lambda name: name)
+    taken = {fold(name) for name in existing}
+    names = []
+    for filename in filenames:
+        name = filename
+        if fold(name) in taken:
+            base_name, ext = os.path.splitext(filename)
+            counter = 1
+            while fold(f"{base_name}_{counter}{ext}") in taken:
+                counter += 1
+            name = f"{base_name}_{counter}{ext}"
+        taken.add(fold(name))
+        names.append(name)
+    return names
+
+
+def stage_files(file_paths, dest_dir, sanitize, max_workers=DEFAULT_MAX_WORKERS, strategy=DEFAULT_STRATEGY,
+                checksums=False):
+    """
+    Stage file_paths into dest_dir with sanitized, unique names.
+
+    Args:
+        file_paths: Source file paths, in order
+        dest_dir: Existing destination directory (a run's OBJS/)
+        sanitize: Function mapping an original filename to its sanitized form
+        max_workers: Number of concurrent syscalls
+        strategy: One of STRATEGIES ('auto' picks per filesystem)
+        checksums: If True, compute each source's MD5 and SHA-256 while staging it
+
+    Returns:
+        tuple: (staged: list of dicts with 'original_path', 'original_filename',
+                'temp_path', 'sanitized_filename', 'staging_method' and 'size'
+                (plus 'md5' and 'sha256' with checksums), in input order;
+                timings: dict of phase -> seconds)
+    """
+    timings = {}
+    max_workers = max(1, int(max_workers or DEFAULT_MAX_WORKERS))
+    selector = StagingSelector(strategy)
+
+    # Phase 1: check the sources
+    start = time.perf_counter()
+    candidates = [path for path in file_paths if path]
+    found_stats = _run_batched(_source_stat, candidates, max_workers)
+    sources = []
+    devices = []
+    sizes = []
+    for path, info in zip(candidates, found_stats):
+        if info is not None:
+            sources.append(path)
+            devices.append(info.st_dev)
+            sizes.append(info.st_size)
+        else:
+            logger.warning(f"Skipping non-existent file: {path}")
+    timings['check'] = time.perf_counter() - start
+
+    # Phase 2: plan unique sanitized names against a single listing of dest_dir
+    start = time.perf_counter()
+    with os.scandir(dest_dir) as entries:
+        existing = [entry.name for entry in entries]
+    original_filenames = [os.path.basename(path) for path in sources]
+    names = plan_names(
+        [sanitize(filename) for filename in original_filenames],
+        existing,
+        case_insensitive=is_case_insensitive(dest_dir)
+    )
+    timings['plan'] = time.perf_counter() - start
+
+    # Phase 3: create the links
+    start = time.perf_counter()
+
+    def link(job):
+        source, name, device = job
+        try:
+            return (name, *selector.stage(source, os.path.join(dest_dir, name), device, checksums))
+        except FileExistsError:
+            # Something else created the name since the listing; fall back to probing
+            base_name, ext = os.path.splitext(name)
+            for counter in range(1, 10000):
+                candidate = f"{base_name}_{counter}{ext}"
+                try:
+                    return (candidate, *selector.stage(source, os.path.join(dest_dir, candidate), device, checksums))
+                except FileExistsError:
+                    continue
+                except OSError as e:
+                    logger.error(f"Failed to stage file {source}: {str(e)}")
+                    return None, None, None
+            logger.error(f"Failed to stage file {source}: no free name for {name}")
+        except OSError as e:
+            logger.error(f"Failed to stage file {source}: {str(e)}")
+        return None, None, None
+
+    linked = _run_batched(link, list(zip(sources, names, devices)), max_workers)
+    timings['link'] = time.perf_counter() - start
+
+    staged = []
+    methods = {}
+    for source, original_filename, size, (name, method, sums) in zip(sources, original_filenames, sizes, linked):
+        if name is None:
+            continue
+        methods[method] = methods.get(method, 0) + 1
+        info = {
+            'original_path': source,
+            'original_filename': original_filename,
+            'temp_path': os.path.join(dest_dir, name),
+            'sanitized_filename': name,
+            'staging_method': method,
+            'size': size
+        }
+        if sums:
+            info.update(sums)
+        staged.append(info)
+
+    summary = ", ".join(f"{count} by {method}" for method, count in methods.items())
+    if checksums:
+        summary += f", {sum(info['size'] for info in staged) / (1024 * 1024):.1f} MB checksummed"
+    logger.info(
+        f"Staged {len(staged)}/{len(file_paths)} files in {dest_dir} ({selector.strategy}: {summary}): "
+        + ", ".join(f"{phase} {seconds:.3f}s" for phase, seconds in timings.items())
+    )
+    return staged, timings
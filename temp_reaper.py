@@ -0,0 +1,262 @@
+"""
+Temp Reaper Module
+
+This module removes old temporary workspaces from storage/temp in the
+background. A workspace (file_selector_* or csv_update_*) is deleted when it
+has not been touched for longer than the age limit, and the oldest workspaces
+are deleted first while storage/temp is over its size quota. Both policies are
+off until they are set in Settings.
+
+A workspace is never deleted while it is the application's current temporary
+directory or while it is protected by the _temp_protected flag of the preserved
+session (storage/data/persistent_session.json). The quota also keeps
+workspaces holding staged objects or derivatives that have not been uploaded
+(according to their manifest); the age limit is the user's explicit choice and
+applies whatever the upload state, since some workflows (storage NONE) never
+upload. Protection is checked again right before each deletion, so preserving
+the session while the reaper runs is safe.
+"""
+
+import os
+import json
+import time
+import shutil
+import logging
+
+from workspace_manifest import WorkspaceManifest, SUBDIRECTORIES
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEMP_BASE_DIR = os.path.join("storage", "temp")
+PERSISTENT_SESSION_FILE = os.path.join("storage", "data", "persistent_session.json")
+
+# Workspaces not touched for this many days are deleted (0, the default, disables the age policy)
+DEFAULT_MAX_AGE_DAYS = 0
+
+# Total size allowed for storage/temp, in megabytes (0, the default, disables the quota)
+DEFAULT_QUOTA_MB = 0
+
+# Only directories with these prefixes are managed by the reaper
+REAPABLE_PREFIXES = ("file_selector_", "csv_update_")
+
+# Workspaces touched within this many seconds are never deleted, even over the quota
+# (an Update CSV workspace, for instance, isn't tracked in the session)
+MIN_IDLE_SECONDS = 3600
+
+# Seconds to wait after startup before scanning, so the first paint isn't competing for the disk
+STARTUP_DELAY = 10
+
+
+def protected_directories(session_file=PERSISTENT_SESSION_FILE):
+    """
+    Temporary directories protected by the preserved session.
+
+    Args:
+        session_file: Path to persistent_session.json
+
+    Returns:
+        set: Absolute paths of protected directories (empty if none)
+    """
+    try:
+        with open(session_file, 'r', encoding='utf-8') as f:
+            session_data = json.load(f)
+    except FileNotFoundError:
+        return set()
+    except (OSError, ValueError) as e:
+        # If protection can't be read, nothing may be deleted safely
+        logger.warning(f"Could not read {session_file}: {e}")
+        return None
+    temp_dir = session_data.get("temp_directory")
+    if session_data.get("_temp_protected") and temp_dir:
+        return {os.path.abspath(temp_dir)}
+    return set()
+
+
+def has_pending_uploads(path):
+    """
+    Check whether a workspace holds content that has not been uploaded.
+
+    Workspaces without a manifest are judged by their OBJS/, TN/ and SMALL/
+    directories: any file in them counts as not uploaded.
+
+    Args:
+        path: The workspace directory
+
+    Returns:
+        bool: True if the workspace must be kept
+    """
+    if WorkspaceManifest.exists(path):
+        manifest = WorkspaceManifest(path)
+        if manifest.is_uploaded():
+            return False
+        # Files recorded, or files added since the manifest was written
+        return any(manifest.counts().values()) or not manifest.is_current()
+    for name in SUBDIRECTORIES:
+        try:
+            with os.scandir(os.path.join(path, name)) as entries:
+                if any(True for _ in entries):
+                    return True
+        except FileNotFoundError:
+            continue
+        except OSError:
+            return True
+    return False
+
+
+def measure_workspace(path):
+    """
+    Measure the disk space a workspace uses and when it was last touched.
+
+    Symlinks are not followed, and hard-linked files (shared with the
+    originals) are not counted, since deleting the workspace doesn't free them.
+
+    Args:
+        path: The workspace directory
+
+    Returns:
+        tuple: (bytes: int, last_modified: float timestamp)
+    """
+    total = 0
+    last_modified = os.lstat(path).st_mtime
+    pending = [path]
+    while pending:
+        directory = pending.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        info = entry.stat(follow_symlinks=False)
+                    except OSError:
+                        continue
+                    last_modified = max(last_modified, info.st_mtime)
+                    if entry.is_dir(follow_symlinks=False):
+                        pending.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False) and info.st_nlink == 1:
+                        total += getattr(info, 'st_blocks', 0) * 512 or info.st_size
+        except OSError as e:
+            logger.warning(f"Could not measure {directory}: {e}")
+    return total, last_modified
+
+
+class TempReaper:
+    """
+    Applies the age and size policies to the workspaces under storage/temp.
+    """
+
+    def __init__(self, temp_base_dir=DEFAULT_TEMP_BASE_DIR, max_age_days=DEFAULT_MAX_AGE_DAYS,
+                 quota_mb=DEFAULT_QUOTA_MB, active_dirs=None, session_file=PERSISTENT_SESSION_FILE):
+        """
+        Initialize the reaper.
+
+        Args:
+            temp_base_dir: Directory holding the workspaces
+            max_age_days: Age limit in days (0 or None disables it)
+            quota_mb: Size quota in megabytes (0 or None disables it)
+            active_dirs: Optional function returning the workspaces in use right now
+            session_file: Path to persistent_session.json
+        """
+        self.temp_base_dir = temp_base_dir
+        self.max_age = float(max_age_days or 0) * 24 * 3600
+        self.quota = float(quota_mb or 0) * 1024 * 1024
+        self.active_dirs = active_dirs or (lambda: [])
+        self.session_file = session_file
+
+    @property
+    def enabled(self):
+        """True if the age limit or the quota is set."""
+        return bool(self.max_age or self.quota)
+
+    def workspaces(self):
+        """
+        List the managed workspaces, oldest first.
+
+        Returns:
+            list: (path, bytes, last_modified) tuples
+        """
+        found = []
+        try:
+            with os.scandir(self.temp_base_dir) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False) and entry.name.startswith(REAPABLE_PREFIXES):
+                        try:
+                            size, last_modified = measure_workspace(entry.path)
+                        except OSError:
+                            continue
+                        found.append((entry.path, size, last_modified))
+        except FileNotFoundError:
+            return []
+        return sorted(found, key=lambda workspace: workspace[2])
+
+    def is_protected(self, path, check_uploads=True):
+        """
+        Check whether a workspace must be kept.
+
+        Args:
+            path: The workspace directory
+            check_uploads: Whether content that has not been uploaded protects it
+
+        Returns:
+            bool: True if path is in use, protected by the preserved session,
+                  or (with check_uploads) not uploaded yet
+        """
+        protected = protected_directories(self.session_file)
+        if protected is None:
+            return True
+        active = {os.path.abspath(directory) for directory in self.active_dirs() if directory}
+        if os.path.abspath(path) in protected | active:
+            return True
+        return check_uploads and has_pending_uploads(path)
+
+    def run(self):
+        """
+        Delete expired workspaces, then the oldest ones while over the quota.
+
+        Returns:
+            dict: 'deleted' (paths), 'freed_bytes', 'remaining_bytes'
+        """
+        if not self.enabled:
+            return {'deleted': [], 'freed_bytes': 0, 'remaining_bytes': None}
+
+        workspaces = self.workspaces()
+        total = sum(size for _, size, _ in workspaces)
+        now = time.time()
+        deleted = []
+        freed = 0
+
+        for path, size, last_modified in workspaces:
+            expired = self.max_age and now - last_modified > self.max_age
+            over_quota = self.quota and total > self.quota
+            if not (expired or over_quota) or now - last_modified < MIN_IDLE_SECONDS:
+                continue
+            if self.is_protected(path, check_uploads=not expired):
+                logger.info(f"Keeping protected temporary directory: {path}")
+                continue
+            try:
+                shutil.rmtree(path)
+            except OSError as e:
+                logger.warning(f"Could not delete temporary directory {path}: {e}")
+                continue
+            total -= size
+            freed += size
+            deleted.append(path)
+            reason = "expired" if expired else "over quota"
+            logger.info(f"Deleted temporary directory ({reason}, {size / (1024 * 1024):.1f} MB): {path}")
+
+        if deleted:
+            logger.info(f"Temp reaper deleted {len(deleted)} directories, freed {freed / (1024 * 1024):.1f} MB; "
+                        f"{total / (1024 * 1024):.1f} MB remain in {self.temp_base_dir}")
+        return {'deleted': deleted, 'freed_bytes': freed, 'remaining_bytes': total}
+
+    def run_after_startup(self, delay=STARTUP_DELAY):
+        """
+        Wait for the UI to settle, then run. Meant for a background thread
+        (e.g. page.run_thread); errors are logged, never raised.
+
+        Args:
+            delay: Seconds to wait before scanning
+        """
+        try:
+            time.sleep(delay)
+            self.run()
+        except Exception as e:
+            logger.error(f"Temp reaper failed: {e}")
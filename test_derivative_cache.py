@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Tests for the derivative_cache module
+
+Checks that hits are only counted when every derivative came from the cache,
+and that replacing an entry doesn't inflate the cache's size.
+"""
+
+import sys
+import os
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from derivative_cache import DerivativeCache
+
+
+TN = {'width': 400, 'height': 400}
+SMALL = {'width': 800, 'height': 800}
+
+
+def make_cache(tmp_path):
+    source = tmp_path / "scan.tif"
+    source.write_bytes(b"master")
+    return DerivativeCache(cache_dir=str(tmp_path / "cache")), str(source)
+
+
+def test_fetch_all_counts_only_complete_hits(tmp_path):
+    cache, source = make_cache(tmp_path)
+    keys = [cache.key(source, output, {}) for output in (TN, SMALL)]
+    generated_tn = tmp_path / "generated_TN.jpg"
+    generated_tn.write_bytes(b"tn")
+    cache.store(keys[0], str(generated_tn))
+
+    dests = [str(tmp_path / "scan_TN.jpg"), str(tmp_path / "scan_SMALL.jpg")]
+    # Only TN is cached: nothing is placed, and both count as misses
+    assert not cache.fetch_all(keys, dests)
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert not os.path.exists(dests[0])
+
+    generated_small = tmp_path / "generated_SMALL.jpg"
+    generated_small.write_bytes(b"small")
+    cache.store(keys[1], str(generated_small))
+    assert cache.fetch_all(keys, dests)
+    assert (cache.hits, cache.misses) == (2, 2)
+    assert open(dests[0], "rb").read() == b"tn"
+
+
+def test_store_replacing_an_entry_keeps_the_size(tmp_path):
+    cache, source = make_cache(tmp_path)
+    key = cache.key(source, TN, {})
+    first = tmp_path / "first.jpg"
+    first.write_bytes(b"x" * 1000)
+    cache.store(key, str(first))
+    second = tmp_path / "second.jpg"
+    second.write_bytes(b"y" * 600)
+    cache.store(key, str(second))
+    assert cache._total_bytes == 600
+    assert DerivativeCache(cache_dir=str(tmp_path / "cache"))._total_bytes == 600
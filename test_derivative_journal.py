@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Tests for the derivative_journal module
+
+Checks that an interrupted run is found and resumed with only its pending
+and running jobs, and that failed jobs and cancelled runs don't count as
+interrupted.
+"""
+
+import sys
+import os
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from derivative_journal import DerivativeJournal, RUNNING, DONE, FAILED, CANCELLED
+
+
+def open_run(temp_base, name, paths):
+    temp_dir = temp_base / name
+    temp_dir.mkdir()
+    journal = DerivativeJournal(str(temp_dir))
+    journal.start_run(paths, "CollectionBuilder")
+    return journal
+
+
+def test_resume_interrupted_run(tmp_path):
+    journal = open_run(tmp_path, "file_selector_run", ["a.tif", "b.tif", "c.tif", "d.tif"])
+    journal.mark("a.tif", DONE)
+    journal.mark("b.tif", RUNNING)
+    journal.mark("c.tif", FAILED, "unsupported format")
+    journal.close()
+
+    assert DerivativeJournal.find_unfinished(str(tmp_path)) == [str(tmp_path / "file_selector_run")]
+
+    resumed = DerivativeJournal(str(tmp_path / "file_selector_run"))
+    mode, paths = resumed.unfinished()
+    assert mode == "CollectionBuilder"
+    # The job left running is redone; the failed one is not retried
+    assert paths == ["b.tif", "d.tif"]
+    assert resumed.counts() == {DONE: 1, RUNNING: 1, FAILED: 1, "pending": 1}
+    resumed.close()
+
+
+def test_failed_jobs_do_not_count_as_interrupted(tmp_path):
+    journal = open_run(tmp_path, "file_selector_done", ["a.tif", "b.mov"])
+    journal.mark("a.tif", DONE)
+    journal.mark("b.mov", FAILED, "unsupported format")
+    journal.close()
+    assert DerivativeJournal.find_unfinished(str(tmp_path)) == []
+
+
+def test_cancelled_run_is_not_resumable(tmp_path):
+    journal = open_run(tmp_path, "file_selector_cancelled", ["a.tif", "b.tif", "c.tif"])
+    journal.mark("a.tif", DONE)
+    assert journal.cancel_unfinished() == 2
+    assert journal.counts() == {DONE: 1, CANCELLED: 2}
+    journal.close()
+    assert DerivativeJournal.find_unfinished(str(tmp_path)) == []
+
+
+def test_start_run_ignores_duplicate_paths(tmp_path):
+    journal = open_run(tmp_path, "file_selector_dupes", ["a.tif", "b.tif", "a.tif"])
+    assert journal.unfinished() == ("CollectionBuilder", ["a.tif", "b.tif"])
+    # A new run replaces the previous one
+    journal.start_run(["c.tif"], "Alma")
+    assert journal.unfinished() == ("Alma", ["c.tif"])
+    journal.close()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Tests for the derivative_pool module
+
+Checks that plan_resources sizes the pool from the cores, the memory budget
+and max_workers, and that DerivativePool runs every job, reports the ones
+that fail, and passes on its timeout.
+"""
+
+import sys
+import os
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import derivative_pool
+from derivative_pool import plan_resources, DerivativePool, MIN_JOB_BYTES, MEMORY_BUDGET_FRACTION
+
+
+def make_files(tmp_path, count):
+    paths = []
+    for number in range(count):
+        path = tmp_path / f"file_{number}.bin"
+        path.write_bytes(b"x" * 100)
+        paths.append(str(path))
+    return paths
+
+
+def test_plan_resources_bounded_by_cores(tmp_path, monkeypatch):
+    monkeypatch.setattr(derivative_pool, "default_workers", lambda: 8)
+    monkeypatch.setattr(derivative_pool, "available_memory", lambda: 1024 * MIN_JOB_BYTES)
+    plan = plan_resources(make_files(tmp_path, 20))
+    assert plan['workers'] == 8
+    assert plan['limits']['thread'] == 1
+    assert set(plan['limits']) == {'memory', 'map', 'thread'}
+
+
+def test_plan_resources_bounded_by_memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(derivative_pool, "default_workers", lambda: 8)
+    # Room for exactly three minimum-sized jobs
+    monkeypatch.setattr(derivative_pool, "available_memory", lambda: 3 * MIN_JOB_BYTES / MEMORY_BUDGET_FRACTION)
+    plan = plan_resources(make_files(tmp_path, 20))
+    assert plan['workers'] == 3
+    assert plan['limits']['thread'] == 8 // 3
+
+
+def test_plan_resources_bounded_by_max_workers_and_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(derivative_pool, "default_workers", lambda: 8)
+    monkeypatch.setattr(derivative_pool, "available_memory", lambda: 1024 * MIN_JOB_BYTES)
+    assert plan_resources(make_files(tmp_path, 20), max_workers=2)['workers'] == 2
+    assert plan_resources(make_files(tmp_path, 3))['workers'] == 3
+    assert plan_resources([])['workers'] == 1
+
+
+def test_plan_resources_unknown_memory(tmp_path, monkeypatch):
+    monkeypatch.setattr(derivative_pool, "default_workers", lambda: 4)
+    monkeypatch.setattr(derivative_pool, "available_memory", lambda: None)
+    plan = plan_resources(make_files(tmp_path, 10))
+    assert plan['workers'] == 4
+    assert plan['limits']['memory'] == derivative_pool._format_bytes(MIN_JOB_BYTES)
+
+
+def test_pool_runs_every_job():
+    pool = DerivativePool(max_workers=3)
+    results = {item: (result, error) for item, result, error in pool.run(range(10), lambda item, timeout: item * 2)}
+    assert results == {item: (item * 2, None) for item in range(10)}
+
+
+def test_pool_reports_errors():
+    def job(item, timeout):
+        if item == 2:
+            raise RuntimeError("bad file")
+        return item
+
+    outcomes = {item: error for item, _, error in DerivativePool(max_workers=2).run(range(4), job)}
+    assert isinstance(outcomes[2], RuntimeError)
+    assert outcomes[0] is None
+
+
+def test_pool_has_no_timeout_by_default():
+    assert DerivativePool(max_workers=1).timeout is None
+    assert DerivativePool(max_workers=1, timeout=0).timeout is None
+    timeouts = [timeout for _, timeout, _ in DerivativePool(max_workers=1, timeout=90).run([1], lambda item, timeout: timeout)]
+    assert timeouts == [90.0]
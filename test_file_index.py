@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Tests for the file_index module
+
+Checks exact lookups, candidate pruning, and that FileIndexStore.refresh picks
+up files added, removed and renamed since the last refresh, while keeping
+unchanged directories from the store.
+"""
+
+import sys
+import os
+import time
+
+import pytest
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import file_index
+import utils
+from file_index import FileIndex, FileIndexStore
+
+
+def touch(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        f.write("x")
+
+
+def backdate(root, seconds=3600):
+    """Set every directory's mtime in the past, so a refresh treats them as settled."""
+    past = time.time() - seconds
+    for directory, _, _ in os.walk(root):
+        os.utime(directory, (past, past))
+
+
+def names(index):
+    return sorted(os.path.relpath(path, index.base_path) for path in index.paths)
+
+
+def test_build_and_lookup(tmp_path):
+    touch(str(tmp_path / "a" / "Scan_001.TIF"))
+    touch(str(tmp_path / "b" / "scan_002.tif"))
+    index = FileIndex.build(str(tmp_path))
+    assert len(index) == 2
+    assert index.lookup("scan_001.tif") == str(tmp_path / "a" / "Scan_001.TIF")
+    assert index.lookup("missing.tif") is None
+    assert index.covers(str(tmp_path))
+    assert not index.covers(str(tmp_path / "a"))
+
+
+def make_index(count):
+    index = FileIndex("/masters")
+    for number in range(count):
+        index.add(f"/masters/box{number % 7}/scan_{number:05d}.tif")
+    return index
+
+
+@pytest.mark.parametrize("use_numpy", [True, False])
+def test_candidates_rank_shared_digit_runs_first(monkeypatch, use_numpy):
+    if not use_numpy:
+        monkeypatch.setattr(file_index, "np", None)
+    elif file_index.np is None:
+        pytest.skip("needs numpy")
+    index = make_index(2000)
+    positions = index.candidates("Scan-01234.TIF", limit=5)
+    assert len(positions) == 5
+    assert index.names[positions[0]] == "scan_01234.tif"
+    assert index.candidates("zzz", limit=5) == []
+
+
+def test_pruning_only_for_multiset(monkeypatch):
+    monkeypatch.setattr(utils, "PRUNE_MIN_FILES", 10)
+    index = make_index(50)
+    targets = ["scan-00042.tif"]
+    for scorer, pruned in (("multiset", 1), ("rapidfuzz", 0)):
+        if scorer == "rapidfuzz" and utils.similarity.fuzz is None:
+            continue
+        stats = {}
+        results = utils.perform_fuzzy_search_batch("/masters", targets, file_index=index, stats=stats, scorer=scorer)
+        assert results["scan-00042.tif"][0] == "/masters/box0/scan_00042.tif"
+        assert stats['pruned_matches'] == pruned
+
+
+def test_refresh_add_remove_rename(tmp_path):
+    root = tmp_path / "masters"
+    touch(str(root / "box1" / "one.tif"))
+    touch(str(root / "box1" / "two.tif"))
+    touch(str(root / "box2" / "deep" / "three.tif"))
+    backdate(str(root))
+
+    store = FileIndexStore(str(tmp_path / "index.sqlite"))
+    try:
+        first = store.refresh(str(root))
+        assert names(first) == ["box1/one.tif", "box1/two.tif", "box2/deep/three.tif"]
+
+        # Add, remove and rename in box1; box2 stays settled and comes from the store
+        touch(str(root / "box1" / "four.tif"))
+        os.remove(str(root / "box1" / "one.tif"))
+        os.rename(str(root / "box1" / "two.tif"), str(root / "box1" / "two_renamed.tif"))
+        touch(str(root / "box3" / "five.tif"))
+
+        second = store.refresh(str(root))
+        assert names(second) == [
+            "box1/four.tif", "box1/two_renamed.tif", "box2/deep/three.tif", "box3/five.tif"
+        ]
+        assert second.lookup("two.tif") is None
+        assert second.lookup("two_renamed.tif") == str(root / "box1" / "two_renamed.tif")
+
+        # A removed directory disappears with its files
+        os.remove(str(root / "box3" / "five.tif"))
+        os.rmdir(str(root / "box3"))
+        third = store.refresh(str(root))
+        assert "box3/five.tif" not in names(third)
+    finally:
+        store.close()
+
+
+def test_refresh_cancelled(tmp_path):
+    touch(str(tmp_path / "root" / "a.tif"))
+    store = FileIndexStore(str(tmp_path / "index.sqlite"))
+    try:
+        assert store.refresh(str(tmp_path / "root"), cancel_check=lambda: True) is None
+    finally:
+        store.close()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Tests for the match_engine module
+
+Checks that sharded matching in worker processes gives the same results as
+scoring in-process, and that progress is only reported when it changes.
+"""
+
+import sys
+import os
+
+import pytest
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import similarity
+import match_engine
+from match_engine import MatchEngine
+
+
+@pytest.fixture(autouse=True)
+def always_parallel(monkeypatch):
+    # Shard even these small batches across worker processes
+    monkeypatch.setattr(match_engine, "MIN_PARALLEL_COMPARISONS", 0)
+
+
+def test_engine_matches_in_process_scoring():
+    queries = [f"scan_{number:04d}.tif" for number in range(0, 400, 3)]
+    choices = [f"Scan-{number:04d}_master.tif" for number in range(400)]
+    progress = []
+
+    engine = MatchEngine(max_workers=2, shard_size=16)
+    results = engine.best_matches(queries, choices, scorer='multiset', progress_callback=progress.append)
+
+    assert results == similarity.best_matches(queries, choices, scorer='multiset')
+    assert progress[-1] == len(queries)
+    # Every report is new progress, so the UI isn't refreshed on idle polls
+    assert progress == sorted(set(progress))
+
+
+def test_engine_cancel():
+    queries = [f"scan_{number:04d}.tif" for number in range(200)]
+    choices = [f"Scan-{number:04d}_master.tif" for number in range(200)]
+    assert MatchEngine(max_workers=2).best_matches(queries, choices, cancel_check=lambda: True) is None
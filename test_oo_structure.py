@@ -33,6 +33,9 @@ def test_imports():
         import utils
         print("✅ Utils module imported successfully")
         
+        from file_index import FileIndex
+        print("✅ FileIndex imported successfully")
+        
         print("\\n🎉 All imports successful!")
         return True
         
@@ -68,6 +71,17 @@ def test_file_structure():
     """Test that all expected files exist."""
     expected_files = [
         'app.py',
+        'derivative_cache.py',
+        'derivative_journal.py',
+        'derivative_pool.py',
+        'file_index.py',
+        'match_engine.py',
+        'normalization.py',
+        'scanner.py',
+        'similarity.py',
+        'staging.py',
+        'temp_reaper.py',
+        'workspace_manifest.py',
         'views/__init__.py',
         'views/base_view.py',
         'views/home_view.py',
@@ -79,6 +93,7 @@ def test_file_structure():
         'views/storage_view.py',
         'views/log_view.py',
         'views/log_overlay.py',
+        'views/progress_reporter.py',
         'OO_MIGRATION.md'
     ]
     
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Tests for the similarity module
+
+Checks that the multiset scorer reproduces the original common-character
+measure and ranking, that batch searches keep it by default, and that the
+batched best_matches/top_matches paths agree with scoring every query on its
+own.
+"""
+
+import sys
+import os
+import random
+
+import pytest
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import similarity
+import utils
+from file_index import FileIndex
+
+
+def legacy_similarity(str1, str2):
+    """The original utils.calculate_string_similarity, kept as the reference."""
+    if str1 == str2:
+        return 100
+    if str1 in str2 or str2 in str1:
+        overlap = min(len(str1), len(str2))
+        total = max(len(str1), len(str2))
+        return int((overlap / total) * 100)
+    common_chars = 0
+    str2_chars = list(str2)
+    for char in str1:
+        if char in str2_chars:
+            common_chars += 1
+            str2_chars.remove(char)
+    total_chars = max(len(str1), len(str2))
+    if total_chars == 0:
+        return 0
+    return int((common_chars / total_chars) * 100)
+
+
+def random_names(count, seed):
+    """Filename-like strings with plenty of shared characters and substrings."""
+    rng = random.Random(seed)
+    alphabet = "abc_-.0123"
+    names = []
+    for _ in range(count):
+        name = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 12)))
+        names.append(name + rng.choice(["", ".tif", ".jpg"]))
+    return names
+
+
+def legacy_best_match(query, choices):
+    """Index and score of the first best choice, as the original search loop picked it."""
+    best_index, best_score = None, 0
+    for index, choice in enumerate(choices):
+        score = legacy_similarity(query, choice)
+        if score > best_score:
+            best_index, best_score = index, score
+    return best_index, best_score
+
+
+def test_multiset_matches_legacy_scores():
+    names = random_names(300, seed=1)
+    for str1, str2 in zip(names, reversed(names)):
+        assert similarity.multiset_similarity(str1, str2) == legacy_similarity(str1, str2), (str1, str2)
+    assert similarity.multiset_similarity("", "") == 100
+    assert similarity.multiset_similarity("", "abc") == 0
+
+
+def test_multiset_best_match_matches_legacy_ranking():
+    choices = random_names(200, seed=2)
+    for query in random_names(50, seed=3):
+        assert similarity.best_match(query, choices, scorer='multiset') == legacy_best_match(query, choices)
+
+
+def test_top_matches_first_entry_is_best_match():
+    choices = random_names(200, seed=4)
+    for scorer in ('multiset', 'rapidfuzz'):
+        for query in random_names(30, seed=5):
+            ranked = similarity.top_matches(query, choices, scorer=scorer, limit=5)
+            best = similarity.best_match(query, choices, scorer=scorer)
+            if best[0] is None:
+                assert ranked == []
+            else:
+                assert ranked[0] == best
+            scores = [score for _, score in ranked]
+            assert scores == sorted(scores, reverse=True)
+
+
+@pytest.mark.skipif(similarity.np is None or similarity.fuzz is None, reason="needs rapidfuzz and numpy")
+def test_best_matches_cdist_agrees_with_per_query(monkeypatch):
+    choices = random_names(300, seed=6)
+    queries = random_names(40, seed=7)
+    # Force several chunks
+    monkeypatch.setattr(similarity, "CDIST_MAX_CELLS", len(choices) * 7)
+
+    batched = similarity.best_matches(queries, choices, scorer='rapidfuzz')
+    single = [similarity.best_match(query, choices, scorer='rapidfuzz') for query in queries]
+    assert [score for _, score in batched] == [score for _, score in single]
+    for (index, score), query in zip(batched, queries):
+        if index is not None:
+            assert int(similarity.rapidfuzz_similarity(query, choices[index])) == score
+
+
+@pytest.mark.skipif(similarity.np is None or similarity.fuzz is None, reason="needs rapidfuzz and numpy")
+def test_best_matches_top_n_agrees_with_top_matches(monkeypatch):
+    choices = random_names(300, seed=6)
+    queries = random_names(40, seed=7)
+    monkeypatch.setattr(similarity, "CDIST_MAX_CELLS", len(choices) * 7)
+
+    ranked = similarity.best_matches(queries, choices, scorer='rapidfuzz', top_n=3)
+    for rows, query in zip(ranked, queries):
+        expected = similarity.top_matches(query, choices, scorer='rapidfuzz', limit=3)
+        assert [score for _, score in rows] == [score for _, score in expected]
+
+
+def test_best_matches_multiset_and_cancel():
+    choices = random_names(100, seed=8)
+    queries = random_names(10, seed=9)
+    assert similarity.best_matches(queries, choices, scorer='multiset') == [
+        legacy_best_match(query, choices) for query in queries
+    ]
+    assert similarity.best_matches(queries, choices, scorer='multiset', cancel_check=lambda: True) is None
+
+
+def test_scorer_names():
+    assert similarity.get_scorer_name(None) == similarity.DEFAULT_SCORER
+    assert similarity.get_scorer_name("unknown") == similarity.DEFAULT_SCORER
+    assert similarity.get_scorer_name("multiset") == "multiset"
+    assert similarity.DEFAULT_SCORER == "multiset"
+
+
+def test_default_batch_search_keeps_multiset_threshold():
+    # Same characters in another order: 100% for multiset, far below 90% for RapidFuzz
+    index = FileIndex("/masters")
+    index.add("/masters/dcba_4321.tif")
+    results = utils.perform_fuzzy_search_batch("/masters", ["abcd_1234.tif"], file_index=index)
+    assert results["abcd_1234.tif"] == ("/masters/dcba_4321.tif", 100)
+    if similarity.fuzz is not None:
+        _, ratio = utils.perform_fuzzy_search_batch(
+            "/masters", ["abcd_1234.tif"], file_index=index, scorer='rapidfuzz'
+        )["abcd_1234.tif"]
+        assert ratio < 90
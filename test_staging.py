@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Tests for the staging module
+
+Checks the collision suffixes chosen by plan_names, the files and checksums
+produced by stage_files with the default (symlink) and copy strategies, and
+the methods tried by each strategy.
+"""
+
+import sys
+import os
+import errno
+import hashlib
+
+import pytest
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import staging
+
+
+def test_plan_names_suffixes():
+    assert staging.plan_names(["a.tif", "b.tif"], []) == ["a.tif", "b.tif"]
+    assert staging.plan_names(["a.tif", "a.tif", "a.tif"], []) == ["a.tif", "a_1.tif", "a_2.tif"]
+    assert staging.plan_names(["a.tif"], ["a.tif", "a_1.tif"]) == ["a_2.tif"]
+    # A planned suffix never collides with a later original name
+    assert staging.plan_names(["a.tif", "a.tif", "a_1.tif"], []) == ["a.tif", "a_1.tif", "a_1_1.tif"]
+    assert staging.plan_names(["README", "README"], []) == ["README", "README_1"]
+
+
+def test_plan_names_case_insensitive():
+    assert staging.plan_names(["A.tif", "a.tif"], []) == ["A.tif", "a.tif"]
+    assert staging.plan_names(["A.tif", "a.tif"], [], case_insensitive=True) == ["A.tif", "a_1.tif"]
+    assert staging.plan_names(["a.TIF"], ["A.tif"], case_insensitive=True) == ["a_1.TIF"]
+
+
+def make_sources(tmp_path):
+    sources = tmp_path / "masters"
+    (sources / "one").mkdir(parents=True)
+    (sources / "two").mkdir()
+    paths = []
+    for folder, content in (("one", b"first"), ("two", b"second")):
+        path = sources / folder / "scan 01.tif"
+        path.write_bytes(content)
+        paths.append(str(path))
+    return paths
+
+
+def sanitize(name):
+    return name.replace(" ", "_")
+
+
+def test_stage_files_default_symlinks(tmp_path):
+    paths = make_sources(tmp_path)
+    objs = tmp_path / "OBJS"
+    objs.mkdir()
+
+    staged, timings = staging.stage_files(paths + [str(tmp_path / "missing.tif")], str(objs), sanitize)
+
+    assert [info['sanitized_filename'] for info in staged] == ["scan_01.tif", "scan_01_1.tif"]
+    assert set(timings) == {'check', 'plan', 'link'}
+    for info, source in zip(staged, paths):
+        assert info['staging_method'] == 'symlink'
+        assert os.path.islink(info['temp_path'])
+        assert os.path.realpath(info['temp_path']) == os.path.realpath(source)
+        assert 'md5' not in info
+
+
+def test_stage_files_copy_with_checksums(tmp_path):
+    paths = make_sources(tmp_path)
+    objs = tmp_path / "OBJS"
+    objs.mkdir()
+
+    staged, _ = staging.stage_files(paths, str(objs), sanitize, strategy='copy', checksums=True)
+
+    for info, source in zip(staged, paths):
+        content = open(source, "rb").read()
+        assert info['staging_method'] == 'copy'
+        assert not os.path.islink(info['temp_path'])
+        assert open(info['temp_path'], "rb").read() == content
+        assert info['md5'] == hashlib.md5(content).hexdigest()
+        assert info['sha256'] == hashlib.sha256(content).hexdigest()
+        assert info['size'] == len(content)
+
+
+def test_copy_without_kernel_copies(tmp_path, monkeypatch):
+    # As on macOS: no copy_file_range, and sendfile only writes to sockets
+    monkeypatch.delattr(staging.os, "copy_file_range", raising=False)
+    monkeypatch.setattr(staging.sys, "platform", "darwin")
+    assert staging._kernel_copies() == []
+    source = tmp_path / "scan.tif"
+    source.write_bytes(b"master" * 1000)
+    staging.copy_file(str(source), str(tmp_path / "copy.tif"))
+    assert (tmp_path / "copy.tif").read_bytes() == source.read_bytes()
+
+
+def test_copy_falls_back_when_kernel_copy_fails(tmp_path, monkeypatch):
+    calls = []
+
+    def refuse(*args):
+        calls.append(args)
+        raise OSError(errno.ENOTSOCK, "Socket operation on non-socket")
+
+    monkeypatch.setattr(staging, "_kernel_copies", lambda: [refuse])
+    source = tmp_path / "scan.tif"
+    source.write_bytes(b"master" * 1000)
+    staging.copy_file(str(source), str(tmp_path / "copy.tif"))
+    assert (tmp_path / "copy.tif").read_bytes() == source.read_bytes()
+    assert calls
+
+
+def test_copy_stops_when_disk_is_full(tmp_path, monkeypatch):
+    def full(*args):
+        raise OSError(errno.ENOSPC, "No space left on device")
+
+    monkeypatch.setattr(staging, "_kernel_copies", lambda: [full])
+    source = tmp_path / "scan.tif"
+    source.write_bytes(b"master")
+    with pytest.raises(OSError):
+        staging.copy_file(str(source), str(tmp_path / "copy.tif"))
+
+
+def test_auto_strategy_never_copies():
+    selector = staging.StagingSelector('auto')
+    assert 'copy' not in selector.methods(device=1)
+    assert staging.StagingSelector('hardlink').methods(device=1) == ['hardlink', 'symlink']
+    assert staging.get_strategy_name(None) == 'symlink'
+    assert staging.get_strategy_name('bogus') == 'symlink'
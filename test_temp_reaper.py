@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Tests for the temp_reaper module
+
+Checks that the reaper is off by default, applies the age and size policies,
+never deletes the active workspace or a workspace protected by the preserved
+session, and keeps content that has not been uploaded from the quota.
+"""
+
+import sys
+import os
+import json
+import time
+
+import pytest
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import temp_reaper
+from temp_reaper import TempReaper
+from workspace_manifest import WorkspaceManifest
+
+
+@pytest.fixture
+def temp_base(tmp_path, monkeypatch):
+    # Workspaces created by a test are fresh; let the policies see them anyway
+    monkeypatch.setattr(temp_reaper, "MIN_IDLE_SECONDS", 0)
+    base = tmp_path / "temp"
+    base.mkdir()
+    return base
+
+
+def make_workspace(base, name, uploaded=True, size=4096):
+    workspace = base / name
+    (workspace / "OBJS").mkdir(parents=True)
+    (workspace / "OBJS" / "scan.tif").write_bytes(b"x" * size)
+    manifest = WorkspaceManifest(str(workspace))
+    manifest.record_objects([{'original_path': "/masters/scan.tif", 'original_filename': "scan.tif",
+                              'sanitized_filename': "scan.tif", 'size': size}])
+    if uploaded:
+        manifest.record_upload()
+    return str(workspace)
+
+
+def make_reaper(base, tmp_path, **kwargs):
+    kwargs.setdefault('session_file', str(tmp_path / "persistent_session.json"))
+    return TempReaper(temp_base_dir=str(base), **kwargs)
+
+
+def test_disabled_by_default(temp_base, tmp_path):
+    make_workspace(temp_base, "file_selector_old")
+    reaper = make_reaper(temp_base, tmp_path)
+    assert not reaper.enabled
+    assert reaper.run()['deleted'] == []
+    assert os.path.isdir(temp_base / "file_selector_old")
+
+
+def test_age_policy_respects_active_and_protected(temp_base, tmp_path):
+    old = make_workspace(temp_base, "file_selector_old")
+    active = make_workspace(temp_base, "file_selector_active")
+    protected = make_workspace(temp_base, "file_selector_protected")
+    # Never uploaded (storage NONE): the age limit still applies
+    pending = make_workspace(temp_base, "file_selector_pending", uploaded=False)
+    (temp_base / "unrelated").mkdir()
+    with open(tmp_path / "persistent_session.json", "w") as f:
+        json.dump({"temp_directory": protected, "_temp_protected": True}, f)
+    time.sleep(0.01)
+
+    reaper = make_reaper(temp_base, tmp_path, max_age_days=1e-9, active_dirs=lambda: [active])
+    assert sorted(reaper.run()['deleted']) == [old, pending]
+    assert sorted(os.listdir(temp_base)) == ["file_selector_active", "file_selector_protected", "unrelated"]
+
+
+def test_unreadable_session_file_protects_everything(temp_base, tmp_path):
+    make_workspace(temp_base, "file_selector_old")
+    (tmp_path / "persistent_session.json").write_text("{not json")
+    time.sleep(0.01)
+    reaper = make_reaper(temp_base, tmp_path, max_age_days=1e-9)
+    assert reaper.run()['deleted'] == []
+
+
+def test_quota_deletes_oldest_first(temp_base, tmp_path):
+    size = 256 * 1024
+    # Created in order; backdating OBJS/ would make the manifests look stale
+    oldest = make_workspace(temp_base, "file_selector_1", size=size)
+    time.sleep(0.02)
+    middle = make_workspace(temp_base, "file_selector_2", size=size)
+    time.sleep(0.02)
+    newest = make_workspace(temp_base, "file_selector_3", size=size)
+
+    # Room for two workspaces' worth of data
+    reaper = make_reaper(temp_base, tmp_path, quota_mb=(2.5 * size) / (1024 * 1024))
+    result = reaper.run()
+    assert result['deleted'] == [oldest]
+    assert os.path.isdir(middle) and os.path.isdir(newest)
+
+
+def test_quota_keeps_pending_uploads(temp_base, tmp_path):
+    size = 256 * 1024
+    pending = make_workspace(temp_base, "file_selector_1", uploaded=False, size=size)
+    time.sleep(0.02)
+    uploaded = make_workspace(temp_base, "file_selector_2", size=size)
+    time.sleep(0.02)
+    make_workspace(temp_base, "file_selector_3", size=size)
+
+    # Room for two workspaces; the oldest is not uploaded, so the next one goes
+    reaper = make_reaper(temp_base, tmp_path, quota_mb=(2.5 * size) / (1024 * 1024))
+    assert reaper.run()['deleted'] == [uploaded]
+    assert os.path.isdir(pending)
+
+
+def test_workspace_without_manifest_kept_while_objs_has_files(temp_base, tmp_path):
+    staged = temp_base / "file_selector_nomanifest"
+    (staged / "OBJS").mkdir(parents=True)
+    (staged / "OBJS" / "scan.tif").write_bytes(b"x" * 4096)
+    time.sleep(0.02)
+    csv_only = temp_base / "csv_update_20250101_000000"
+    csv_only.mkdir()
+    (csv_only / "updated.csv").write_text("a,b\n")
+
+    # Over any quota: only the workspace without staged objects goes
+    reaper = make_reaper(temp_base, tmp_path, quota_mb=1e-9)
+    assert reaper.run()['deleted'] == [str(csv_only)]
+    assert os.path.isdir(staged)
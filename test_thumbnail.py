@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests for the thumbnail module
+
+Checks page range parsing, reading a PDF page count from its page tree, the
+ImageMagick -limit arguments, the Pillow backend's output sizes and that
+Pillow's pixel limit is raised only while a Pillow job runs.
+"""
+
+import sys
+import os
+
+import pytest
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import thumbnail
+from thumbnail import parse_page_range
+
+needs_pillow = pytest.mark.skipif(thumbnail.Image is None, reason="needs Pillow")
+
+
+def test_parse_page_range():
+    assert parse_page_range("1") == [0]
+    assert parse_page_range("1-3, 5") == [0, 1, 2, 4]
+    assert parse_page_range(" 3 ,1-2,2 ") == [0, 1, 2]
+    assert parse_page_range("") == []
+    assert parse_page_range("all", 3) == [0, 1, 2]
+    assert parse_page_range("ALL", 2) == [0, 1]
+    assert parse_page_range("2-", 4) == [1, 2, 3]
+    # Pages past the end of the document are dropped
+    assert parse_page_range("3-10", 4) == [2, 3]
+    assert parse_page_range("10-", 7) == []
+
+
+@pytest.mark.parametrize("text", ["0", "3-1", "a", "1-b"])
+def test_parse_page_range_invalid(text):
+    with pytest.raises(ValueError):
+        parse_page_range(text, 10)
+
+
+def test_parse_page_range_open_ended_needs_count():
+    with pytest.raises(ValueError):
+        parse_page_range("all")
+    with pytest.raises(ValueError):
+        parse_page_range("2-")
+
+
+def test_pdf_page_count_from_page_tree(tmp_path):
+    pdf = tmp_path / "doc.pdf"
+    pdf.write_bytes(
+        b"%PDF-1.4\n"
+        b"1 0 obj << /Type /Catalog /Pages 2 0 R >> endobj\n"
+        b"2 0 obj << /Type /Pages /Kids [3 0 R 4 0 R] /Count 12 >> endobj\n"
+        b"3 0 obj << /Count 5 /Type /Pages /Parent 2 0 R >> endobj\n"
+    )
+    assert thumbnail.pdf_page_count(str(pdf)) == 12
+
+
+def test_pdf_page_count_falls_back_to_identify(tmp_path, monkeypatch):
+    pdf = tmp_path / "objstm.pdf"
+    pdf.write_bytes(b"%PDF-1.7\n1 0 obj << /Type /ObjStm /N 3 >> stream\n...\nendstream\n")
+    monkeypatch.setattr(thumbnail, "_identify_page_count", lambda path, timeout=None: 9)
+    assert thumbnail.pdf_page_count(str(pdf)) == 9
+
+
+def test_limit_args():
+    assert thumbnail.limit_args({}) == []
+    assert thumbnail.limit_args({'limits': {'memory': '512MiB', 'thread': 2}}) == [
+        '-limit', 'memory', '512MiB', '-limit', 'thread', '2'
+    ]
+
+
+@needs_pillow
+def test_pillow_pixel_limit_is_scoped():
+    default = thumbnail.Image.MAX_IMAGE_PIXELS
+    with thumbnail.pillow_pixel_limit():
+        with thumbnail.pillow_pixel_limit():
+            assert thumbnail.Image.MAX_IMAGE_PIXELS == thumbnail.PILLOW_MAX_PIXELS
+        # Still raised while the outer job runs
+        assert thumbnail.Image.MAX_IMAGE_PIXELS == thumbnail.PILLOW_MAX_PIXELS
+    assert thumbnail.Image.MAX_IMAGE_PIXELS == default
+
+
+@needs_pillow
+def test_pillow_derivatives_sizes(tmp_path):
+    source = tmp_path / "scan.jpg"
+    thumbnail.Image.new('RGB', (800, 400), 'white').save(str(source))
+    outputs = [{'path': str(tmp_path / "scan_TN.jpg"), 'width': 200, 'height': 200},
+               {'path': str(tmp_path / "scan_SMALL.jpg"), 'width': 400, 'height': 400}]
+
+    assert thumbnail._pillow_derivatives(str(source), outputs, {})
+    sizes = []
+    for output in outputs:
+        with thumbnail.Image.open(output['path']) as image:
+            sizes.append(image.size)
+    assert sizes == [(200, 100), (400, 200)]
+
+
+@needs_pillow
+def test_pillow_derivatives_declines_unhandled_files(tmp_path):
+    source = tmp_path / "scan.jpg"
+    thumbnail.Image.new('RGB', (10, 10)).save(str(source))
+    output = [{'path': str(tmp_path / "out.jpg"), 'width': 5, 'height': 5}]
+    assert not thumbnail._pillow_derivatives(str(source), output, {'trim': True})
+    assert not thumbnail._pillow_derivatives(str(tmp_path / "doc.pdf"), output, {})
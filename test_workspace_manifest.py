@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for the workspace_manifest module
+
+Checks that recorded objects and derivatives round-trip through the manifest,
+that is_current notices files added behind its back, and that an upload mark
+is cleared by later changes.
+"""
+
+import sys
+import os
+import time
+
+# Add the current directory to the Python path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from workspace_manifest import WorkspaceManifest
+
+
+def make_workspace(tmp_path):
+    workspace = tmp_path / "file_selector_test"
+    for name in ("OBJS", "TN", "SMALL"):
+        (workspace / name).mkdir(parents=True)
+    (workspace / "OBJS" / "scan.tif").write_bytes(b"master")
+    return workspace
+
+
+def staged_entry(name):
+    return {'original_path': f"/masters/{name}", 'original_filename': name,
+            'sanitized_filename': name, 'staging_method': 'symlink', 'size': 6}
+
+
+def test_record_and_reload(tmp_path):
+    workspace = make_workspace(tmp_path)
+    manifest = WorkspaceManifest(str(workspace))
+    manifest.record_objects([staged_entry("scan.tif")])
+    (workspace / "TN" / "scan_TN.jpg").write_bytes(b"thumb")
+    manifest.refresh_derivatives()
+
+    assert WorkspaceManifest.exists(str(workspace))
+    reloaded = WorkspaceManifest(str(workspace))
+    assert reloaded.counts() == {'OBJS': 1, 'TN': 1, 'SMALL': 0}
+    assert reloaded.objects()[0]['temp_path'] == os.path.join(str(workspace), "OBJS", "scan.tif")
+    assert sorted(blob for _, blob in reloaded.upload_list()) == ["scan.tif", "scan_TN.jpg"]
+    assert reloaded.is_current()
+
+
+def test_is_current_detects_untracked_files(tmp_path):
+    workspace = make_workspace(tmp_path)
+    manifest = WorkspaceManifest(str(workspace))
+    manifest.record_objects([staged_entry("scan.tif")])
+    assert manifest.is_current()
+
+    # Directory mtimes can be coarse; make sure the change is visible
+    time.sleep(0.01)
+    (workspace / "SMALL" / "extra.jpg").write_bytes(b"small")
+    later = time.time() + 5
+    os.utime(str(workspace / "SMALL"), (later, later))
+    assert not WorkspaceManifest(str(workspace)).is_current()
+    assert WorkspaceManifest(str(workspace)).is_current(names=["OBJS", "TN"])
+
+
+def test_upload_mark_cleared_by_changes(tmp_path):
+    workspace = make_workspace(tmp_path)
+    manifest = WorkspaceManifest(str(workspace))
+    manifest.record_objects([staged_entry("scan.tif")])
+    assert not manifest.is_uploaded()
+
+    manifest.record_upload()
+    assert WorkspaceManifest(str(workspace)).is_uploaded()
+
+    manifest.record_objects([staged_entry("second.tif")])
+    assert not WorkspaceManifest(str(workspace)).is_uploaded()
+
+
+def test_duplicates(tmp_path):
+    workspace = make_workspace(tmp_path)
+    manifest = WorkspaceManifest(str(workspace))
+    entries = [dict(staged_entry(name), md5="m", sha256=digest)
+               for name, digest in (("a.tif", "1"), ("b.tif", "1"), ("c.tif", "2"))]
+    manifest.record_objects(entries)
+    assert manifest.duplicates() == [["a.tif", "b.tif"]]
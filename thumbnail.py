@@ -1,15 +1,325 @@
 """
 Thumbnail Generation Module
 
-This module provides functionality for generating image thumbnails using ImageMagick.
+This module provides functionality for generating image thumbnails using ImageMagick,
+or in-process with Pillow when that backend is selected.
+
+Available backends:
+    - imagemagick: Runs the magick command line tool (handles every format, incl. PDF)
+    - pillow: Decodes in-process, reading JPEGs at a reduced scale (draft mode) and
+      pyramidal TIFFs from their smallest sufficient level; files it cannot handle
+      fall back to ImageMagick
 """
 
 import os
+import re
 import logging
-from subprocess import call
+import threading
+from contextlib import contextmanager
+from subprocess import call, run, TimeoutExpired, PIPE, DEVNULL
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_BACKEND = 'imagemagick'
+BACKENDS = ['imagemagick', 'pillow']
+
+# Digitized masters routinely exceed Pillow's decompression-bomb guard (~179 MP)
+PILLOW_MAX_PIXELS = 1_000_000_000
+
+# Formats and image modes the Pillow backend handles; anything else goes to ImageMagick
+PILLOW_EXTENSIONS = ['.tiff', '.tif', '.jpg', '.jpeg', '.png', '.gif', '.bmp']
+PILLOW_MODES = ['1', 'L', 'LA', 'P', 'PA', 'RGB', 'RGBA', 'RGBX', 'CMYK', 'YCbCr']
+
+# Page tree nodes of a PDF; the largest /Count is the document's page count
+_PDF_PAGE_COUNT = re.compile(rb'/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b')
+
+# TIFF NewSubfileType bit marking a reduced-resolution copy of another page
+TIFF_NEW_SUBFILE_TYPE = 254
+TIFF_REDUCED_IMAGE = 0x1
+
+# Pillow jobs in progress; MAX_IMAGE_PIXELS is raised only while there are any
+_pillow_jobs = 0
+_pillow_default_max_pixels = None
+_pillow_lock = threading.Lock()
+
+
+@contextmanager
+def pillow_pixel_limit():
+    """
+    Raise Pillow's decompression-bomb limit to PILLOW_MAX_PIXELS for the
+    duration of a Pillow job. The limit is global to Pillow, so it is
+    reference-counted across concurrent jobs and restored when the last ends.
+    """
+    global _pillow_jobs, _pillow_default_max_pixels
+    with _pillow_lock:
+        if _pillow_jobs == 0:
+            _pillow_default_max_pixels = Image.MAX_IMAGE_PIXELS
+            Image.MAX_IMAGE_PIXELS = PILLOW_MAX_PIXELS
+        _pillow_jobs += 1
+    try:
+        yield
+    finally:
+        with _pillow_lock:
+            _pillow_jobs -= 1
+            if _pillow_jobs == 0:
+                Image.MAX_IMAGE_PIXELS = _pillow_default_max_pixels
+
+
+def get_backend_name(name=None):
+    """
+    Resolve a derivative backend name, falling back to the default when the
+    requested backend is unknown or Pillow is not installed.
+    
+    Args:
+        name: The requested backend name, or None for the default
+    
+    Returns:
+        str: A usable backend name
+    """
+    if not name:
+        return DEFAULT_BACKEND
+    if name not in BACKENDS:
+        logger.warning(f"Unknown derivative backend '{name}', using '{DEFAULT_BACKEND}'")
+        return DEFAULT_BACKEND
+    if name == 'pillow' and Image is None:
+        logger.warning(f"Pillow is not installed, using '{DEFAULT_BACKEND}' backend")
+        return DEFAULT_BACKEND
+    return name
+
+
+def is_up_to_date(source_path, output_paths):
+    """
+    Make-style check of whether derivatives need to be (re)built.
+    
+    Args:
+        source_path: Path to the source file (symlinks are followed)
+        output_paths: Paths of every derivative made from it
+    
+    Returns:
+        bool: True if every output exists, is not empty, and is at least as
+              new as the source
+    """
+    try:
+        source_mtime = os.stat(source_path).st_mtime_ns
+        for output_path in output_paths:
+            info = os.stat(output_path)
+            if info.st_size == 0 or info.st_mtime_ns < source_mtime:
+                return False
+        return True
+    except OSError:
+        return False
+
+
+def limit_args(options):
+    """
+    ImageMagick -limit arguments for one job.
+    
+    Args:
+        options: Derivative options; uses 'limits', a dictionary of ImageMagick
+                 resource names ('memory', 'map', 'thread', ...) to values
+                 (e.g. {'memory': '1GiB', 'thread': 2}), as planned by
+                 derivative_pool.plan_resources
+    
+    Returns:
+        list: Arguments to place right after 'magick'
+    """
+    args = []
+    for resource, value in (options.get('limits') or {}).items():
+        args += ['-limit', resource, str(value)]
+    return args
+
+
+def pdf_source_args(input_path, width, height, options):
+    """
+    ImageMagick arguments that read one PDF page rasterized at the lowest
+    resolution that still covers width x height.
+    
+    By default Ghostscript is asked to fit the page to the target box
+    (pdf:fit-page), so it renders at exactly the density the derivative needs
+    instead of rendering at a fixed density and downsizing. An explicit
+    'density' option overrides this.
+    
+    Args:
+        input_path: Path to the PDF file
+        width: Target width in pixels
+        height: Target height in pixels
+        options: Derivative options; uses 'page' (0-based, default 0) and 'density'
+    
+    Returns:
+        list: Arguments to place where the input file would go
+    """
+    page = int(options.get('page') or 0)
+    density = options.get('density')
+    if density:
+        return ['-density', str(density), f'{input_path}[{page}]']
+    return ['-define', f'pdf:fit-page={width}x{height}', f'{input_path}[{page}]']
+
+
+def _scan_pdf_page_count(input_path):
+    """Largest /Count of a PDF's page tree, or None if none is visible in the file."""
+    try:
+        count = 0
+        overlap = b''
+        with open(input_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(4 * 1024 * 1024), b''):
+                data = overlap + chunk
+                for match in _PDF_PAGE_COUNT.finditer(data):
+                    count = max(count, int(match.group(1) or match.group(2)))
+                # Keep a tail so a dictionary split across chunks is still seen
+                overlap = data[-512:]
+        return count or None
+    except OSError as e:
+        logger.error(f"Could not read {input_path}: {e}")
+        return None
+
+
+def _identify_page_count(input_path, timeout=None):
+    """Page count reported by ImageMagick (magick identify), or None if it fails."""
+    try:
+        result = run(['magick', 'identify', '-ping', '-format', '%n\\n', input_path],
+                     stdout=PIPE, stderr=DEVNULL, timeout=timeout)
+        lines = result.stdout.split()
+        if result.returncode == 0 and lines:
+            return int(lines[0]) or None
+    except (OSError, ValueError, TimeoutExpired) as e:
+        logger.warning(f"magick identify could not count the pages of {input_path}: {e}")
+    return None
+
+
+def pdf_page_count(input_path, timeout=None):
+    """
+    Count the pages of a PDF. The /Count of its page tree is read directly
+    when it is visible; page trees stored in compressed object streams (most
+    modern PDFs) are counted with magick identify instead.
+    
+    Args:
+        input_path: Path to the PDF file
+        timeout: Optional timeout in seconds for magick identify
+    
+    Returns:
+        int: The page count, or None if it could not be determined
+    """
+    count = _scan_pdf_page_count(input_path)
+    if count is None:
+        count = _identify_page_count(input_path, timeout=timeout)
+    return count
+
+
+def parse_page_range(text, page_count=None):
+    """
+    Parse a page range such as "1-5, 8, 10-" into 0-based page numbers.
+    
+    Args:
+        text: Comma-separated 1-based pages and ranges; "all" (or an open-ended
+              range) needs page_count
+        page_count: Number of pages in the document, if known
+    
+    Returns:
+        list: Sorted, de-duplicated 0-based page numbers within the document
+    
+    Raises:
+        ValueError: If the range is malformed, or open-ended with no page_count
+    """
+    pages = set()
+    for part in (text or '').replace(' ', '').split(','):
+        if not part:
+            continue
+        if part.lower() == 'all':
+            part = '1-'
+        start, dash, end = part.partition('-')
+        first = int(start) if start else 1
+        if dash and not end:
+            if page_count is None:
+                raise ValueError(f"Open-ended page range '{part}' needs a known page count")
+            last = page_count
+            if first > last:
+                # Starts past the end of this document: no pages
+                continue
+        else:
+            last = int(end) if dash else first
+        if first < 1 or last < first:
+            raise ValueError(f"Invalid page range '{part}'")
+        pages.update(range(first - 1, last))
+    if page_count is not None:
+        pages = {page for page in pages if page < page_count}
+    return sorted(pages)
+
+
+def _fit_size(size, width, height):
+    """Size of an image of the given size resized to fit within width x height, as -thumbnail does."""
+    source_width, source_height = size
+    scale = min(width / source_width, height / source_height)
+    return max(1, round(source_width * scale)), max(1, round(source_height * scale))
+
+
+def _select_tiff_level(image, target_size):
+    """
+    Seek a multi-page TIFF to its smallest reduced-resolution page that still
+    covers target_size (in full-resolution terms). Only pages flagged as reduced
+    copies (NewSubfileType) are considered, so multi-page documents are left alone.
+    """
+    best_frame, best_area = 0, image.size[0] * image.size[1]
+    for frame in range(1, getattr(image, 'n_frames', 1)):
+        image.seek(frame)
+        if not image.tag_v2.get(TIFF_NEW_SUBFILE_TYPE, 0) & TIFF_REDUCED_IMAGE:
+            continue
+        frame_width, frame_height = image.size
+        if frame_width >= target_size[0] and frame_height >= target_size[1] and frame_width * frame_height < best_area:
+            best_frame, best_area = frame, frame_width * frame_height
+    image.seek(best_frame)
+    return best_frame
+
+
+def _pillow_derivatives(input_path, outputs, options):
+    """
+    Generate derivatives in-process with Pillow, decoding the source once at
+    the smallest resolution that covers the largest output.
+    
+    Returns:
+        bool: True if every output was written; False if Pillow could not handle
+              the file (the caller then falls back to ImageMagick)
+    """
+    if Image is None or options.get('trim', False):
+        return False
+    if os.path.splitext(input_path)[1].lower() not in PILLOW_EXTENSIONS:
+        return False
+    
+    try:
+        quality = int(options.get('quality', 85))
+        with pillow_pixel_limit(), Image.open(input_path) as image:
+            full_size = image.size
+            sizes = [_fit_size(full_size, output['width'], output['height']) for output in outputs]
+            largest = max(sizes, key=lambda size: size[0] * size[1])
+            
+            if image.format == 'JPEG':
+                # Let libjpeg decode at 1/2, 1/4 or 1/8 scale when that still covers the output
+                image.draft('RGB', largest)
+            elif image.format == 'TIFF':
+                frame = _select_tiff_level(image, largest)
+                if frame:
+                    logger.info(f"Using reduced-resolution TIFF page {frame} {image.size} of {input_path}")
+            
+            if image.mode not in PILLOW_MODES:
+                logger.info(f"Pillow backend does not handle {image.mode} images; using ImageMagick for {input_path}")
+                return False
+            
+            decoded = image.convert('RGB')
+        
+        for output, size in zip(outputs, sizes):
+            resized = decoded.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+            resized.save(output['path'], format='JPEG', quality=quality)
+            logger.info(f"Successfully created derivative with Pillow: {output['path']}")
+        return True
+        
+    except Exception as e:
+        logger.info(f"Pillow could not process {input_path} ({e}); using ImageMagick")
+        return False
+
 
 def generate_thumbnail(input_path, output_path, options):
     """
@@ -24,6 +334,9 @@ def generate_thumbnail(input_path, output_path, options):
             - quality: JPEG quality (0-100)
             - trim: Whether to trim whitespace (boolean)
             - type: Type of derivative ('thumbnail', etc.)
+            - timeout: Optional timeout in seconds; ImageMagick is killed after it
+            - limits: Optional ImageMagick resource limits (see limit_args)
+            - backend: Optional backend name ('imagemagick' or 'pillow')
     
     Returns:
         bool: True if successful, False otherwise
@@ -33,18 +346,24 @@ def generate_thumbnail(input_path, output_path, options):
         height = options.get('height', 400)
         quality = options.get('quality', 85)
         trim = options.get('trim', False)
+        timeout = options.get('timeout')
+        
+        if get_backend_name(options.get('backend')) == 'pillow':
+            output = {'path': output_path, 'width': width, 'height': height}
+            if _pillow_derivatives(input_path, [output], options):
+                return True
         
         # Build the ImageMagick command
         # Use -thumbnail for faster processing and automatic orientation
+        cmd = ['magick', *limit_args(options), input_path]
         if trim:
-            cmd = f'magick "{input_path}" -trim -thumbnail {width}x{height} -quality {quality} "{output_path}"'
-        else:
-            cmd = f'magick "{input_path}" -thumbnail {width}x{height} -quality {quality} "{output_path}"'
+            cmd.append('-trim')
+        cmd += ['-thumbnail', f'{width}x{height}', '-quality', str(quality), output_path]
         
-        logger.info(f"Executing thumbnail command: {cmd}")
+        logger.info(f"Executing thumbnail command: {' '.join(cmd)}")
         
-        # Execute the command
-        return_code = call(cmd, shell=True)
+        # Execute the command (no shell, so a timeout kills ImageMagick itself)
+        return_code = call(cmd, timeout=timeout)
         
         if return_code == 0:
             logger.info(f"Successfully created thumbnail: {output_path}")
@@ -53,6 +372,9 @@ def generate_thumbnail(input_path, output_path, options):
             logger.error(f"Failed to create thumbnail. Command returned: {return_code}")
             return False
             
+    except TimeoutExpired:
+        logger.error(f"Thumbnail of {input_path} timed out after {timeout}s")
+        return False
     except Exception as e:
         logger.error(f"Exception in generate_thumbnail: {str(e)}")
         return False
@@ -70,6 +392,11 @@ def generate_pdf_thumbnail(input_path, output_path, options):
             - width: Target width in pixels
             - height: Target height in pixels
             - quality: JPEG quality (0-100)
+            - timeout: Optional timeout in seconds; ImageMagick is killed after it
+            - limits: Optional ImageMagick resource limits (see limit_args)
+            - page: Optional 0-based page number (default 0)
+            - density: Optional rasterization density in DPI; by default the page
+              is rendered at the size it is resized to (see pdf_source_args)
     
     Returns:
         bool: True if successful, False otherwise
@@ -78,14 +405,17 @@ def generate_pdf_thumbnail(input_path, output_path, options):
         width = options.get('width', 400)
         height = options.get('height', 400)
         quality = options.get('quality', 85)
+        timeout = options.get('timeout')
         
-        # Build command for PDF - extract first page and resize
-        cmd = f'magick "{input_path}[0]" -thumbnail {width}x{height} -quality {quality} "{output_path}"'
+        # Build command for PDF - rasterize the first page (or options['page']) at the
+        # density the target size needs, then resize
+        cmd = ['magick', *limit_args(options), *pdf_source_args(input_path, width, height, options),
+               '-thumbnail', f'{width}x{height}', '-quality', str(quality), output_path]
         
-        logger.info(f"Executing PDF thumbnail command: {cmd}")
+        logger.info(f"Executing PDF thumbnail command: {' '.join(cmd)}")
         
-        # Execute the command
-        return_code = call(cmd, shell=True)
+        # Execute the command (no shell, so a timeout kills ImageMagick itself)
+        return_code = call(cmd, timeout=timeout)
         
         if return_code == 0:
             logger.info(f"Successfully created PDF thumbnail: {output_path}")
@@ -94,6 +424,80 @@ def generate_pdf_thumbnail(input_path, output_path, options):
             logger.error(f"Failed to create PDF thumbnail. Command returned: {return_code}")
             return False
             
+    except TimeoutExpired:
+        logger.error(f"PDF thumbnail of {input_path} timed out after {timeout}s")
+        return False
     except Exception as e:
         logger.error(f"Exception in generate_pdf_thumbnail: {str(e)}")
         return False
+
+
+def generate_derivatives(input_path, outputs, options):
+    """
+    Generate several derivatives of one file with a single ImageMagick run,
+    so the source is decoded only once.
+    
+    Every output except the last is made from a clone of the decoded image
+    (+clone ... -write ... +delete), so each one is resized from the full
+    image exactly as a separate generate_thumbnail call would do.
+    
+    Args:
+        input_path: Path to the input image or PDF file (PDFs use their first page,
+            or options['page'], rasterized for the largest output)
+        outputs: List of dictionaries, each with:
+            - path: Where the derivative should be saved
+            - width: Target width in pixels
+            - height: Target height in pixels
+        options: Dictionary of options shared by all outputs:
+            - quality: JPEG quality (0-100)
+            - trim: Whether to trim whitespace (boolean)
+            - timeout: Optional timeout in seconds; ImageMagick is killed after it
+            - limits: Optional ImageMagick resource limits (see limit_args)
+            - backend: Optional backend name ('imagemagick' or 'pillow')
+            - page, density: PDF page and density (see generate_pdf_thumbnail)
+    
+    Returns:
+        bool: True if successful, False otherwise
+    """
+    try:
+        if not outputs:
+            return True
+        
+        quality = str(options.get('quality', 85))
+        trim = options.get('trim', False)
+        timeout = options.get('timeout')
+        
+        if get_backend_name(options.get('backend')) == 'pillow' and _pillow_derivatives(input_path, outputs, options):
+            return True
+        
+        if input_path.lower().endswith('.pdf'):
+            largest = max(outputs, key=lambda output: output['width'] * output['height'])
+            cmd = ['magick', *limit_args(options), *pdf_source_args(input_path, largest['width'], largest['height'], options)]
+        else:
+            cmd = ['magick', *limit_args(options), input_path]
+        if trim:
+            cmd.append('-trim')
+        for output in outputs[:-1]:
+            cmd += ['(', '+clone', '-thumbnail', f"{output['width']}x{output['height']}",
+                    '-quality', quality, '-write', output['path'], '+delete', ')']
+        last = outputs[-1]
+        cmd += ['-thumbnail', f"{last['width']}x{last['height']}", '-quality', quality, last['path']]
+        
+        logger.info(f"Executing derivatives command: {' '.join(cmd)}")
+        
+        # Execute the command (no shell, so a timeout kills ImageMagick itself)
+        return_code = call(cmd, timeout=timeout)
+        
+        if return_code == 0:
+            logger.info(f"Successfully created {len(outputs)} derivatives of {input_path}")
+            return True
+        else:
+            logger.error(f"Failed to create derivatives. Command returned: {return_code}")
+            return False
+            
+    except TimeoutExpired:
+        logger.error(f"Derivatives of {input_path} timed out after {timeout}s")
+        return False
+    except Exception as e:
+        logger.error(f"Exception in generate_derivatives: {str(e)}")
+        return False
@@ -2,6 +2,10 @@ import flet as ft
 import os
 import utils
 from thumbnail import generate_thumbnail
+from file_index import FileIndex, PRUNE_MIN_FILES
+import similarity
+import normalization
+from workspace_manifest import WorkspaceManifest
 from subprocess import call
 # from azure.identity import DefaultAzureCredential
 # from azure.storage.blob import BlobServiceClient
@@ -48,37 +52,17 @@ def generate_unique_id(page):
 
 # Simple string matching functions
 # ----------------------------------------------------------------------
-def calculate_string_similarity(str1, str2):
+def calculate_string_similarity(str1, str2, scorer=None):
     """
-    Calculate similarity between two strings using a simple approach.
+    Calculate similarity between two strings.
     Returns a percentage (0-100) of how similar the strings are.
-    """
-    if str1 == str2:
-        return 100
-    
-    # Simple substring matching approach
-    if str1 in str2 or str2 in str1:
-        # Calculate ratio based on length overlap
-        overlap = min(len(str1), len(str2))
-        total = max(len(str1), len(str2))
-        return int((overlap / total) * 100)
-    
-    # Count common characters
-    common_chars = 0
-    str1_chars = list(str1)
-    str2_chars = list(str2)
-    
-    for char in str1_chars:
-        if char in str2_chars:
-            common_chars += 1
-            str2_chars.remove(char)
     
-    # Calculate similarity based on common characters
-    total_chars = max(len(str1), len(str2))
-    if total_chars == 0:
-        return 0
-    
-    return int((common_chars / total_chars) * 100)
+    Args:
+        str1: First string
+        str2: Second string
+        scorer: Optional scorer name from similarity.SCORERS ('multiset' by default)
+    """
+    return similarity.SCORERS[similarity.get_scorer_name(scorer)](str1, str2)
 
 def sanitize_filename(filename):
     """
@@ -91,47 +75,38 @@ def sanitize_filename(filename):
         str: Sanitized filename with spaces replaced by underscores,
              special characters removed, and hyphens cleaned up
     """
-    import re
-    # Replace spaces with underscores
-    sanitized = filename.replace(' ', '_')
-    # Remove or replace other problematic characters (keep word chars, hyphens, underscores, dots)
-    sanitized = re.sub(r'[^\w\-_\.]', '_', sanitized)
-    # Clean up multiple underscores around hyphens: _-_ or -_ or _- becomes just -
-    sanitized = re.sub(r'_*-_*', '-', sanitized)
-    # Clean up any remaining multiple consecutive underscores
-    sanitized = re.sub(r'_+', '_', sanitized)
-    return sanitized
-
-def perform_fuzzy_search(base_path, target_filename, threshold=90):
+    return normalization.sanitize_filename(filename)
+
+def perform_fuzzy_search(base_path, target_filename, threshold=90, file_index=None, scorer=None):
     """
-    Recursively search for files in base_path and find the best match for target_filename
+    Find the best match for target_filename among the files in base_path
     using simple string matching.
     
     Args:
         base_path (str): The directory to start searching from
         target_filename (str): The filename to match against
         threshold (int): The minimum match percentage to consider a match (0-100)
+        file_index (FileIndex): Optional prebuilt index of base_path; when omitted
+            the directory is walked to build one
+        scorer (str): Optional scorer name from similarity.SCORERS ('multiset' by default)
         
     Returns:
         tuple: (best_match_path, best_match_ratio) or (None, 0) if no match found
     """
     try:
-        best_match_path = None
-        best_match_ratio = 0
+        if file_index is None:
+            file_index = FileIndex.build(base_path)
+        
+        # Fast path: an exact (case-insensitive) name match needs no scoring
+        exact_path = file_index.lookup(target_filename)
+        if exact_path:
+            return (exact_path, 100)
         
-        for root, dirs, files in os.walk(base_path):
-            for filename in files:
-                # Calculate simple string similarity ratio
-                ratio = calculate_string_similarity(filename.lower(), target_filename.lower())
-                
-                # Update best match if this ratio is higher
-                if ratio > best_match_ratio:
-                    best_match_ratio = ratio
-                    best_match_path = os.path.join(root, filename)
-                    
-                    # If we found a perfect match, we can return immediately
-                    if ratio == 100:
-                        return (best_match_path, ratio)
+        # Score every indexed filename and keep the best one
+        best_index, best_match_ratio = similarity.best_match(
+            normalization.match_key(target_filename), file_index.lower_names, scorer=scorer
+        )
+        best_match_path = file_index.paths[best_index] if best_index is not None else None
         
         # Always return the best match path and ratio found, regardless of threshold
         # The caller will decide whether to accept it based on the threshold
@@ -142,9 +117,18 @@ def perform_fuzzy_search(base_path, target_filename, threshold=90):
         return (None, 0)
 
 
-def perform_fuzzy_search_batch(base_path, target_filenames, threshold=90, progress_callback=None, cancel_check=None):
+def perform_fuzzy_search_batch(base_path, target_filenames, threshold=90, progress_callback=None, cancel_check=None, file_index=None, stats=None, scorer=None, engine=None, prune=True, top_matches=None, top_n=similarity.DEFAULT_TOP_N):
     """
-    Perform fuzzy search for multiple filenames sequentially with progress tracking and cancellation support.
+    Perform fuzzy search for multiple filenames with progress tracking and cancellation support.
+    
+    The search directory is walked only once to build a FileIndex, and every target
+    is matched against that index. Pass a previously built index to skip the walk.
+    Targets with an exact (case-insensitive) filename match are resolved from the
+    index first. With the per-query multiset scorer on a large index, each
+    remaining target is then scored against its top candidates from the index's
+    trigram/digit-run inverted index. Targets still unresolved (all of them with
+    the rapidfuzz scorer, whose cdist batch is faster than pruning) are scored
+    exhaustively in one batched call (see similarity.best_matches).
     
     Args:
         base_path (str): The directory to start searching from
@@ -152,31 +136,119 @@ def perform_fuzzy_search_batch(base_path, target_filenames, threshold=90, progre
         threshold (int): The minimum fuzzy match ratio to consider a match (0-100)
         progress_callback (callable): Optional callback function to report progress (0.0 to 1.0)
         cancel_check (callable): Optional function that returns True if search should be cancelled
+        file_index (FileIndex): Optional index of base_path to reuse across runs
+        stats (dict): Optional dictionary that receives 'exact_matches' (targets
+            resolved by the fast path), 'pruned_matches' (targets matched from their
+            top candidates) and 'scored' (targets scored against every file)
+        scorer (str): Optional scorer name from similarity.SCORERS (defaults to
+            'multiset'; 'rapidfuzz' scores the batch faster with its own rankings)
+        engine (MatchEngine): Optional match_engine.MatchEngine used to shard the
+            scoring across worker processes
+        prune (bool): Whether to try candidate pruning on large indexes (multiset scorer only)
+        top_matches (dict): Optional dictionary that receives, for every target, a
+            list of up to top_n (path, ratio) candidates, best first. They are kept
+            in the same scoring pass, so near-misses can be resolved without
+            searching again.
+        top_n (int): Number of candidates to keep per target in top_matches
         
     Returns:
         dict: Dictionary mapping target filenames to (match_path, ratio) tuples, or None if cancelled
     """
     results = {}
     total_files = len(target_filenames)
+    scorer = similarity.get_scorer_name(scorer)
     
     if progress_callback:
         # Start with 0% progress
         progress_callback(0)
     
-    for index, filename in enumerate(target_filenames):
-        # Check for cancellation
-        if cancel_check and cancel_check():
+    # Build the directory index once for all targets (unless one was supplied)
+    if file_index is None or not file_index.covers(base_path):
+        file_index = FileIndex.build(base_path, cancel_check=cancel_check)
+        if file_index is None:
             logging.info("Fuzzy search cancelled by user")
             return None
+    
+    # Resolve exact name matches first so they never reach similarity scoring
+    remaining = []
+    for filename in target_filenames:
+        exact_path = file_index.lookup(filename)
+        if exact_path:
+            results[filename] = (exact_path, 100)
+            if top_matches is not None:
+                top_matches[filename] = [(exact_path, 100)]
+            logging.info(f"Found match for '{filename}': {exact_path} (100% match)")
+        else:
+            remaining.append(filename)
+    
+    exact_count = total_files - len(remaining)
+    logging.info(f"Exact-match fast path resolved {exact_count} of {total_files} filenames")
+    
+    # On large indexes, score each target against its top candidates only and
+    # keep the exhaustive scan for targets where none of them clears the threshold.
+    # The candidate lookup runs serially, so it only pays off against per-query scoring.
+    pruned_count = 0
+    if prune and scorer == 'multiset' and remaining and len(file_index) >= PRUNE_MIN_FILES:
+        exhaustive = []
+        for filename in remaining:
+            if cancel_check and cancel_check():
+                logging.info("Fuzzy search cancelled by user")
+                return None
             
-        logging.info(f"Searching for match to '{filename}' ({index + 1}/{total_files})")
-        
-        # Update progress after each file
+            positions = file_index.candidates(filename)
+            query = normalization.match_key(filename)
+            candidate_names = [file_index.lower_names[p] for p in positions]
+            if top_matches is not None:
+                ranked = similarity.top_matches(query, candidate_names, scorer=scorer, limit=top_n)
+                choice_index, ratio = ranked[0] if ranked else (None, 0)
+            else:
+                choice_index, ratio = similarity.best_match(query, candidate_names, scorer=scorer)
+            if choice_index is not None and ratio >= threshold:
+                match_path = file_index.paths[positions[choice_index]]
+                results[filename] = (match_path, ratio)
+                if top_matches is not None:
+                    top_matches[filename] = [(file_index.paths[positions[i]], r) for i, r in ranked]
+                pruned_count += 1
+                logging.info(f"Found match for '{filename}': {match_path} ({ratio}% match)")
+                if progress_callback:
+                    progress_callback((exact_count + pruned_count) / total_files)
+            else:
+                exhaustive.append(filename)
+        remaining = exhaustive
+        logging.info(f"Candidate pruning resolved {pruned_count} filenames; {len(remaining)} need a full scan")
+    
+    resolved_count = exact_count + pruned_count
+    if stats is not None:
+        stats['exact_matches'] = exact_count
+        stats['pruned_matches'] = pruned_count
+        stats['scored'] = len(remaining)
+    
+    # Score the remaining targets against every indexed filename in one batch
+    def report_scored(done_count):
         if progress_callback:
-            progress = (index + 1) / total_files
-            progress_callback(progress)
-            
-        match_path, ratio = perform_fuzzy_search(base_path, filename, threshold)
+            progress_callback((resolved_count + done_count) / total_files)
+    
+    matcher = engine.best_matches if engine is not None else similarity.best_matches
+    matches = matcher(
+        [normalization.match_key(filename) for filename in remaining],
+        file_index.lower_names,
+        scorer=scorer,
+        progress_callback=report_scored,
+        cancel_check=cancel_check,
+        top_n=top_n if top_matches is not None else None
+    )
+    if matches is None:
+        logging.info("Fuzzy search cancelled by user")
+        return None
+    
+    if top_matches is not None:
+        ranked_matches = matches
+        matches = [ranked[0] if ranked else (None, 0) for ranked in ranked_matches]
+        for filename, ranked in zip(remaining, ranked_matches):
+            top_matches[filename] = [(file_index.paths[i], ratio) for i, ratio in ranked]
+    
+    for filename, (match_index, ratio) in zip(remaining, matches):
+        match_path = file_index.paths[match_index] if match_index is not None else None
         results[filename] = (match_path, ratio)
         
         # Log the result
@@ -419,6 +491,11 @@ def generate_alma_s3_script(temp_directory, temp_csv_filename=None):
     # Default Profile ID for Alma uploads
     default_profile_id = "6496776180004641"
     
+    # Fall back to the working CSV recorded in the workspace manifest (e.g. after a restart)
+    manifest = WorkspaceManifest(temp_directory) if WorkspaceManifest.exists(temp_directory) else None
+    if not temp_csv_filename and manifest is not None and manifest.file_path('csv'):
+        temp_csv_filename = os.path.basename(manifest.file_path('csv'))
+    
     # Determine the CSV file reference for the script
     if temp_csv_filename:
         csv_file_path = f"{temp_directory}/{temp_csv_filename}"
@@ -431,7 +508,7 @@ def generate_alma_s3_script(temp_directory, temp_csv_filename=None):
 # Alma AWS S3 Upload Script
 # This script helps upload files from the temporary directory to Alma's AWS S3 storage
 # Profile ID: {profile_id} (default)
-# Replace <import-id> with the value from the Alma Digital Uploader
+# Replace <import-id> with the value from the Alma Digital Uploader{contents}
 
 # Step 1: Print the name and contents of the upload bucket
 echo "Step 1: Listing contents of Alma S3 upload bucket..."
@@ -480,8 +557,15 @@ aws s3 rm s3://na-st01.ext.exlibrisgroup.com/01GCL_INST/upload/{profile_id}/ --r
 """
     
     # Replace the placeholders
+    # Summarize what will be uploaded, as recorded in the manifest
+    contents = ""
+    if manifest is not None:
+        counts = manifest.counts()
+        contents = f"\n# Workspace: {counts['OBJS']} files in OBJS/, {counts.get('TN', 0)} thumbnails in TN/"
+    
     return script_template.format(
         temp_directory=temp_directory, 
         profile_id=default_profile_id,
-        csv_file_path=csv_file_path
+        csv_file_path=csv_file_path,
+        contents=contents
     )
@@ -20,6 +20,7 @@ from .instructions_view import InstructionsView
 from .update_csv_view import UpdateCSVView
 from .log_view import LogView
 from .log_overlay import LogOverlay
+from .progress_reporter import ProgressReporter
 
 __all__ = [
     'BaseView',
@@ -35,5 +36,6 @@ __all__ = [
     'InstructionsView',
     'UpdateCSVView',
     'LogView',
-    'LogOverlay'
+    'LogOverlay',
+    'ProgressReporter'
 ]
\ No newline at end of file
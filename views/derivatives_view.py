@@ -6,9 +6,18 @@ This module contains the DerivativesView class for creating file derivatives.
 
 import flet as ft
 from views.base_view import BaseView
+from views.progress_reporter import ProgressReporter
 import os
+import sqlite3
 from subprocess import call
-from thumbnail import generate_thumbnail, generate_pdf_thumbnail
+from thumbnail import (
+    generate_thumbnail, generate_pdf_thumbnail, generate_derivatives, get_backend_name,
+    is_up_to_date, parse_page_range, pdf_page_count, BACKENDS
+)
+from derivative_pool import DerivativePool, plan_resources
+from derivative_cache import DerivativeCache, DEFAULT_MAX_MB
+from derivative_journal import DerivativeJournal, RUNNING, DONE, FAILED
+from workspace_manifest import WorkspaceManifest
 
 
 class DerivativesView(BaseView):
@@ -20,10 +29,16 @@ class DerivativesView(BaseView):
         """Initialize the derivatives view."""
         super().__init__(page)
         self.log_view = None
+        self.backend_dropdown = None
+        self.derivative_cache = None
+        self.resume_checkbox = None
+        self.pdf_pages_field = None
+        self.magick_limits = None
+        self.reporter = None
         self.processing = False
         self.cancel_processing = False
     
-    def create_single_derivative(self, file_path, mode, derivative_type='thumbnail'):
+    def create_single_derivative(self, file_path, mode, derivative_type='thumbnail', timeout=None, backend=None):
         """
         Create a single derivative for a file based on mode and type.
         
@@ -31,6 +46,8 @@ class DerivativesView(BaseView):
             file_path: Path to the source file
             mode: Mode to use ('Alma' or 'CollectionBuilder')
             derivative_type: Type of derivative ('thumbnail' or 'small')
+            timeout: Optional ImageMagick timeout in seconds
+            backend: Optional derivative backend ('imagemagick' or 'pillow')
             
         Returns:
             tuple: (success: bool, result: str)
@@ -70,12 +87,19 @@ class DerivativesView(BaseView):
                     'height': 200,
                     'width': 200,
                     'quality': 85,
-                    'type': 'thumbnail'
+                    'type': 'thumbnail',
+                    'timeout': timeout,
+                    'backend': backend,
+                    'limits': self.magick_limits
                 }
+                single_output = {'path': derivative_path, 'width': 200, 'height': 200}
                 
                 # Process based on file type
                 if ext.lower() in ['.tiff', '.tif', '.jpg', '.jpeg', '.png', '.gif', '.bmp']:
-                    success = generate_thumbnail(file_path, derivative_path, options)
+                    success = self.generate_cached(
+                        file_path, [single_output], options,
+                        lambda: generate_thumbnail(file_path, derivative_path, options)
+                    )
                     if success:
                         self.logger.info(f"Created Alma thumbnail: {derivative_path}")
                         return True, derivative_path
@@ -84,7 +108,10 @@ class DerivativesView(BaseView):
                         self.logger.error(error_msg)
                         return False, error_msg
                 elif ext.lower() == '.pdf':
-                    success = generate_pdf_thumbnail(file_path, derivative_path, options)
+                    success = self.generate_cached(
+                        file_path, [single_output], options,
+                        lambda: generate_pdf_thumbnail(file_path, derivative_path, options)
+                    )
                     if success:
                         self.logger.info(f"Created Alma PDF thumbnail: {derivative_path}")
                         return True, derivative_path
@@ -127,10 +154,17 @@ class DerivativesView(BaseView):
                     error_msg = f"Unknown derivative type for CollectionBuilder: {derivative_type}"
                     self.logger.error(error_msg)
                     return False, error_msg
+                options['timeout'] = timeout
+                options['backend'] = backend
+                options['limits'] = self.magick_limits
+                single_output = {'path': derivative_path, 'width': options['width'], 'height': options['height']}
                 
                 # Process based on file type
                 if ext.lower() in ['.tiff', '.tif', '.jpg', '.jpeg', '.png', '.gif', '.bmp']:
-                    success = generate_thumbnail(file_path, derivative_path, options)
+                    success = self.generate_cached(
+                        file_path, [single_output], options,
+                        lambda: generate_thumbnail(file_path, derivative_path, options)
+                    )
                     if success:
                         self.logger.info(f"Created CollectionBuilder {derivative_type}: {derivative_path}")
                         return True, derivative_path
@@ -139,7 +173,10 @@ class DerivativesView(BaseView):
                         self.logger.error(error_msg)
                         return False, error_msg
                 elif ext.lower() == '.pdf':
-                    success = generate_pdf_thumbnail(file_path, derivative_path, options)
+                    success = self.generate_cached(
+                        file_path, [single_output], options,
+                        lambda: generate_pdf_thumbnail(file_path, derivative_path, options)
+                    )
                     if success:
                         self.logger.info(f"Created CollectionBuilder {derivative_type} from PDF: {derivative_path}")
                         return True, derivative_path
@@ -161,13 +198,293 @@ class DerivativesView(BaseView):
             self.logger.error(error_msg)
             return False, error_msg
     
-    def create_derivatives_for_files(self):
-        """Process all selected files and create derivatives."""
+    def generate_cached(self, file_path, outputs, options, generate):
+        """
+        Take derivatives from the derivative cache when all of them are cached,
+        otherwise generate them and add them to the cache.
+        
+        Args:
+            file_path: Path to the source file
+            outputs: List of dictionaries with each derivative's 'path', 'width' and 'height'
+            options: The options passed to the thumbnail generator
+            generate: Callable that creates every output and returns True on success
+            
+        Returns:
+            bool: True if every output is in place
+        """
+        cache = self.derivative_cache
+        if cache is None:
+            return generate()
+        
+        keys = [cache.key(file_path, output, options) for output in outputs]
+        if cache.fetch_all(keys, [output['path'] for output in outputs]):
+            return True
+        
+        # Never write through a hard link into the cache
+        for output in outputs:
+            cache.detach(output['path'])
+        if not generate():
+            return False
+        for key, output in zip(keys, outputs):
+            cache.store(key, output['path'])
+        return True
+    
+    def create_collectionbuilder_derivatives(self, file_path, timeout=None, backend=None):
+        """
+        Create the CollectionBuilder _SMALL.jpg (800x800) and _TN.jpg (400x400)
+        derivatives of a file with one ImageMagick run, decoding the source once.
+        
+        Args:
+            file_path: Path to the source file
+            timeout: Optional ImageMagick timeout in seconds
+            backend: Optional derivative backend ('imagemagick' or 'pillow')
+            
+        Returns:
+            tuple: (success: bool, result: str) where result is the list of
+                   derivative paths joined by ', ' or an error message
+        """
+        try:
+            ext = os.path.splitext(file_path)[1]
+            if ext.lower() not in ['.tiff', '.tif', '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.pdf']:
+                error_msg = f"Unsupported file type for CollectionBuilder: {ext}"
+                self.logger.error(error_msg)
+                return False, error_msg
+            
+            small_path, tn_path = self.derivative_paths(file_path, 'CollectionBuilder')
+            os.makedirs(os.path.dirname(small_path), exist_ok=True)
+            os.makedirs(os.path.dirname(tn_path), exist_ok=True)
+            
+            outputs = [
+                {'path': small_path, 'width': 800, 'height': 800},
+                {'path': tn_path, 'width': 400, 'height': 400}
+            ]
+            options = {
+                'trim': False,
+                'quality': 85,
+                'timeout': timeout,
+                'backend': backend,
+                'limits': self.magick_limits
+            }
+            
+            if self.generate_cached(file_path, outputs, options, lambda: generate_derivatives(file_path, outputs, options)):
+                paths = [output['path'] for output in outputs]
+                self.logger.info(f"Created CollectionBuilder derivatives: {', '.join(paths)}")
+                return True, ', '.join(paths)
+            
+            error_msg = f"Failed to create CollectionBuilder derivatives for: {file_path}"
+            self.logger.error(error_msg)
+            return False, error_msg
+            
+        except Exception as e:
+            error_msg = f"Exception in create_collectionbuilder_derivatives: {str(e)}"
+            self.logger.error(error_msg)
+            return False, error_msg
+    
+    def derivative_paths(self, file_path, mode, page=None):
+        """
+        List the derivative files a source file produces in the given mode.
+        
+        Args:
+            file_path: Path to the source file
+            mode: Mode to use ('Alma' or 'CollectionBuilder')
+            page: Optional 0-based PDF page, for per-page derivatives
+                  (named <root>_p0001...)
+            
+        Returns:
+            list: Derivative paths (empty for an unknown mode)
+        """
+        dirname, basename = os.path.split(file_path)
+        root = os.path.splitext(basename)[0]
+        if page is not None:
+            root = f"{root}_p{page + 1:04d}"
+        # Derivatives live next to OBJS in the base temp directory
+        temp_base_dir = os.path.dirname(dirname) if dirname.endswith('OBJS') else dirname
+        
+        if mode == 'Alma':
+            return [os.path.join(temp_base_dir, 'TN', f"{root}.jpg.clientThumb")]
+        if mode == 'CollectionBuilder':
+            return [
+                os.path.join(temp_base_dir, 'SMALL', f"{root}_SMALL.jpg"),
+                os.path.join(temp_base_dir, 'TN', f"{root}_TN.jpg")
+            ]
+        return []
+    
+    def create_pdf_page_derivatives(self, file_path, mode, page_range, timeout=None, resume=False, max_workers=None):
+        """
+        Create per-page derivatives of a PDF (for compound-object children),
+        rendering the pages in parallel.
+        
+        Args:
+            file_path: Path to the source PDF
+            mode: Mode to use ('Alma' or 'CollectionBuilder')
+            page_range: 1-based page range text, e.g. "1-10, 12" or "all"
+            timeout: Optional ImageMagick timeout in seconds, per page
+            resume: If True, skip pages whose derivatives are newer than the source
+            max_workers: Number of pages rendered at once
+            
+        Returns:
+            tuple: (created_or_skipped: int, requested: int); requested is 0 when
+                   no pages could be planned
+        """
+        try:
+            pages = parse_page_range(page_range, pdf_page_count(file_path, timeout=timeout))
+        except ValueError as e:
+            self.logger.warning(f"Cannot make page derivatives of {file_path}: {e}")
+            return 0, 0
+        
+        sizes = [(800, 800), (400, 400)] if mode == 'CollectionBuilder' else [(200, 200)]
+        
+        def render_page(page, page_timeout):
+            paths = self.derivative_paths(file_path, mode, page=page)
+            if resume and is_up_to_date(file_path, paths):
+                return True
+            for path in paths:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+            outputs = [
+                {'path': path, 'width': width, 'height': height}
+                for path, (width, height) in zip(paths, sizes)
+            ]
+            # Per-page jobs always go through ImageMagick, which rasterizes the PDF
+            options = {'trim': False, 'quality': 85, 'timeout': page_timeout,
+                       'backend': 'imagemagick', 'page': page, 'limits': self.magick_limits}
+            return self.generate_cached(
+                file_path, outputs, options, lambda: generate_derivatives(file_path, outputs, options)
+            )
+        
+        page_pool = DerivativePool(max_workers=max_workers, timeout=timeout)
+        done = 0
+        for page, success, error in page_pool.run(pages, render_page, cancel_check=lambda: self.cancel_processing):
+            if success and error is None:
+                done += 1
+            else:
+                self.logger.error(f"Failed to create derivatives of page {page + 1} of {file_path}")
+        self.logger.info(f"Created {done}/{len(pages)} page derivatives for {file_path}")
+        return done, len(pages)
+    
+    def create_derivatives_for_file(self, file_path, mode, timeout=None, backend=None, resume=False,
+                                    pdf_pages=None, page_workers=None):
+        """
+        Create all derivatives of one file for the given mode. Runs in a
+        DerivativePool worker thread, so it must not touch the UI.
+        
+        Args:
+            file_path: Path to the source file
+            mode: Mode to use ('Alma' or 'CollectionBuilder')
+            timeout: Optional ImageMagick timeout in seconds
+            backend: Optional derivative backend ('imagemagick' or 'pillow')
+            resume: If True, skip files whose derivatives are all newer than the source
+            pdf_pages: Optional page range; PDFs then also get per-page derivatives
+            page_workers: Number of PDF pages rendered at once
+            
+        Returns:
+            tuple: (success: bool, result_text: str, skipped: bool) where result_text
+                   is the log line to show
+        """
+        display_name = os.path.basename(file_path)
+        with_pages = bool(pdf_pages) and file_path.lower().endswith('.pdf')
+        
+        if resume and is_up_to_date(file_path, self.derivative_paths(file_path, mode)):
+            if not with_pages:
+                self.logger.info(f"Derivatives of {file_path} are up to date; skipping")
+                return True, f"⏭️ {display_name} - Derivatives up to date, skipped", True
+            success, result_text = True, f"⏭️ {display_name} - Derivatives up to date"
+        else:
+            self.logger.info(f"Processing file: {file_path}")
+            
+            if mode == "CollectionBuilder":
+                # Create thumbnail and small derivatives from a single decode
+                success, result = self.create_collectionbuilder_derivatives(file_path, timeout=timeout, backend=backend)
+                
+                if success:
+                    self.logger.info(f"Successfully created derivatives for {file_path}")
+                    result_text = f"✅ {display_name} - Created thumbnail and small derivatives"
+                else:
+                    self.logger.error(f"Derivatives failed: {result}")
+                    result_text = f"❌ {display_name} - Failed to create derivatives"
+            
+            elif mode == "Alma":
+                # Create thumbnail only for Alma
+                success, thumbnail_result = self.create_single_derivative(
+                    file_path, mode, 'thumbnail', timeout=timeout, backend=backend
+                )
+                
+                if success:
+                    self.logger.info(f"Successfully created thumbnail for {file_path}")
+                    result_text = f"✅ {display_name} - Created thumbnail derivative"
+                else:
+                    self.logger.error(f"Thumbnail failed: {thumbnail_result}")
+                    result_text = f"❌ {display_name} - Failed to create thumbnail"
+            
+            else:
+                self.logger.error(f"Unsupported mode {mode} for file {file_path}")
+                return False, f"❌ {display_name} - Unsupported mode: {mode}", False
+        
+        if success and with_pages:
+            done, requested = self.create_pdf_page_derivatives(
+                file_path, mode, pdf_pages, timeout=timeout, resume=resume, max_workers=page_workers
+            )
+            if requested:
+                result_text += f" + {done}/{requested} page derivatives"
+                success = done == requested
+            else:
+                # The file's own derivatives succeeded; only the page expansion couldn't be planned
+                result_text += " (no page derivatives planned)"
+        
+        return success, result_text, False
+    
+    def workspace_dir(self, file_paths):
+        """
+        Find the run's temporary directory.
+        
+        Args:
+            file_paths: The files of the run (used when no temp directory is in session)
+            
+        Returns:
+            str: The temporary directory, or None if there is none
+        """
+        temp_dir = self.page.session.get("temp_directory")
+        if not temp_dir and file_paths:
+            # Derivatives (and the journal) live next to OBJS
+            dirname = os.path.dirname(file_paths[0])
+            temp_dir = os.path.dirname(dirname) if dirname.endswith('OBJS') else dirname
+        if not temp_dir or not os.path.isdir(temp_dir):
+            return None
+        return temp_dir
+    
+    def open_journal(self, file_paths):
+        """
+        Open the derivative job journal of the run's temporary directory.
+        
+        Args:
+            file_paths: The files of the run (used when no temp directory is in session)
+            
+        Returns:
+            DerivativeJournal: The journal, or None if it cannot be opened
+        """
+        temp_dir = self.workspace_dir(file_paths)
+        if temp_dir is None:
+            return None
+        try:
+            return DerivativeJournal(temp_dir)
+        except sqlite3.Error as e:
+            self.logger.warning(f"Derivative journal unavailable in {temp_dir}: {e}")
+            return None
+    
+    def create_derivatives_for_files(self, file_paths=None, mode=None, journal=None):
+        """
+        Process all selected files and create derivatives.
+        
+        Args:
+            file_paths: Optional files to process instead of the session's selected files
+            mode: Optional mode to use instead of the session's selected mode
+            journal: Optional DerivativeJournal of an interrupted run to continue;
+                     by default a new run is recorded in the temp directory's journal
+        """
         colors = self.get_theme_colors()
         
         # Get current settings
-        current_mode = self.page.session.get("selected_mode")
-        selected_files = self.page.session.get("selected_file_paths") or []
+        current_mode = mode or self.page.session.get("selected_mode")
+        selected_files = file_paths if file_paths is not None else (self.page.session.get("selected_file_paths") or [])
         total_files = len(selected_files)
         
         if not current_mode:
@@ -209,125 +526,136 @@ class DerivativesView(BaseView):
         self.logger.info(msg)
         self.log_view.controls.clear()
         self.log_view.controls.append(ft.Text(msg, size=12, color=colors['primary_text']))
+        # Coalesce log lines and progress into a few page updates per second
+        reporter = self.reporter = ProgressReporter(self.page, self.log_view)
         
-        self.log_view.controls.append(ft.Text(
-            f"🔄 Processing {total_files} files in {current_mode} mode...",
-            size=12,
+        # Backend chosen for this run (defaults to the 'derivative_backend' setting)
+        backend = get_backend_name(
+            self.backend_dropdown.value if self.backend_dropdown else self.page.session.get("derivative_backend")
+        )
+        # In resume mode only missing or stale derivatives are built
+        resume = self.resume_checkbox.value if self.resume_checkbox else bool(self.page.session.get("derivative_resume"))
+        
+        # Optional per-page derivatives of PDFs (compound-object children)
+        pdf_pages = (self.pdf_pages_field.value if self.pdf_pages_field else self.page.session.get("derivative_pdf_pages")) or ""
+        pdf_pages = pdf_pages.strip()
+        
+        # Reuse derivatives from earlier runs ('derivative_cache_mb' of 0 disables the cache)
+        cache_mb = self.page.session.get("derivative_cache_mb")
+        if cache_mb is None:
+            cache_mb = DEFAULT_MAX_MB
+        self.derivative_cache = DerivativeCache(max_mb=cache_mb) if float(cache_mb) > 0 else None
+        
+        # Record every job on disk so the run can be resumed after a restart
+        if journal is None:
+            journal = self.open_journal(selected_files)
+            if journal is not None:
+                journal.start_run(selected_files, current_mode)
+        
+        def run_job(path, timeout):
+            if journal is not None:
+                journal.mark(path, RUNNING)
+            return self.create_derivatives_for_file(
+                path, current_mode, timeout, backend, resume, pdf_pages, page_workers
+            )
+        
+        # Size the pool and each job's ImageMagick limits from RAM, cores and the
+        # largest sources; 'derivative_workers' is an upper bound when set
+        plan = plan_resources(selected_files, max_workers=self.page.session.get("derivative_workers"))
+        self.magick_limits = plan['limits']
+        pool = DerivativePool(
+            max_workers=plan['workers'],
+            timeout=self.page.session.get("derivative_timeout")
+        )
+        # PDF pages are rendered by nested pools; split the worker budget so that
+        # files in flight x pages per file stays within the plan (and its -limit values)
+        page_workers = max(1, pool.max_workers // max(1, min(pool.max_workers, total_files)))
+        reporter.add(
+            f"🔄 Processing {total_files} files in {current_mode} mode with {pool.max_workers} parallel jobs "
+            f"({backend} backend, {self.magick_limits['memory']} memory per job)...",
             color=colors['primary_text']
-        ))
-        self.page.update()
+        )
+        reporter.flush()
         
         processed_count = 0
         success_count = 0
+        skipped_count = 0
         error_count = 0
         
-        for index, file_path in enumerate(selected_files):
-            # Check for cancellation
-            if self.cancel_processing:
-                self.log_view.controls.append(ft.Text(
-                    f"⚠️ Processing cancelled by user. Processed {processed_count}/{total_files} files.",
-                    size=12,
-                    color=colors['error']
-                ))
-                self.page.update()
-                self.logger.info(f"Processing cancelled by user at file {index + 1}/{total_files}")
-                break
-                
-            try:
-                display_name = os.path.basename(file_path)
-                self.logger.info(f"Processing file {index + 1}/{total_files}: {file_path}")
-                
-                # Update log
-                self.log_view.controls.append(ft.Text(
-                    f"🔄 Processing file {index + 1}/{total_files}: {display_name}",
-                    size=12,
-                    color=colors['primary_text']
-                ))
-                self.page.update()
-                
-                # Create derivatives based on mode
-                if current_mode == "CollectionBuilder":
-                    # Create thumbnail
-                    thumbnail_success, thumbnail_result = self.create_single_derivative(
-                        file_path, current_mode, 'thumbnail'
-                    )
-                    
-                    # Create small derivative
-                    small_success, small_result = self.create_single_derivative(
-                        file_path, current_mode, 'small'
-                    )
-                    
-                    # Log results
-                    if thumbnail_success and small_success:
-                        result_text = f"✅ {display_name} - Created thumbnail and small derivatives"
-                        success_count += 1
-                        self.logger.info(f"Successfully created derivatives for {file_path}")
-                    else:
-                        result_text = f"❌ {display_name} - Failed to create derivatives"
-                        if not thumbnail_success:
-                            self.logger.error(f"Thumbnail failed: {thumbnail_result}")
-                        if not small_success:
-                            self.logger.error(f"Small derivative failed: {small_result}")
-                        error_count += 1
-                        
-                elif current_mode == "Alma":
-                    # Create thumbnail only for Alma
-                    thumbnail_success, thumbnail_result = self.create_single_derivative(
-                        file_path, current_mode, 'thumbnail'
-                    )
-                    
-                    if thumbnail_success:
-                        result_text = f"✅ {display_name} - Created thumbnail derivative"
-                        success_count += 1
-                        self.logger.info(f"Successfully created thumbnail for {file_path}")
-                    else:
-                        result_text = f"❌ {display_name} - Failed to create thumbnail"
-                        self.logger.error(f"Thumbnail failed: {thumbnail_result}")
-                        error_count += 1
+        def on_cancel_check():
+            return self.cancel_processing
+        
+        # Stream each file's result to the log as soon as its job finishes
+        for file_path, result, error in pool.run(
+            selected_files,
+            run_job,
+            cancel_check=on_cancel_check
+        ):
+            display_name = os.path.basename(file_path)
+            processed_count += 1
+            
+            if journal is not None:
+                succeeded = error is None and result[0]
+                journal.mark(file_path, DONE if succeeded else FAILED, None if succeeded else str(error or result[1]))
+            
+            if error is not None:
+                error_count += 1
+                reporter.add(f"❌ {display_name} - Error: {str(error)}", color=colors['error'])
+                self.logger.error(f"Exception processing {file_path}: {str(error)}")
+            else:
+                success, result_text, skipped = result
+                if skipped:
+                    skipped_count += 1
+                elif success:
+                    success_count += 1
                 else:
-                    result_text = f"❌ {display_name} - Unsupported mode: {current_mode}"
                     error_count += 1
-                    self.logger.error(f"Unsupported mode {current_mode} for file {file_path}")
-                
-                # Add result to UI
-                self.log_view.controls.append(
-                    ft.Text(result_text, size=12, color=colors['primary_text'])
-                )
-                self.page.update()
-                processed_count += 1
-                
-            except Exception as e:
-                error_count += 1
-                error_text = f"❌ {display_name} - Error: {str(e)}"
-                self.log_view.controls.append(
-                    ft.Text(error_text, size=12, color=colors['error'])
-                )
-                self.logger.error(f"Exception processing {file_path}: {str(e)}")
-                self.page.update()
+                reporter.add(result_text, color=colors['primary_text'])
             
-            # Update progress
-            self.log_view.controls.append(
-                ft.Text(
-                    f"Progress: {index + 1}/{total_files} files ({(index + 1)/total_files:.0%})",
-                    size=12,
-                    color=colors['primary_text']
-                )
+            # Update progress (a single line, redrawn at most once per frame)
+            reporter.set_progress(
+                f"Progress: {processed_count}/{total_files} files ({processed_count/total_files:.0%})",
+                color=colors['primary_text']
             )
-            self.page.update()
+        
+        if self.cancel_processing:
+            reporter.add(
+                f"⚠️ Processing cancelled by user. Processed {processed_count}/{total_files} files.",
+                color=colors['error']
+            )
+            self.logger.info(f"Processing cancelled by user after {processed_count}/{total_files} files")
+            if journal is not None:
+                # Jobs dropped on purpose are not an interrupted run to resume
+                journal.cancel_unfinished()
         
         # Final summary
         if not self.cancel_processing:
             summary_text = f"\n✅ Processing complete!\nTotal: {total_files} | Success: {success_count} | Errors: {error_count}"
         else:
             summary_text = f"\n⚠️ Processing cancelled!\nProcessed: {processed_count}/{total_files} | Success: {success_count} | Errors: {error_count}"
-        
-        self.log_view.controls.append(
-            ft.Text(summary_text, size=14, weight=ft.FontWeight.BOLD, color=colors['primary_text'])
-        )
-        self.page.update()
+        if resume:
+            summary_text += f" | Skipped (up to date): {skipped_count}"
+        if self.derivative_cache is not None:
+            summary_text += f" | From cache: {self.derivative_cache.hits} derivatives"
+        
+        # The summary replaces the progress line
+        reporter.set_progress(None)
+        reporter.add(summary_text, color=colors['primary_text'], size=14, weight=ft.FontWeight.BOLD)
+        reporter.flush()
         self.logger.info(summary_text)
         
+        # A resumed run belongs to the journal's workspace, not the session's
+        temp_dir = journal.temp_dir if journal is not None else self.workspace_dir(selected_files)
+        if journal is not None:
+            self.logger.info(f"Derivative journal {journal.path}: {journal.counts()}")
+            journal.close()
+        
+        # Record the new TN/SMALL files so later stages don't have to walk them
+        if temp_dir is not None:
+            WorkspaceManifest(temp_dir).refresh_derivatives()
+        
         # Reset processing state
+        self.reporter = None
         self.processing = False
         self.cancel_processing = False
         
@@ -351,12 +679,13 @@ class DerivativesView(BaseView):
             
             # Update UI to show cancellation in progress
             colors = self.get_theme_colors()
-            self.log_view.controls.append(ft.Text(
-                "🛑 Cancellation requested... stopping after current file.",
-                size=12,
-                color=colors['error']
-            ))
-            self.page.update()
+            message = "🛑 Cancellation requested... queued files skipped, waiting for running jobs."
+            if self.reporter is not None:
+                self.reporter.add(message, color=colors['error'])
+                self.reporter.flush()
+            else:
+                self.log_view.controls.append(ft.Text(message, size=12, color=colors['error']))
+                self.page.update()
     
     def render(self) -> ft.Column:
         """
@@ -454,10 +783,38 @@ class DerivativesView(BaseView):
         self.create_button = create_button
         self.clear_button = clear_button
         
+        # Derivative backend for the next run; Pillow falls back to ImageMagick per file
+        self.backend_dropdown = ft.Dropdown(
+            label="Backend",
+            width=170,
+            value=get_backend_name(self.page.session.get("derivative_backend")),
+            options=[ft.dropdown.Option(name) for name in BACKENDS],
+            tooltip="ImageMagick handles every format; Pillow decodes JPEG/TIFF in-process at reduced resolution"
+        )
+        
+        # Resume: skip files whose derivatives are newer than the source
+        self.resume_checkbox = ft.Checkbox(
+            label="Resume (skip up-to-date)",
+            value=bool(self.page.session.get("derivative_resume")),
+            tooltip="Only create derivatives that are missing or older than their source file"
+        )
+        
+        # PDF page range for per-page derivatives; empty means first page only
+        self.pdf_pages_field = ft.TextField(
+            label="PDF pages",
+            hint_text="e.g. 1-10 or all",
+            width=150,
+            value=self.page.session.get("derivative_pdf_pages") or "",
+            tooltip="Also create derivatives for these pages of each PDF (compound-object children)"
+        )
+        
         start_button = ft.Row([
             create_button,
-            clear_button
-        ], alignment=ft.MainAxisAlignment.CENTER, spacing=10)
+            clear_button,
+            self.backend_dropdown,
+            self.resume_checkbox,
+            self.pdf_pages_field
+        ], alignment=ft.MainAxisAlignment.CENTER, spacing=10, wrap=True)
         
         # Create cancel button (always present, visibility controlled dynamically)
         self.cancel_button = ft.Container(
@@ -476,6 +833,40 @@ class DerivativesView(BaseView):
             visible=self.processing  # Initially hidden unless already processing
         )
         
+        # Offer to resume a run that was interrupted (e.g. by closing the app)
+        resume_run_controls = []
+        interrupted_dirs = [] if self.processing else DerivativeJournal.find_unfinished()
+        if interrupted_dirs:
+            interrupted_dir = interrupted_dirs[0]
+            journal = DerivativeJournal(interrupted_dir)
+            interrupted_mode, interrupted_paths = journal.unfinished()
+            journal.close()
+            
+            def on_resume_run_click(e):
+                """Continue the interrupted run from its journal."""
+                resume_run_container.visible = False
+                resume_journal = DerivativeJournal(interrupted_dir)
+                resume_mode, resume_paths = resume_journal.unfinished()
+                self.create_derivatives_for_files(file_paths=resume_paths, mode=resume_mode, journal=resume_journal)
+            
+            resume_run_container = ft.Container(
+                content=ft.Row([
+                    ft.Text(
+                        f"⚠️ An interrupted {interrupted_mode} run in {os.path.basename(interrupted_dir)} "
+                        f"has {len(interrupted_paths)} unfinished files.",
+                        size=12, color=colors['container_text']
+                    ),
+                    ft.ElevatedButton(
+                        "Resume Interrupted Run",
+                        icon=ft.Icons.PLAY_ARROW,
+                        on_click=on_resume_run_click
+                    )
+                ], alignment=ft.MainAxisAlignment.CENTER, spacing=10, wrap=True),
+                padding=ft.padding.all(5),
+                margin=ft.margin.symmetric(vertical=5)
+            )
+            resume_run_controls.append(resume_run_container)
+        
         # Build the layout controls list
         layout_controls = [
             *self.create_page_header("Derivatives Creation"),
@@ -492,6 +883,7 @@ class DerivativesView(BaseView):
             
             # Start button at top
             start_button,
+            *resume_run_controls,
             
             ft.Container(height=5),
             
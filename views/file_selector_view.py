@@ -10,12 +10,21 @@ import flet as ft
 from views.base_view import BaseView
 import os
 import utils
-import re
+from file_index import FileIndex
+from match_engine import MatchEngine
+import normalization
+import staging
+from workspace_manifest import WorkspaceManifest
 import shutil
 import tempfile
 import uuid
 from datetime import datetime
 
+# The most recent FileIndex by absolute search directory, kept outside
+# page.session because session values are serialized to JSON (as strings)
+# when the session is preserved
+_file_index_cache = {}
+
 
 class FileSelectorView(BaseView):
     """
@@ -48,39 +57,18 @@ class FileSelectorView(BaseView):
         if not file_path:
             return file_path
         
-        # Split path into directory and filename
+        # Split path into directory and filename; the filename rules (and their
+        # cache) live in the normalization module
         directory, filename = os.path.split(file_path)
-        
-        # Apply sanitization rules to filename only
-        # Strip leading and trailing whitespace from the entire filename
-        filename = filename.strip()
-        
-        # Split filename and extension to handle them separately
-        name_part, ext_part = os.path.splitext(filename)
-        
-        # Strip the name part as well to handle trailing spaces before extension
-        name_part = name_part.strip()
-        
-        # Sanitize the name part (before extension)
-        # Replace space-dash-space pattern with double dash first
-        name_part = re.sub(r'\s+-\s+', '--', name_part)
-        
-        # Replace remaining space-dash and dash-space patterns with double dashes
-        name_part = re.sub(r'\s+-', '--', name_part)  # space followed by dash
-        name_part = re.sub(r'-\s+', '--', name_part)  # dash followed by space
-        
-        # Replace remaining spaces with underscores
-        name_part = re.sub(r'\s+', '_', name_part)
-        
-        # Reconstruct filename (extension is kept as-is after stripping)
-        sanitized_filename = name_part + ext_part.strip()
+        sanitized_filename = normalization.sanitize_basename(filename)
         
         # Rejoin the path
         return os.path.join(directory, sanitized_filename) if directory else sanitized_filename
     
     def copy_files_to_temp_directory(self, file_paths):
         """
-        Create symbolic links with sanitized names in a temporary directory that reference the original files.
+        Stage the files with sanitized names in a temporary directory, as symlinks,
+        hard links, reflinks or copies of the originals (see staging.py).
         
         Args:
             file_paths: List of file paths to link
@@ -126,50 +114,24 @@ class FileSelectorView(BaseView):
                 self.logger.info(f"  - TN/: {tn_dir}")
                 self.logger.info(f"  - SMALL/: {small_dir}")
             
-            temp_file_paths = []
-            temp_file_info = []
-            
-            for original_path in file_paths:
-                try:
-                    # Skip empty or None paths
-                    if not original_path or not os.path.exists(original_path):
-                        self.logger.warning(f"Skipping non-existent file: {original_path}")
-                        continue
-                    
-                    # Get the original filename
-                    original_filename = os.path.basename(original_path)
-                    
-                    # Sanitize the filename (already handles spaces and dashes)
-                    sanitized_filename = os.path.basename(self.sanitize_file_path(original_filename))
-                    
-                    # Create the destination path in OBJS subdirectory
-                    temp_file_path = os.path.join(objs_dir, sanitized_filename)
-                    
-                    # Handle filename collisions
-                    counter = 1
-                    base_name, ext = os.path.splitext(sanitized_filename)
-                    while os.path.exists(temp_file_path):
-                        sanitized_filename = f"{base_name}_{counter}{ext}"
-                        temp_file_path = os.path.join(objs_dir, sanitized_filename)
-                        counter += 1
-                    
-                    # Create symbolic link instead of copying the file
-                    os.symlink(os.path.abspath(original_path), temp_file_path)
-                    
-                    # Store the paths and info
-                    temp_file_paths.append(temp_file_path)
-                    temp_file_info.append({
-                        'original_path': original_path,
-                        'original_filename': original_filename,
-                        'temp_path': temp_file_path,
-                        'sanitized_filename': sanitized_filename
-                    })
-                    
-                    self.logger.info(f"Created symbolic link '{sanitized_filename}' -> '{original_path}' in OBJS/")
-                    
-                except Exception as e:
-                    self.logger.error(f"Failed to create symbolic link for file {original_path}: {str(e)}")
-                    continue
+            # Check sources, plan collision-free names in memory, then stage concurrently
+            # ('staging_strategy' setting: symlink (default), auto, hardlink, reflink or copy;
+            # 'staging_checksums' adds MD5/SHA-256 fixity values computed on the way)
+            temp_file_info, _ = staging.stage_files(
+                file_paths,
+                objs_dir,
+                lambda filename: os.path.basename(self.sanitize_file_path(filename)),
+                strategy=self.page.session.get("staging_strategy"),
+                checksums=bool(self.page.session.get("staging_checksums"))
+            )
+            temp_file_paths = [info['temp_path'] for info in temp_file_info]
+            # Keep the staged file list (and fixity values) on disk for the later stages
+            manifest = WorkspaceManifest(temp_dir)
+            manifest.record_objects(temp_file_info)
+            for names in manifest.duplicates():
+                self.logger.warning(f"Staged files with identical content: {', '.join(names)}")
+            for info in temp_file_info:
+                self.logger.info(f"Staged '{info['sanitized_filename']}' -> '{info['original_path']}' in OBJS/ ({info['staging_method']})")
             
             # Store in session
             self.page.session.set("temp_directory", temp_dir)
@@ -179,11 +141,11 @@ class FileSelectorView(BaseView):
             self.page.session.set("temp_files", temp_file_paths)
             self.page.session.set("temp_file_info", temp_file_info)
             
-            self.logger.info(f"Successfully created {len(temp_file_paths)} symbolic links in OBJS/ directory")
+            self.logger.info(f"Successfully staged {len(temp_file_paths)} files in OBJS/ directory")
             return temp_file_paths, temp_file_info, temp_dir
             
         except Exception as e:
-            self.logger.error(f"Failed to create temporary directory or symbolic links: {str(e)}")
+            self.logger.error(f"Failed to create temporary directory or stage files: {str(e)}")
             return [], [], None
     
     def clear_temp_directory(self):
@@ -486,7 +448,7 @@ class FilePickerSelectorView(FileSelectorView):
                 )
             ], alignment=ft.MainAxisAlignment.CENTER, spacing=10),
             ft.Container(height=8),
-            ft.Text("A temporary directory of sanitized symbolic links will be populated to reference selected files.", 
+            ft.Text("A temporary directory of sanitized links (or copies) of the selected files will be populated.", 
                    size=12, color=colors['secondary_text'], italic=True),
             ft.Container(height=8),
             ft.Text("Selected Files:", size=16, weight=ft.FontWeight.BOLD, color=colors['primary_text']),
@@ -577,12 +539,12 @@ class FilePickerSelectorView(FileSelectorView):
             self.page.session.set("selected_file_paths", temp_files)
         
         if temp_files:
-            self.show_snack(f"Successfully created {len(temp_files)} symbolic links in temporary directory")
+            self.show_snack(f"Successfully staged {len(temp_files)} files in temporary directory")
             
             # Refresh the view to show updated button states
             self.page.go("/file_selector")
         else:
-            self.show_snack("Failed to create symbolic links in temporary directory", is_error=True)
+            self.show_snack("Failed to stage files in temporary directory", is_error=True)
 
 
 class CSVSelectorView(FileSelectorView):
@@ -699,6 +661,7 @@ class CSVSelectorView(FileSelectorView):
             # Copy the file
             shutil.copy2(source_path, dest_path)
             self.logger.info(f"Copied CSV file to: {dest_path}")
+            WorkspaceManifest(temp_dir).record_file('csv', dest_path)
             
             return dest_path
             
@@ -1079,6 +1042,16 @@ class CSVSelectorView(FileSelectorView):
                         weight=ft.FontWeight.BOLD
                     )
                 )
+                exact_match_count = self.page.session.get("exact_match_count")
+                if exact_match_count:
+                    search_content_column.controls.append(
+                        ft.Text(
+                            f"{exact_match_count} matched exactly by filename (no fuzzy scoring needed)",
+                            size=11,
+                            color=colors['secondary_text'],
+                            italic=True
+                        )
+                    )
                 
                 # Show matched files
                 matched_ratios = self.page.session.get("matched_ratios") or []
@@ -1195,6 +1168,9 @@ class CSVSelectorView(FileSelectorView):
                                         clipboard_lines.append(f"{filename} (best match: {best_path}, {best_ratio}%)")
                                     else:
                                         clipboard_lines.append(filename)
+                                    # Include the runner-up candidates kept by the search
+                                    for candidate in item.get('candidates', [])[1:]:
+                                        clipboard_lines.append(f"    also: {candidate.get('path')}, {candidate.get('ratio')}%")
                                 else:
                                     # Old format - just a string
                                     clipboard_lines.append(item)
@@ -1245,6 +1221,15 @@ class CSVSelectorView(FileSelectorView):
                                 unmatched_items.extend([main_text, best_match_text])
                             else:
                                 unmatched_items.append(main_text)
+                            
+                            # Show the runner-up candidates so near-misses can be resolved without a re-run
+                            for candidate in item.get('candidates', [])[1:]:
+                                unmatched_items.append(ft.Text(
+                                    f"  └─ Also ({candidate.get('ratio')}%): {candidate.get('path')}",
+                                    size=10,
+                                    color=ft.Colors.GREY_600,
+                                    italic=True
+                                ))
                         else:
                             # Old format - just a string
                             unmatched_items.append(ft.Text(item, size=11, color=ft.Colors.RED_400))
@@ -1556,12 +1541,43 @@ class CSVSelectorView(FileSelectorView):
         """Handle search directory selection and automatically perform complete workflow."""
         if e.path:
             self.page.session.set("search_directory", e.path)
+            # A fresh directory selection always refreshes the directory index
+            _file_index_cache.clear()
             self.logger.info(f"Selected search directory: {e.path}")
             self.update_csv_display()
             
             # Automatically perform the complete workflow
             self.auto_perform_workflow(e.path)
     
+    def get_search_file_index(self, search_dir, cancel_check=None):
+        """
+        Get the file index for search_dir. The last index built (kept in a
+        module-level cache, not the session) is reused; otherwise the persistent index under storage/index is loaded and
+        refreshed incrementally, so only changed directories are re-listed.
+        
+        Args:
+            search_dir: The directory to search
+            cancel_check: Optional function that returns True if indexing should stop
+            
+        Returns:
+            FileIndex: The index for search_dir, or None if indexing was cancelled
+        """
+        file_index = _file_index_cache.get(os.path.abspath(search_dir))
+        if isinstance(file_index, FileIndex) and file_index.covers(search_dir):
+            self.logger.info(f"Reusing file index of {len(file_index)} files for {search_dir}")
+            return file_index
+        
+        file_index = FileIndex.load(
+            search_dir,
+            cancel_check=cancel_check,
+            max_workers=self.page.session.get("scan_workers")
+        )
+        if file_index is not None:
+            # Only one index is kept; they can hold hundreds of thousands of paths
+            _file_index_cache.clear()
+            _file_index_cache[os.path.abspath(search_dir)] = file_index
+        return file_index
+    
     def auto_perform_workflow(self, search_dir):
         """Automatically perform fuzzy search and link creation."""
         selected_files = self.page.session.get("selected_file_paths") or []
@@ -1657,18 +1673,31 @@ class CSVSelectorView(FileSelectorView):
             def check_cancel():
                 return False  # No cancellation in auto mode
             
+            # Walk the search directory once (or reuse the cached index)
+            file_index = self.get_search_file_index(search_dir, cancel_check=check_cancel)
+            if file_index is None:
+                return None
+            
             # Perform the fuzzy search
+            search_stats = {}
+            search_candidates = {}
             results = utils.perform_fuzzy_search_batch(
                 search_dir, 
                 selected_files,
                 threshold=90,
                 progress_callback=update_progress,
-                cancel_check=check_cancel
+                cancel_check=check_cancel,
+                file_index=file_index,
+                stats=search_stats,
+                scorer=self.page.session.get("fuzzy_scorer"),
+                top_matches=search_candidates
             )
             
             if results is None:
                 return None
             
+            self.page.session.set("exact_match_count", search_stats.get('exact_matches', 0))
+            
             # Process results (same logic as in do_fuzzy_search)
             matched_paths = []
             matched_ratios = []
@@ -1688,10 +1717,15 @@ class CSVSelectorView(FileSelectorView):
                 else:
                     matched_paths.append(None)
                     # Store unmatched filename with best match info (filename, best_path, best_ratio)
+                    # and the runner-up candidates kept by the search, so near-misses can be resolved
                     unmatched_filenames.append({
                         'filename': filename,
                         'best_path': match_path,
-                        'best_ratio': ratio
+                        'best_ratio': ratio,
+                        'candidates': [
+                            {'path': path, 'ratio': candidate_ratio}
+                            for path, candidate_ratio in search_candidates.get(filename, [])
+                        ]
                     })
                     # Log unmatched files with severity based on fuzzy score
                     if ratio == 0:
@@ -1856,102 +1890,127 @@ class CSVSelectorView(FileSelectorView):
             cancel = self.page.session.get("cancel_search")
             return cancel if cancel is not None else False
         
-        try:
-            # Perform the fuzzy search with progress tracking and cancellation support
-            results = utils.perform_fuzzy_search_batch(
-                search_dir, 
-                selected_files,
-                threshold=90,
-                progress_callback=update_progress,
-                cancel_check=check_cancel
-            )
-            
-            # Close progress dialog
-            progress_dialog.open = False
-            self.page.update()
+        def run_search():
+            """Run the search off the UI event handler so Cancel stays responsive."""
+            try:
+                # Walk the search directory once (or reuse the cached index)
+                progress_text.value = f"Indexing files in {search_dir}..."
+                self.page.update()
+                file_index = self.get_search_file_index(search_dir, cancel_check=check_cancel)
+                
+                # Perform the fuzzy search with progress tracking and cancellation support
+                results = None
+                search_stats = {}
+                search_candidates = {}
+                if file_index is not None:
+                    results = utils.perform_fuzzy_search_batch(
+                        search_dir, 
+                        selected_files,
+                        threshold=90,
+                        progress_callback=update_progress,
+                        cancel_check=check_cancel,
+                        file_index=file_index,
+                        stats=search_stats,
+                        scorer=self.page.session.get("fuzzy_scorer"),
+                        engine=MatchEngine(),
+                        top_matches=search_candidates
+                    )
+                
+                # Close progress dialog
+                progress_dialog.open = False
+                self.page.update()
+                
+                # If search was cancelled
+                if results is None:
+                    self.logger.info("Fuzzy search was cancelled by user")
+                    self.page.snack_bar = ft.SnackBar(
+                        content=ft.Text("Search cancelled by user"),
+                        bgcolor=ft.Colors.ORANGE_400
+                    )
+                    self.page.snack_bar.open = True
+                    self.page.update()
+                    return
+                
+                # Process results and update session with matched paths
+                matched_paths = []
+                matched_ratios = []
+                unmatched_filenames = []
+                matches_found = 0
+                original_count = len(selected_files)
+                
+                for filename in selected_files:
+                    match_path, ratio = results.get(filename, (None, 0))
+                    if match_path and ratio >= 90:
+                        # Store the original matched path (don't sanitize here)
+                        matched_paths.append(match_path)
+                        matched_ratios.append(ratio)
+                        matches_found += 1
+                        self.logger.info(f"Found match for '{filename}': {match_path} ({ratio}% match)")
+                    else:
+                        matched_paths.append(None)
+                        # Store unmatched filename with best match info (filename, best_path, best_ratio)
+                        # and the runner-up candidates kept by the search, so near-misses can be resolved
+                        unmatched_filenames.append({
+                            'filename': filename,
+                            'best_path': match_path,
+                            'best_ratio': ratio,
+                            'candidates': [
+                                {'path': path, 'ratio': candidate_ratio}
+                                for path, candidate_ratio in search_candidates.get(filename, [])
+                            ]
+                        })
+                        # Log unmatched files with severity based on fuzzy score
+                        if ratio == 0:
+                            self.logger.error(f"No match found for '{filename}' (0% match)")
+                        elif ratio < 50:
+                            self.logger.error(f"No match found for '{filename}' ({ratio}% match - very low)")
+                        elif ratio < 90:
+                            self.logger.warning(f"No match found for '{filename}' ({ratio}% match - below 90% threshold)")
+                        else:
+                            self.logger.info(f"No match found for '{filename}' meeting 90% threshold")
+                
+                # Store search statistics for UI display
+                self.page.session.set("original_filename_count", original_count)
+                self.page.session.set("matched_file_count", matches_found)
+                self.page.session.set("exact_match_count", search_stats.get('exact_matches', 0))
+                self.page.session.set("matched_ratios", matched_ratios)
+                self.page.session.set("unmatched_filenames", unmatched_filenames)
+                self.page.session.set("search_completed", True)
+                
+                # Update session with matched paths (replaces the original filenames)
+                self.page.session.set("selected_file_paths", [p for p in matched_paths if p is not None])
+                
+                # Log completion
+                self.logger.info(f"Fuzzy search completed. Found {matches_found} matches out of {len(selected_files)} files")
+                
+                # Show success message
+                self.page.snack_bar = ft.SnackBar(
+                    content=ft.Text(f"Search Complete: Found {matches_found} matches out of {len(selected_files)} files"),
+                    bgcolor=ft.Colors.GREEN_400
+                )
+                self.page.snack_bar.open = True
+                
+                # Refresh the display to show updated results
+                self.update_csv_display()
             
-            # If search was cancelled
-            if results is None:
-                self.logger.info("Fuzzy search was cancelled by user")
+            except Exception as e:
+                # Close progress dialog on error
+                progress_dialog.open = False
+                self.page.update()
+                
+                error_msg = f"Error during search: {str(e)}"
+                self.logger.error(f"Error during fuzzy search: {str(e)}")
+                
+                # Show error in snackbar
                 self.page.snack_bar = ft.SnackBar(
-                    content=ft.Text("Search cancelled by user"),
-                    bgcolor=ft.Colors.ORANGE_400
+                    content=ft.Text(error_msg),
+                    bgcolor=ft.Colors.RED_400
                 )
                 self.page.snack_bar.open = True
                 self.page.update()
-                return
-            
-            # Process results and update session with matched paths
-            matched_paths = []
-            matched_ratios = []
-            unmatched_filenames = []
-            matches_found = 0
-            original_count = len(selected_files)
-            
-            for filename in selected_files:
-                match_path, ratio = results.get(filename, (None, 0))
-                if match_path and ratio >= 90:
-                    # Store the original matched path (don't sanitize here)
-                    matched_paths.append(match_path)
-                    matched_ratios.append(ratio)
-                    matches_found += 1
-                    self.logger.info(f"Found match for '{filename}': {match_path} ({ratio}% match)")
-                else:
-                    matched_paths.append(None)
-                    # Store unmatched filename with best match info (filename, best_path, best_ratio)
-                    unmatched_filenames.append({
-                        'filename': filename,
-                        'best_path': match_path,
-                        'best_ratio': ratio
-                    })
-                    # Log unmatched files with severity based on fuzzy score
-                    if ratio == 0:
-                        self.logger.error(f"No match found for '{filename}' (0% match)")
-                    elif ratio < 50:
-                        self.logger.error(f"No match found for '{filename}' ({ratio}% match - very low)")
-                    elif ratio < 90:
-                        self.logger.warning(f"No match found for '{filename}' ({ratio}% match - below 90% threshold)")
-                    else:
-                        self.logger.info(f"No match found for '{filename}' meeting 90% threshold")
-            
-            # Store search statistics for UI display
-            self.page.session.set("original_filename_count", original_count)
-            self.page.session.set("matched_file_count", matches_found)
-            self.page.session.set("matched_ratios", matched_ratios)
-            self.page.session.set("unmatched_filenames", unmatched_filenames)
-            self.page.session.set("search_completed", True)
-            
-            # Update session with matched paths (replaces the original filenames)
-            self.page.session.set("selected_file_paths", [p for p in matched_paths if p is not None])
-            
-            # Log completion
-            self.logger.info(f"Fuzzy search completed. Found {matches_found} matches out of {len(selected_files)} files")
-            
-            # Show success message
-            self.page.snack_bar = ft.SnackBar(
-                content=ft.Text(f"Search Complete: Found {matches_found} matches out of {len(selected_files)} files"),
-                bgcolor=ft.Colors.GREEN_400
-            )
-            self.page.snack_bar.open = True
-            
-            # Refresh the display to show updated results
-            self.update_csv_display()
-            
-        except Exception as e:
-            # Close progress dialog on error
-            progress_dialog.open = False
-            self.page.update()
-            
-            error_msg = f"Error during search: {str(e)}"
-            self.logger.error(f"Error during fuzzy search: {str(e)}")
-            
-            # Show error in snackbar
-            self.page.snack_bar = ft.SnackBar(
-                content=ft.Text(error_msg),
-                bgcolor=ft.Colors.RED_400
-            )
-            self.page.snack_bar.open = True
-            self.page.update()
+
+        # Matching is sharded across worker processes for large batches
+        self.page.run_thread(run_search)
     
     def on_copy_csv_matches_to_temp(self, e):
         """Handle creating symbolic links for CSV matched files in temporary directory."""
@@ -9,6 +9,7 @@ import flet as ft
 from views.base_view import BaseView
 import os
 import utils
+from workspace_manifest import WorkspaceManifest
 
 
 class InstructionsView(BaseView):
@@ -59,6 +60,9 @@ class InstructionsView(BaseView):
                 self.show_snack(f"Failed to save script: {ex}", is_error=True)
                 return
             
+            # The script uploads everything in the workspace, so the temp reaper may delete it later
+            WorkspaceManifest(temp_dir).record_upload()
+            
             # Parse script into commands (lines starting with 'aws') and their preceding comments
             lines = script_content.split('\n')
             commands = []
@@ -0,0 +1,127 @@
+"""
+Progress Reporter Module for Manage Digital Ingest Application
+
+This module contains the ProgressReporter class, which streams the lines of a
+long-running operation into a ListView without flooding the Flet connection.
+Updates are coalesced to a fixed frame rate, only the most recent lines are
+kept on screen, and progress is shown on a single line updated in place.
+"""
+
+import flet as ft
+import logging
+import threading
+import time
+from collections import deque
+
+# Default number of log lines kept in the ListView
+DEFAULT_MAX_LINES = 500
+
+# Default number of page updates per second while lines are streaming in
+DEFAULT_FPS = 5
+
+
+class ProgressReporter:
+    """
+    Throttled, bounded log for a ListView. Safe to call from worker threads
+    and from UI event handlers at the same time.
+    """
+
+    def __init__(self, page: ft.Page, list_view: ft.ListView, max_lines=DEFAULT_MAX_LINES, fps=DEFAULT_FPS):
+        """
+        Initialize the reporter.
+
+        Args:
+            page (ft.Page): The Flet page object
+            list_view (ft.ListView): The ListView the lines are shown in
+            max_lines: Number of most recent lines kept on screen
+            fps: Maximum number of page updates per second
+        """
+        self.page = page
+        self.list_view = list_view
+        self.interval = 1.0 / max(1, fps)
+        self.logger = logging.getLogger(self.__class__.__name__)
+        self.lines = deque(list_view.controls, maxlen=max(1, int(max_lines)))
+        self.hidden = 0
+        self.progress = None
+        self._hidden_notice = None
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._timer = None
+        self._last_flush = 0.0
+
+    def add(self, text, color=None, size=12, weight=None):
+        """
+        Append a line to the log. The oldest line scrolls out once max_lines is reached.
+
+        Args:
+            text: The line's text
+            color: Optional text color
+            size: Font size
+            weight: Optional font weight
+        """
+        with self._lock:
+            if len(self.lines) == self.lines.maxlen:
+                self.hidden += 1
+            self.lines.append(ft.Text(text, size=size, color=color, weight=weight))
+        self._request_flush()
+
+    def set_progress(self, text, color=None):
+        """
+        Show text on the progress line below the log, replacing the previous value.
+
+        Args:
+            text: The progress text, or None to remove the progress line
+            color: Optional text color
+        """
+        with self._lock:
+            if text is None:
+                self.progress = None
+            elif self.progress is None:
+                self.progress = ft.Text(text, size=12, color=color)
+            else:
+                self.progress.value = text
+                self.progress.color = color
+        self._request_flush()
+
+    def flush(self):
+        """Push pending lines to the page now (e.g. for the final summary)."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            controls = list(self.lines)
+            if self.hidden:
+                if self._hidden_notice is None:
+                    self._hidden_notice = ft.Text("", size=12, italic=True, color=ft.Colors.GREY)
+                self._hidden_notice.value = f"… {self.hidden} earlier lines not shown (see the log file)"
+                controls.insert(0, self._hidden_notice)
+            if self.progress is not None:
+                controls.append(self.progress)
+            self.list_view.controls = controls
+            self._dirty = False
+            self._last_flush = time.monotonic()
+        try:
+            self.page.update()
+        except Exception as e:
+            self.logger.warning(f"Could not update the page: {e}")
+
+    def _request_flush(self):
+        """Flush now if a frame is due, otherwise make sure one is scheduled."""
+        with self._lock:
+            self._dirty = True
+            wait = self._last_flush + self.interval - time.monotonic()
+            if wait > 0:
+                if self._timer is None:
+                    self._timer = threading.Timer(wait, self._flush_if_dirty)
+                    self._timer.daemon = True
+                    self._timer.start()
+                return
+        self.flush()
+
+    def _flush_if_dirty(self):
+        """Timer callback: flush lines added since the last frame."""
+        with self._lock:
+            self._timer = None
+            dirty = self._dirty
+        if dirty:
+            self.flush()
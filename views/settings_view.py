@@ -9,6 +9,9 @@ import flet as ft
 from views.base_view import BaseView
 import json
 import os
+import similarity
+import staging
+from temp_reaper import TempReaper
 
 
 class SettingsView(BaseView):
@@ -270,6 +273,198 @@ class SettingsView(BaseView):
             bgcolor=colors['container_bg']
         )
         
+        # Fuzzy search scorer selector (empty session value = original multiset scorer)
+        def on_scorer_change(e):
+            """Handle fuzzy search scorer changes"""
+            self.page.session.set("fuzzy_scorer", e.control.value)
+            self.save_persistent_settings({"fuzzy_scorer": e.control.value})
+            self.logger.info(f"Fuzzy search scorer changed to: {e.control.value}")
+        
+        current_scorer = similarity.get_scorer_name(
+            self.page.session.get("fuzzy_scorer") or persistent_settings.get("fuzzy_scorer")
+        )
+        scorer_options = [ft.dropdown.Option("multiset", "Multiset (original rankings)")]
+        if similarity.fuzz is not None:
+            # Opt-in: scores whole batches in C, but its ratio ranks some candidates differently
+            scorer_options.append(ft.dropdown.Option("rapidfuzz", "RapidFuzz (faster, different rankings)"))
+        
+        scorer_settings_container = ft.Container(
+            content=ft.Row([
+                ft.Icon(
+                    name=ft.Icons.MANAGE_SEARCH,
+                    size=20,
+                    color=colors['container_text']
+                ),
+                ft.Text("Fuzzy Search:", size=16, weight=ft.FontWeight.BOLD, color=colors['container_text']),
+                ft.Dropdown(
+                    label="Select Scorer",
+                    value=current_scorer,
+                    options=scorer_options,
+                    on_change=on_scorer_change,
+                    width=300
+                )
+            ], alignment=ft.MainAxisAlignment.CENTER, spacing=8),
+            padding=ft.padding.all(8),
+            border=ft.border.all(1, colors['border']),
+            border_radius=10,
+            margin=ft.margin.symmetric(vertical=4),
+            bgcolor=colors['container_bg']
+        )
+        
+        # Numeric settings; 0 means automatic or off
+        def parse_whole_number(control):
+            """Read a non-negative whole number from a settings field, or None if invalid."""
+            try:
+                value = int((control.value or "0").strip())
+            except ValueError:
+                value = -1
+            if value < 0:
+                control.error_text = "Enter 0 or a positive whole number"
+                self.page.update()
+                return None
+            control.error_text = None
+            return value
+        
+        def on_number_setting_change(e, key):
+            """Store a numeric setting"""
+            value = parse_whole_number(e.control)
+            if value is None:
+                return
+            self.page.session.set(key, value)
+            self.save_persistent_settings({key: value})
+            self.logger.info(f"Setting '{key}' changed to: {value}")
+            self.page.update()
+        
+        def number_setting_field(key, label):
+            """TextField for a numeric setting, saved when it loses focus or is submitted"""
+            return ft.TextField(
+                label=label,
+                value=str(self.page.session.get(key) or persistent_settings.get(key) or 0),
+                keyboard_type=ft.KeyboardType.NUMBER,
+                width=170,
+                on_blur=lambda e: on_number_setting_change(e, key),
+                on_submit=lambda e: on_number_setting_change(e, key)
+            )
+        
+        # Derivative pool and staging options (file_selector_view / derivatives_view read them from the session)
+        def on_staging_strategy_change(e):
+            """Handle staging strategy changes"""
+            self.page.session.set("staging_strategy", e.control.value)
+            self.save_persistent_settings({"staging_strategy": e.control.value})
+            self.logger.info(f"Staging strategy changed to: {e.control.value}")
+        
+        def on_staging_checksums_change(e):
+            """Handle staging checksum changes"""
+            self.page.session.set("staging_checksums", e.control.value)
+            self.save_persistent_settings({"staging_checksums": e.control.value})
+            self.logger.info(f"Staging checksums changed to: {e.control.value}")
+        
+        current_strategy = staging.get_strategy_name(
+            self.page.session.get("staging_strategy") or persistent_settings.get("staging_strategy")
+        )
+        current_checksums = self.page.session.get("staging_checksums")
+        if current_checksums is None:
+            current_checksums = persistent_settings.get("staging_checksums", False)
+        
+        processing_settings_container = ft.Container(
+            content=ft.Column([
+                ft.Text("Derivatives & Staging", size=16, weight=ft.FontWeight.BOLD, color=colors['container_text']),
+                ft.Text(
+                    "Parallel jobs: 0 = sized from cores and memory. Job timeout: 0 = none, "
+                    "so very large masters are never cut off.",
+                    size=12, italic=True, color=colors['secondary_text']
+                ),
+                ft.Row([
+                    number_setting_field("derivative_workers", "Parallel jobs"),
+                    number_setting_field("derivative_timeout", "Job timeout (seconds)")
+                ], alignment=ft.MainAxisAlignment.CENTER, spacing=8, wrap=True),
+                ft.Row([
+                    ft.Dropdown(
+                        label="Staging Strategy",
+                        value=current_strategy,
+                        options=[
+                            ft.dropdown.Option("symlink", "Symlink (default)"),
+                            ft.dropdown.Option("auto", "Auto (reflink, hard link or symlink)"),
+                            ft.dropdown.Option("hardlink", "Hard link"),
+                            ft.dropdown.Option("reflink", "Reflink (copy-on-write)"),
+                            ft.dropdown.Option("copy", "Copy")
+                        ],
+                        on_change=on_staging_strategy_change,
+                        width=300
+                    ),
+                    ft.Checkbox(
+                        label="Compute MD5/SHA-256 while staging",
+                        value=bool(current_checksums),
+                        on_change=on_staging_checksums_change
+                    )
+                ], alignment=ft.MainAxisAlignment.CENTER, spacing=8, wrap=True)
+            ], horizontal_alignment=ft.CrossAxisAlignment.CENTER, spacing=5),
+            padding=ft.padding.all(8),
+            border=ft.border.all(1, colors['border']),
+            border_radius=10,
+            margin=ft.margin.symmetric(vertical=4),
+            bgcolor=colors['container_bg']
+        )
+        
+        # Temporary workspace cleanup (storage/temp); 0 turns a policy off
+        def on_cleanup_now_click(e):
+            """Apply the cleanup policies now, in the background"""
+            reaper = TempReaper(
+                max_age_days=self.page.session.get("temp_max_age_days") or 0,
+                quota_mb=self.page.session.get("temp_quota_mb") or 0,
+                active_dirs=lambda: [self.page.session.get("temp_directory")]
+            )
+            if not reaper.enabled:
+                cleanup_status.value = "Set a maximum age or a size quota first."
+                self.page.update()
+                return
+            
+            def run_cleanup():
+                cleanup_button.disabled = True
+                cleanup_status.value = "🔄 Cleaning up temporary files..."
+                self.page.update()
+                try:
+                    result = reaper.run()
+                    cleanup_status.value = (
+                        f"✅ Deleted {len(result['deleted'])} workspaces, "
+                        f"freed {result['freed_bytes'] / (1024 * 1024):.1f} MB"
+                    )
+                except Exception as ex:
+                    self.logger.error(f"Temporary files cleanup failed: {ex}")
+                    cleanup_status.value = f"❌ Cleanup failed: {ex}"
+                cleanup_button.disabled = False
+                self.page.update()
+            
+            self.page.run_thread(run_cleanup)
+        
+        max_age_field = number_setting_field("temp_max_age_days", "Delete after (days)")
+        quota_field = number_setting_field("temp_quota_mb", "Size quota (MB)")
+        cleanup_button = ft.ElevatedButton(
+            "Clean Up Now",
+            icon=ft.Icons.CLEANING_SERVICES,
+            on_click=on_cleanup_now_click
+        )
+        cleanup_status = ft.Text("", size=12, color=colors['secondary_text'])
+        
+        cleanup_settings_container = ft.Container(
+            content=ft.Column([
+                ft.Text("Temporary Files Cleanup", size=16, weight=ft.FontWeight.BOLD, color=colors['container_text']),
+                ft.Text(
+                    "Old workspaces in storage/temp are deleted at startup (0 = off). Workspaces in use or "
+                    "protected by a preserved session are always kept, and the quota keeps files not yet uploaded.",
+                    size=12, italic=True, color=colors['secondary_text']
+                ),
+                ft.Row([max_age_field, quota_field, cleanup_button],
+                       alignment=ft.MainAxisAlignment.CENTER, spacing=8, wrap=True),
+                cleanup_status
+            ], horizontal_alignment=ft.CrossAxisAlignment.CENTER, spacing=5),
+            padding=ft.padding.all(8),
+            border=ft.border.all(1, colors['border']),
+            border_radius=10,
+            margin=ft.margin.symmetric(vertical=4),
+            bgcolor=colors['container_bg']
+        )
+        
         # Create containers with dropdowns
         mode_settings_container = ft.Container(
             content=ft.Column([
@@ -333,6 +528,9 @@ class SettingsView(BaseView):
             collection_settings_container,
             ft.Divider(height=15, color=colors['divider']),
             theme_settings_container,
+            scorer_settings_container,
+            processing_settings_container,
+            cleanup_settings_container,
             ft.Divider(height=15, color=colors['divider']),
             ft.Container(
                 content=ft.Column([
@@ -4,9 +4,11 @@ Storage view for Azure storage operations.
 import os
 import json
 import flet as ft
-from azure.storage.blob import BlobServiceClient
+from azure.storage.blob import BlobServiceClient, ContentSettings
 
 import utils
+import scanner
+from workspace_manifest import WorkspaceManifest
 from .base_view import BaseView
 
 
@@ -63,6 +65,9 @@ class StorageView(BaseView):
                 self.show_snack(f"Failed to save script: {ex}", is_error=True)
                 return
             
+            # The script uploads everything in the workspace, so the temp reaper may delete it later
+            WorkspaceManifest(temp_dir).record_upload()
+            
             # Parse script into commands (lines starting with 'aws')
             lines = script_content.split('\n')
             commands = []
@@ -238,34 +243,43 @@ class StorageView(BaseView):
                 self.page.update()
                 return
             
-            # Get list of files to upload from OBJS, SMALL, and TN directories
-            files_to_upload = []
-            
-            # Add files from OBJS directory
-            for root, dirs, files in os.walk(objs_dir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    # Create relative path for blob name
-                    relative_path = os.path.relpath(file_path, objs_dir)
-                    files_to_upload.append((file_path, relative_path))
-            
-            # Add files from SMALL directory if it exists
-            if os.path.exists(small_dir):
-                for root, dirs, files in os.walk(small_dir):
-                    for file in files:
-                        file_path = os.path.join(root, file)
-                        # Create relative path for blob name, marking as from SMALL
-                        relative_path = os.path.relpath(file_path, small_dir)
-                        files_to_upload.append((file_path, relative_path))
-            
-            # Add files from TN directory if it exists
-            if os.path.exists(tn_dir):
-                for root, dirs, files in os.walk(tn_dir):
+            # Get list of files to upload from OBJS, SMALL, and TN directories, from the
+            # workspace manifest when nothing changed since it was written
+            manifest = WorkspaceManifest(temp_dir)
+            if manifest.is_current():
+                files_to_upload = manifest.upload_list()
+                # MD5s computed while staging are stored with the blobs instead of re-reading the files
+                fixity = manifest.checksums()
+                self.logger.info(f"Using workspace manifest for the upload list: {manifest.counts()}")
+            else:
+                files_to_upload = []
+                fixity = {}
+                
+                # Add files from OBJS directory
+                for root, dirs, files in scanner.walk(objs_dir, max_workers=self.page.session.get("scan_workers")):
                     for file in files:
                         file_path = os.path.join(root, file)
-                        # Create relative path for blob name, marking as from TN
-                        relative_path = os.path.relpath(file_path, tn_dir)
+                        # Create relative path for blob name
+                        relative_path = os.path.relpath(file_path, objs_dir)
                         files_to_upload.append((file_path, relative_path))
+                
+                # Add files from SMALL directory if it exists
+                if os.path.exists(small_dir):
+                    for root, dirs, files in scanner.walk(small_dir, max_workers=self.page.session.get("scan_workers")):
+                        for file in files:
+                            file_path = os.path.join(root, file)
+                            # Create relative path for blob name, marking as from SMALL
+                            relative_path = os.path.relpath(file_path, small_dir)
+                            files_to_upload.append((file_path, relative_path))
+                
+                # Add files from TN directory if it exists
+                if os.path.exists(tn_dir):
+                    for root, dirs, files in scanner.walk(tn_dir, max_workers=self.page.session.get("scan_workers")):
+                        for file in files:
+                            file_path = os.path.join(root, file)
+                            # Create relative path for blob name, marking as from TN
+                            relative_path = os.path.relpath(file_path, tn_dir)
+                            files_to_upload.append((file_path, relative_path))
             
             if not files_to_upload:
                 self.upload_status.value = "⚠️ No files found in OBJS directory"
@@ -319,9 +333,12 @@ class StorageView(BaseView):
                         self.logger.info(f"Blob '{blob_path}' already exists in container '{container_name}'. Skipping.")
                         skipped_count += 1
                     else:
-                        # Upload the file
+                        # Upload the file, with its recorded MD5 when there is one
+                        content_settings = None
+                        if local_path in fixity:
+                            content_settings = ContentSettings(content_md5=bytearray.fromhex(fixity[local_path]['md5']))
                         with open(local_path, "rb") as data:
-                            blob_client.upload_blob(data)
+                            blob_client.upload_blob(data, content_settings=content_settings)
                         self.logger.info(f"Successfully uploaded '{blob_path}' to container '{container_name}'")
                         uploaded_count += 1
                     
@@ -330,6 +347,10 @@ class StorageView(BaseView):
                     failed_count += 1
                     continue
             
+            # Mark the workspace as uploaded so the temp reaper may delete it later
+            if failed_count == 0:
+                manifest.record_upload()
+            
             # Update final status
             self.upload_progress.value = 1.0
             
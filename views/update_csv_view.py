@@ -12,6 +12,7 @@ import shutil
 import pandas as pd
 from datetime import datetime
 import utils
+from workspace_manifest import WorkspaceManifest
 
 
 class UpdateCSVView(BaseView):
@@ -65,6 +66,7 @@ class UpdateCSVView(BaseView):
             # Copy the file
             shutil.copy2(source_path, dest_path)
             self.logger.info(f"Copied CSV file to: {dest_path}")
+            WorkspaceManifest(temp_dir).record_file('csv', dest_path)
             
             return dest_path
             
@@ -117,6 +119,7 @@ class UpdateCSVView(BaseView):
                 # Save without index and preserve all values as text (no scientific notation)
                 self.csv_data.to_csv(self.temp_csv_path, index=False, encoding='utf-8', quoting=1)
                 self.logger.info(f"Saved CSV data to: {self.temp_csv_path}")
+                WorkspaceManifest(os.path.dirname(self.temp_csv_path)).record_file('csv', self.temp_csv_path)
                 return True
             return False
         except Exception as e:
@@ -155,6 +158,11 @@ class UpdateCSVView(BaseView):
         try:
             # Get session data
             temp_file_info = self.page.session.get("temp_file_info") or []
+            temp_dir = self.page.session.get("temp_directory")
+            if not temp_file_info and WorkspaceManifest.exists(temp_dir):
+                # Staged objects recorded by an earlier session
+                temp_file_info = WorkspaceManifest(temp_dir).objects()
+                self.logger.info(f"Loaded {len(temp_file_info)} staged files from the workspace manifest")
             csv_filenames_for_matched = self.page.session.get("csv_filenames_for_matched") or []
             temp_csv_filename = self.page.session.get("temp_csv_filename") or ""
             original_csv_path = self.page.session.get("selected_csv_file") or ""
@@ -544,6 +552,7 @@ class UpdateCSVView(BaseView):
                         values_csv_path = os.path.join(temp_dir, "values.csv")
                         shutil.copy2(self.temp_csv_path, values_csv_path)
                         self.logger.info(f"Created values.csv copy in temp directory: {values_csv_path}")
+                        WorkspaceManifest(temp_dir).record_file('values_csv', values_csv_path)
                     except Exception as e:
                         self.logger.error(f"Error creating values.csv copy: {e}")
             
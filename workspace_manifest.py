@@ -0,0 +1,311 @@
+"""
+Workspace Manifest Module
+
+This module keeps a manifest.json in each temporary workspace
+(storage/temp/file_selector_*), recording what the workspace holds: the staged
+objects in OBJS/ (with their originals and, when computed during staging,
+their MD5/SHA-256 fixity values), the derivatives in TN/ and SMALL/, and the
+working CSV files, each with its size and checksums.
+
+Later stages (the Azure upload, the Alma S3 script, Update CSV) read the
+manifest instead of walking the directories again, and the staged file list
+survives an application restart. A completed upload is recorded too, so the
+temp reaper can tell which workspaces are safe to delete. The manifest is written atomically (temp
+file + os.replace), and the mtimes of OBJS/, TN/ and SMALL/ are stamped at
+every save, so a reader can tell in one stat per directory whether something
+changed behind the manifest's back and fall back to a directory walk.
+"""
+
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+
+from staging import checksum_file
+
+logger = logging.getLogger(__name__)
+
+# Manifest file name inside a workspace
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Workspace subdirectories tracked by the manifest
+SUBDIRECTORIES = ["OBJS", "TN", "SMALL"]
+
+# Serializes read-modify-write cycles within the application
+_lock = threading.Lock()
+
+
+class WorkspaceManifest:
+    """
+    The manifest of one temporary workspace. Use update() for changes; it
+    reloads, applies and atomically saves under a lock.
+    """
+
+    def __init__(self, temp_dir):
+        """
+        Load the manifest of temp_dir (an empty one if there is none yet).
+
+        Args:
+            temp_dir: The workspace directory (the parent of OBJS/)
+        """
+        self.temp_dir = temp_dir
+        self.path = os.path.join(temp_dir, MANIFEST_NAME)
+        self.data = self._load()
+
+    @classmethod
+    def exists(cls, temp_dir):
+        """True if temp_dir has a manifest."""
+        return bool(temp_dir) and os.path.exists(os.path.join(temp_dir, MANIFEST_NAME))
+
+    def _empty(self):
+        """A manifest with no entries."""
+        return {
+            'version': MANIFEST_VERSION,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'updated': None,
+            'objects': [],
+            'derivatives': {name: [] for name in SUBDIRECTORIES if name != 'OBJS'},
+            'files': {},
+            'directory_mtimes': {}
+        }
+
+    def _load(self):
+        """Read the manifest from disk."""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == MANIFEST_VERSION:
+                return data
+            logger.warning(f"Ignoring manifest {self.path} with unsupported version {data.get('version')}")
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not read workspace manifest {self.path}: {e}")
+        return self._empty()
+
+    def _save(self):
+        """Stamp the directory mtimes and write the manifest atomically."""
+        self.data['updated'] = datetime.now().isoformat(timespec='seconds')
+        self.data['directory_mtimes'] = self._directory_mtimes()
+        temp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+
+    def _directory_mtimes(self):
+        """st_mtime_ns of each tracked subdirectory that exists."""
+        mtimes = {}
+        for name in SUBDIRECTORIES:
+            try:
+                mtimes[name] = os.stat(os.path.join(self.temp_dir, name)).st_mtime_ns
+            except OSError:
+                continue
+        return mtimes
+
+    def update(self, change):
+        """
+        Apply change(data) to the latest manifest on disk and save it.
+
+        Args:
+            change: Function modifying the manifest dict in place
+
+        Returns:
+            bool: True if the manifest was saved
+        """
+        with _lock:
+            try:
+                self.data = self._load()
+                # Any change after an upload means the workspace holds un-uploaded content again
+                self.data.pop('uploaded', None)
+                change(self.data)
+                self._save()
+                return True
+            except Exception as e:
+                logger.error(f"Failed to update workspace manifest {self.path}: {e}")
+                return False
+
+    def is_current(self, names=SUBDIRECTORIES):
+        """
+        Check that nothing was added to or removed from the given subdirectories
+        since the manifest was last saved.
+
+        Args:
+            names: Subdirectories to check
+
+        Returns:
+            bool: True if the manifest can be trusted for those directories
+        """
+        if not os.path.exists(self.path):
+            return False
+        recorded = self.data.get('directory_mtimes', {})
+        current = self._directory_mtimes()
+        return all(recorded.get(name) == current.get(name) for name in names)
+
+    def record_objects(self, staged):
+        """
+        Record staged objects, replacing earlier entries with the same staged name.
+
+        Args:
+            staged: List of dicts as returned by staging.stage_files
+        """
+        def change(data):
+            entries = {entry['sanitized_filename']: entry for entry in data['objects']}
+            for info in staged:
+                entry = {
+                    'original_path': info['original_path'],
+                    'original_filename': info['original_filename'],
+                    'sanitized_filename': info['sanitized_filename'],
+                    'path': os.path.join('OBJS', info['sanitized_filename']),
+                    'staging_method': info.get('staging_method'),
+                    'size': info.get('size')
+                }
+                for algorithm in ('md5', 'sha256'):
+                    if info.get(algorithm):
+                        entry[algorithm] = info[algorithm]
+                entries[entry['sanitized_filename']] = entry
+            data['objects'] = list(entries.values())
+        self.update(change)
+
+    def refresh_derivatives(self):
+        """
+        Record the current contents of TN/ and SMALL/ (one listing each).
+        Checksums of files whose size and mtime are unchanged are kept.
+        """
+        def change(data):
+            for name in data['derivatives']:
+                directory = os.path.join(self.temp_dir, name)
+                known = {entry['path']: entry for entry in data['derivatives'][name]}
+                entries = []
+                try:
+                    with os.scandir(directory) as listing:
+                        for item in listing:
+                            if not item.is_file():
+                                continue
+                            info = item.stat()
+                            path = os.path.join(name, item.name)
+                            previous = known.get(path)
+                            if previous and previous['size'] == info.st_size and previous['mtime_ns'] == info.st_mtime_ns:
+                                entries.append(previous)
+                                continue
+                            entry = {'path': path, 'size': info.st_size, 'mtime_ns': info.st_mtime_ns}
+                            entry.update(checksum_file(item.path))
+                            entries.append(entry)
+                except FileNotFoundError:
+                    pass
+                data['derivatives'][name] = sorted(entries, key=lambda entry: entry['path'])
+        self.update(change)
+
+    def record_file(self, role, path):
+        """
+        Record a workspace file such as the working CSV.
+
+        Args:
+            role: Name of the file's role (e.g. 'csv', 'values_csv')
+            path: Path to the file
+        """
+        def change(data):
+            entry = {'path': os.path.relpath(path, self.temp_dir), 'size': os.path.getsize(path)}
+            entry.update(checksum_file(path))
+            data['files'][role] = entry
+        self.update(change)
+
+    def record_upload(self):
+        """Record that everything in the workspace has been uploaded."""
+        def change(data):
+            data['uploaded'] = datetime.now().isoformat(timespec='seconds')
+        self.update(change)
+
+    def is_uploaded(self):
+        """
+        Check whether the workspace was uploaded and nothing changed since.
+
+        Returns:
+            bool: True if every object and derivative has been uploaded
+        """
+        return bool(self.data.get('uploaded')) and self.is_current()
+
+    def objects(self):
+        """
+        Staged objects in the form of temp_file_info entries.
+
+        Returns:
+            list: Dicts with 'original_path', 'original_filename', 'temp_path' and 'sanitized_filename'
+        """
+        return [
+            dict(entry, temp_path=os.path.join(self.temp_dir, entry['path']))
+            for entry in self.data['objects']
+        ]
+
+    def file_path(self, role):
+        """
+        Absolute path of a recorded workspace file.
+
+        Args:
+            role: The role given to record_file
+
+        Returns:
+            str: The path, or None if no file was recorded for role
+        """
+        entry = self.data['files'].get(role)
+        return os.path.join(self.temp_dir, entry['path']) if entry else None
+
+    def upload_list(self):
+        """
+        Files to upload, as (local path, path relative to its OBJS/TN/SMALL directory).
+
+        Returns:
+            list: Objects first, then SMALL and TN derivatives
+        """
+        files = [
+            (os.path.join(self.temp_dir, entry['path']), entry['sanitized_filename'])
+            for entry in self.data['objects']
+        ]
+        for name in ('SMALL', 'TN'):
+            for entry in self.data['derivatives'].get(name, []):
+                files.append((os.path.join(self.temp_dir, entry['path']), os.path.basename(entry['path'])))
+        return files
+
+    def checksums(self):
+        """
+        Recorded fixity values by local path, for objects and derivatives.
+
+        Returns:
+            dict: Absolute path -> {'md5': ..., 'sha256': ...} (only files with checksums)
+        """
+        entries = list(self.data['objects'])
+        for derivatives in self.data['derivatives'].values():
+            entries.extend(derivatives)
+        return {
+            os.path.join(self.temp_dir, entry['path']): {'md5': entry['md5'], 'sha256': entry['sha256']}
+            for entry in entries
+            if entry.get('md5') and entry.get('sha256')
+        }
+
+    def duplicates(self):
+        """
+        Find staged objects with identical content.
+
+        Returns:
+            list: Lists of sanitized filenames sharing a SHA-256 (only groups of two or more)
+        """
+        groups = {}
+        for entry in self.data['objects']:
+            if entry.get('sha256'):
+                groups.setdefault(entry['sha256'], []).append(entry['sanitized_filename'])
+        return [names for names in groups.values() if len(names) > 1]
+
+    def counts(self):
+        """
+        Count the recorded entries.
+
+        Returns:
+            dict: 'OBJS', 'TN' and 'SMALL' -> number of files
+        """
+        counts = {'OBJS': len(self.data['objects'])}
+        for name, entries in self.data['derivatives'].items():
+            counts[name] = len(entries)
+        return counts